@@ -6,6 +6,9 @@ from pydantic import BaseModel
 from openai_function_calling import FunctionInferrer
 
 from director.core.session import Session, OutputMessage
+from director.core.usage import agent_scope
+from director.core.cancellation import check_cancelled
+from director.utils.exceptions import CancelledException
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +29,9 @@ class AgentResponse(BaseModel):
 class BaseAgent(ABC):
     """Interface for all agents. All agents should inherit from this class."""
 
+    #: Whether the agent may run at the same time as other agents of the same LLM response. Agents with side effects that later calls may depend on, like uploads, set it to False.
+    parallel_safe: bool = True
+
     def __init__(self, session: Session, **kwargs):
         self.session: Session = session
         self.output_message: OutputMessage = self.session.output_message
@@ -58,12 +64,19 @@ class BaseAgent(ABC):
         return self.description
 
     def safe_call(self, *args, **kwargs):
-        try:
-            return self.run(*args, **kwargs)
-
-        except Exception as e:
-            logger.exception(f"error in {self.agent_name} agent: {e}")
-            return AgentResponse(status=AgentStatus.ERROR, message=str(e))
+        with agent_scope(self.agent_name) as usage:
+            try:
+                check_cancelled()
+                response = self.run(*args, **kwargs)
+
+            except CancelledException as e:
+                logger.info(f"{self.agent_name} agent cancelled: {e}")
+                response = AgentResponse(status=AgentStatus.ERROR, message=str(e))
+            except Exception as e:
+                logger.exception(f"error in {self.agent_name} agent: {e}")
+                response = AgentResponse(status=AgentStatus.ERROR, message=str(e))
+            usage["status"] = response.status
+            return response
 
     @abstractmethod
     def run(*args, **kwargs) -> AgentResponse:
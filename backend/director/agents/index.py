@@ -32,6 +32,7 @@ class IndexAgent(BaseAgent):
         self.agent_name = "index"
         self.description = "This is an agent to index the given video of VideoDB. The indexing can be done for spoken words or scene."
         self.parameters = INDEX_AGENT_PARAMETERS
+        self.parallel_safe = False
         super().__init__(session=session, **kwargs)
 
     def run(
@@ -50,17 +51,17 @@ class IndexAgent(BaseAgent):
         try:
             scene_data = {}
             if collection_id is None:
-                self.videodb_tool = VideoDBTool()
+                videodb_tool = VideoDBTool()
             else:
-                self.videodb_tool = VideoDBTool(collection_id=collection_id)
+                videodb_tool = VideoDBTool(collection_id=collection_id)
             self.output_message.actions.append(f"Indexing {index_type} for video")
             self.output_message.push_update()
 
             if index_type == "spoken_words":
-                self.videodb_tool.index_spoken_words(video_id)
+                videodb_tool.index_spoken_words(video_id)
 
             elif index_type == "scene":
-                index_id = self.videodb_tool.index_scene(video_id)
+                index_id = videodb_tool.index_scene(video_id)
                 scene_data = {"scene_index_id": index_id}
 
         except Exception as e:
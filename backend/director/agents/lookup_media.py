@@ -0,0 +1,64 @@
+import logging
+
+from director.agents.base import BaseAgent, AgentResponse, AgentStatus
+from director.core.session import Session
+from director.tools.media_index import get_media_index_registry
+from director.tools.videodb_state import load_videodb_state
+
+logger = logging.getLogger(__name__)
+
+
+class LookupMediaAgent(BaseAgent):
+    def __init__(self, session: Session, **kwargs):
+        self.agent_name = "lookup_media"
+        self.description = "Agent to find videos and images of the collection by their name or description, or to list them page by page. Use it to get the ids of media that are not listed in the context."
+        self.parameters = self.get_parameters()
+        super().__init__(session=session, **kwargs)
+
+    def run(
+        self,
+        query: str = None,
+        media_type: str = None,
+        limit: int = 10,
+        offset: int = 0,
+        collection_id: str = None,
+        *args,
+        **kwargs,
+    ) -> AgentResponse:
+        """
+        Find videos and images of the collection.
+
+        :param str query: Words to look for in the name and description of the media, leave it empty to list the media.
+        :param str media_type: Only return media of this type, either "video" or "image".
+        :param int limit: Maximum number of media to return.
+        :param int offset: Number of media to skip when listing, to get the next page.
+        :param str collection_id: The collection to look in, defaults to the collection of the session.
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: The response containing the matching media.
+        :rtype: AgentResponse
+        """
+        try:
+            collection = self.session.state.get("collection")
+            if collection is None or (
+                collection_id and collection_id != collection.id
+            ):
+                collection = load_videodb_state(collection_id)["collection"]
+            index = get_media_index_registry().get(collection)
+            if query:
+                self.output_message.actions.append(f"Looking up media for '{query}'..")
+                results = index.search(query, k=limit, media_type=media_type)
+            else:
+                self.output_message.actions.append("Listing media of the collection..")
+                results = index.list(k=limit, offset=offset, media_type=media_type)
+            self.output_message.push_update()
+        except Exception as e:
+            logger.exception(f"Error in {self.agent_name}")
+            return AgentResponse(
+                status=AgentStatus.ERROR, message=f"Agent failed with error {e}"
+            )
+        return AgentResponse(
+            status=AgentStatus.SUCCESS,
+            message=f"Agent {self.name} found {len(results)} media of {index.count(media_type)}.",
+            data={"collection_id": collection.id, "media": results},
+        )
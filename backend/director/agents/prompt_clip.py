@@ -1,5 +1,6 @@
 import logging
 import json
+import contextvars
 import concurrent.futures
 
 from director.agents.base import BaseAgent, AgentResponse, AgentStatus
@@ -11,6 +12,7 @@ from director.core.session import (
     VideoContent,
     VideoData,
 )
+from director.core.cancellation import as_completed
 from director.tools.videodb_tool import VideoDBTool
 from director.llm.openai import OpenAI
 
@@ -87,18 +89,19 @@ class PromptClipAgent(BaseAgent):
         return docs
 
     def _prompt_runner(self, prompts):
-        """Run the prompts in parallel."""
+        """Run the prompts in parallel. The calls run in copies of the context, so they are attributed to this agent and stop when the run is cancelled."""
         matches = []
         with concurrent.futures.ThreadPoolExecutor() as executor:
             future_to_index = {
                 executor.submit(
+                    contextvars.copy_context().run,
                     self.llm.chat_completions,
                     [ContextMessage(content=prompt, role=RoleTypes.user).to_llm_msg()],
                     response_format={"type": "json_object"},
                 ): i
                 for i, prompt in enumerate(prompts)
             }
-            for future in concurrent.futures.as_completed(future_to_index):
+            for future in as_completed(future_to_index):
                 try:
                     llm_response = future.result()
                     if not llm_response.status:
@@ -217,44 +220,44 @@ class PromptClipAgent(BaseAgent):
 
         return self._prompt_runner(prompts)
 
-    def _get_scenes(self, video_id):
+    def _get_scenes(self, videodb_tool, video_id):
         self.output_message.actions.append("Retrieving video scenes..")
         self.output_message.push_update()
         scene_index_id = None
-        scene_list = self.videodb_tool.list_scene_index(video_id)
+        scene_list = videodb_tool.list_scene_index(video_id)
         if scene_list:
             scene_index_id = scene_list[0]["scene_index_id"]
-            return scene_index_id, self.videodb_tool.get_scene_index(
+            return scene_index_id, videodb_tool.get_scene_index(
                 video_id=video_id, scene_id=scene_index_id
             )
         else:
             self.output_message.actions.append("Indexing video scenes..")
             self.output_message.push_update()
-            scene_index_id = self.videodb_tool.index_scene(
+            scene_index_id = videodb_tool.index_scene(
                 video_id=video_id,
                 extraction_config={"threshold": 20, "frame_count": 3},
                 prompt="Summarize the essence of the scene in one or two concise sentences without focusing on individual images.",
             )
-            return scene_index_id, self.videodb_tool.get_scene_index(
+            return scene_index_id, videodb_tool.get_scene_index(
                 video_id=video_id, scene_id=scene_index_id
             )
 
-    def _get_transcript(self, video_id):
+    def _get_transcript(self, videodb_tool, video_id):
         self.output_message.actions.append("Retrieving video transcript..")
         self.output_message.push_update()
         try:
-            return self.videodb_tool.get_transcript(
+            return videodb_tool.get_transcript(
                 video_id
-            ), self.videodb_tool.get_transcript(video_id, text=False)
+            ), videodb_tool.get_transcript(video_id, text=False)
         except Exception:
             self.output_message.actions.append(
                 "Transcript unavailable. Indexing spoken content."
             )
             self.output_message.push_update()
-            self.videodb_tool.index_spoken_words(video_id)
-            return self.videodb_tool.get_transcript(
+            videodb_tool.index_spoken_words(video_id)
+            return videodb_tool.get_transcript(
                 video_id
-            ), self.videodb_tool.get_transcript(video_id, text=False)
+            ), videodb_tool.get_transcript(video_id, text=False)
 
     def run(
         self,
@@ -266,19 +269,25 @@ class PromptClipAgent(BaseAgent):
         **kwargs,
     ) -> AgentResponse:
         try:
-            self.videodb_tool = VideoDBTool(collection_id=collection_id)
+            videodb_tool = VideoDBTool(collection_id=collection_id)
             result = []
             if content_type == "spoken_content":
-                transcript_text, _ = self._get_transcript(video_id=video_id)
+                transcript_text, _ = self._get_transcript(
+                    videodb_tool, video_id=video_id
+                )
                 result = self._text_prompter(transcript_text, prompt)
 
             elif content_type == "visual_content":
-                scene_index_id, scenes = self._get_scenes(video_id=video_id)
+                scene_index_id, scenes = self._get_scenes(
+                    videodb_tool, video_id=video_id
+                )
                 result = self._scene_prompter(scenes, prompt)
 
             else:
-                _, transcript = self._get_transcript(video_id=video_id)
-                scene_index_id, scenes = self._get_scenes(video_id=video_id)
+                _, transcript = self._get_transcript(videodb_tool, video_id=video_id)
+                scene_index_id, scenes = self._get_scenes(
+                    videodb_tool, video_id=video_id
+                )
                 result = self._multimodal_prompter(transcript, scenes, prompt)
 
             self.output_message.actions.append("Identifying key moments..")
@@ -288,7 +297,8 @@ class PromptClipAgent(BaseAgent):
                 if content_type == "spoken_content":
                     future_to_index = {
                         executor.submit(
-                            self.videodb_tool.keyword_search,
+                            contextvars.copy_context().run,
+                            videodb_tool.keyword_search,
                             query=description,
                             video_id=video_id,
                         ): description
@@ -297,7 +307,8 @@ class PromptClipAgent(BaseAgent):
                 else:
                     future_to_index = {
                         executor.submit(
-                            self.videodb_tool.keyword_search,
+                            contextvars.copy_context().run,
+                            videodb_tool.keyword_search,
                             query=description,
                             index_type="scene",
                             video_id=video_id,
@@ -306,7 +317,7 @@ class PromptClipAgent(BaseAgent):
                         for description in result
                     }
 
-                for future in concurrent.futures.as_completed(future_to_index):
+                for future in as_completed(future_to_index):
                     description = future_to_index[future]
                     try:
                         search_res = future.result()
@@ -332,7 +343,7 @@ class PromptClipAgent(BaseAgent):
                     timeline = []
                     for timestamp in result_timestamps:
                         timeline.append((timestamp[0], timestamp[1]))
-                    stream_url = self.videodb_tool.generate_video_stream(
+                    stream_url = videodb_tool.generate_video_stream(
                         video_id=video_id, timeline=timeline
                     )
                     video_content.status_message = "Clip generated successfully."
@@ -30,6 +30,7 @@ class SlackAgent(BaseAgent):
         self.description = "Messages to a slack channel"
         self.parameters = self.get_parameters()
         self.llm = OpenAI()
+        self.parallel_safe = False
         super().__init__(session=session, **kwargs)
 
     def run(self, message: str, *args, **kwargs) -> AgentResponse:
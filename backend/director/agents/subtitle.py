@@ -134,10 +134,10 @@ class SubtitleAgent(BaseAgent):
             compact_list.append(compact_word)
         return compact_list
 
-    def add_subtitles_using_timeline(self, subtitles):
+    def add_subtitles_using_timeline(self, videodb_tool, video_id, subtitles):
         video_width = 1920
-        timeline = self.videodb_tool.get_and_set_timeline()
-        video_asset = VideoAsset(asset_id=self.video_id)
+        timeline = videodb_tool.get_and_set_timeline()
+        video_asset = VideoAsset(asset_id=video_id)
         timeline.add_inline(video_asset)
         for subtitle_chunk in subtitles:
             start = round(subtitle_chunk["start"], 2)
@@ -184,8 +184,7 @@ class SubtitleAgent(BaseAgent):
         :rtype: AgentResponse
         """
         try:
-            self.video_id = video_id
-            self.videodb_tool = VideoDBTool(collection_id=collection_id)
+            videodb_tool = VideoDBTool(collection_id=collection_id)
 
             self.output_message.actions.append(
                 "Retrieving the subtitles in the video's original language"
@@ -198,7 +197,7 @@ class SubtitleAgent(BaseAgent):
             self.output_message.content.append(video_content)
             self.output_message.push_update()
 
-            transcript = self.videodb_tool.get_transcript(video_id, text=False)
+            transcript = videodb_tool.get_transcript(video_id, text=False)
             compact_transcript = self.get_compact_transcript(transcript=transcript)
 
             self.output_message.actions.append(
@@ -227,7 +226,7 @@ class SubtitleAgent(BaseAgent):
             self.output_message.push_update()
 
             stream_url = self.add_subtitles_using_timeline(
-                translated_subtitles["subtitles"]
+                videodb_tool, video_id, translated_subtitles["subtitles"]
             )
             video_content.video = VideoData(stream_url=stream_url)
             video_content.status = MsgStatus.success
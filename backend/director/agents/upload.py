@@ -54,9 +54,17 @@ class UploadAgent(BaseAgent):
             "Youtube playlist and links are also supported. "
         )
         self.parameters = UPLOAD_AGENT_PARAMETERS
+        self.parallel_safe = False
         super().__init__(session=session, **kwargs)
 
-    def _upload(self, source: str, source_type: str, media_type: str, name: str = None):
+    def _upload(
+        self,
+        videodb_tool: VideoDBTool,
+        source: str,
+        source_type: str,
+        media_type: str,
+        name: str = None,
+    ):
         """Upload the media with the given URL."""
         try:
             if media_type == "video":
@@ -71,7 +79,7 @@ class UploadAgent(BaseAgent):
             content.status_message = f"Uploading {media_type}..."
             self.output_message.push_update()
 
-            upload_data = self.videodb_tool.upload(
+            upload_data = videodb_tool.upload(
                 source, source_type, media_type, name=name
             )
 
@@ -117,14 +125,16 @@ class UploadAgent(BaseAgent):
             logger.exception(f"Error in getting playlist info: {e}")
             return None
 
-    def _upload_yt_playlist(self, playlist_info: dict, media_type):
+    def _upload_yt_playlist(
+        self, videodb_tool: VideoDBTool, playlist_info: dict, media_type
+    ):
         """Upload the videos in a youtube playlist."""
         for media in playlist_info:
             try:
                 self.output_message.actions.append(
                     f"Uploading video: {media['title']} as {media_type}"
                 )
-                self._upload(media["url"], "url", media_type)
+                self._upload(videodb_tool, media["url"], "url", media_type)
             except Exception as e:
                 self.output_message.actions.append(
                     f"Upload failed for {media['title']}"
@@ -156,17 +166,19 @@ class UploadAgent(BaseAgent):
         :return: AgentResponse - The response containing information about the upload operation.
         """
 
-        self.videodb_tool = VideoDBTool(collection_id=collection_id)
+        videodb_tool = VideoDBTool(collection_id=collection_id)
 
         if source_type == "local_file":
-            return self._upload(source, source_type, media_type, name)
+            return self._upload(videodb_tool, source, source_type, media_type, name)
         elif source_type == "url":
             playlist_info = self._get_yt_playlist_videos(source)
             if playlist_info:
                 self.output_message.actions.append("YouTube Playlist detected")
                 self.output_message.push_update()
-                return self._upload_yt_playlist(playlist_info, media_type)
-            return self._upload(source, source_type, media_type, name)
+                return self._upload_yt_playlist(
+                    videodb_tool, playlist_info, media_type
+                )
+            return self._upload(videodb_tool, source, source_type, media_type, name)
         else:
             error_message = f"Invalid source type {source_type}"
             logger.error(error_message)
@@ -0,0 +1,126 @@
+"""Micro-benchmark of the per-iteration overhead of the reasoning loop, i.e. everything a step does before the LLM request is sent.
+
+Before: the tool schemas are rebuilt, every context message is converted with ``to_llm_msg()`` and formatted for the provider again, and the whole context is printed. After: the tool schemas are built once per agent set, context messages keep their LLM and provider forms, and only new messages are converted.
+
+Run it with ``make benchmark-reasoning`` or ``python director/core/benchmark.py``. No API keys or network are needed.
+"""
+
+import io
+import time
+import contextlib
+
+from director.core.session import ContextMessage, RoleTypes
+from director.llm.base import BaseLLM
+from director.llm.openai import OpenAI, OpenaiConfig
+from director.llm.anthropic import AnthropicAI, AnthropicAIConfig
+
+
+class _Agent:
+    """Stands in for an agent, with a schema the size of the real ones."""
+
+    def __init__(self, i: int):
+        self.agent_name = f"agent_{i}"
+        self.description = "This agent processes the given video of VideoDB. " * 4
+        self.parameters = {
+            "type": "object",
+            "properties": {
+                name: {"type": "string", "description": f"The {name} to use."}
+                for name in ("video_id", "collection_id", "prompt", "style")
+            },
+            "required": ["video_id", "collection_id"],
+        }
+
+    def to_llm_format(self):
+        return {
+            "name": self.agent_name,
+            "description": self.description,
+            "parameters": self.parameters,
+        }
+
+
+def _llm(cls, config_cls) -> BaseLLM:
+    # The client is never used, so the SDK is not initialized
+    llm = object.__new__(cls)
+    config = config_cls(api_key="benchmark")
+    BaseLLM.__init__(llm, config)
+    # Set by AnthropicAI.__init__
+    llm.prompt_caching = getattr(config, "prompt_caching", False)
+    return llm
+
+
+def build_context(turns: int) -> list:
+    """A reasoning context of ``turns`` turns, each with a tool call and a tool output."""
+    context = [ContextMessage(content="system prompt " * 200)]
+    for i in range(turns):
+        context += [
+            ContextMessage(content=f"Summarize video {i}", role=RoleTypes.user),
+            ContextMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "id": f"call_{i}",
+                        "type": "function",
+                        "tool": {"name": "agent_0", "arguments": {"video_id": f"m-{i}"}},
+                    }
+                ],
+                role=RoleTypes.assistant,
+            ),
+            ContextMessage(
+                content="tool output " * 300, tool_call_id=f"call_{i}", role=RoleTypes.tool
+            ),
+            ContextMessage(content=f"Here is the summary {i}", role=RoleTypes.assistant),
+        ]
+    return context
+
+
+def iteration_before(llm: BaseLLM, agents: list, context: list):
+    tools = [agent.to_llm_format() for agent in agents]
+    with contextlib.redirect_stdout(io.StringIO()):
+        print([message._build_llm_msg() for message in context], "\n\n")
+    messages = [message._build_llm_msg() for message in context]
+    llm._messages_cache, llm._tools_cache = {}, None
+    return llm._params(messages, tools, None, None) if isinstance(
+        llm, OpenAI
+    ) else llm._params(messages, tools)
+
+
+def iteration_after(llm: BaseLLM, tools: list, context: list):
+    messages = [message.to_llm_msg() for message in context]
+    return llm._params(messages, tools, None, None) if isinstance(
+        llm, OpenAI
+    ) else llm._params(messages, tools)
+
+
+def measure(fn, *args, repeat: int = 200) -> float:
+    """Mean microseconds per call."""
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run_benchmark(turn_counts=(5, 25, 100), agent_count: int = 14) -> list:
+    """Measure the overhead per iteration before and after the caches.
+
+    :return: ``(provider, messages, before_us, after_us)`` per provider and context size.
+    """
+    agents = [_Agent(i) for i in range(agent_count)]
+    results = []
+    for name, llm in (
+        ("openai", _llm(OpenAI, OpenaiConfig)),
+        ("anthropic", _llm(AnthropicAI, AnthropicAIConfig)),
+    ):
+        for turns in turn_counts:
+            context = build_context(turns)
+            tools = [agent.to_llm_format() for agent in agents]
+            before = measure(iteration_before, llm, agents, context)
+            after = measure(iteration_after, llm, tools, context)
+            results.append((name, len(context), before, after))
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'provider':<10} {'messages':>8} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for name, messages, before, after in run_benchmark():
+        print(f"{name:<10} {messages:>8} {before:>10.1f} {after:>10.1f} {before / after:>7.1f}x")
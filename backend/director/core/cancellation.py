@@ -0,0 +1,203 @@
+"""Cooperative cancellation of reasoning runs.
+
+Every :class:`ReasoningEngine` run has a :class:`CancelToken`, registered in the process-wide :class:`RunRegistry` under its session and conversation, so the socket and HTTP handlers can cancel it. The token of the current run is kept in a ``contextvars`` variable like the usage scope, so it reaches agents and the threads started with a copy of the context. Code checks it at checkpoints with :func:`check_cancelled`, and blocking I/O that can be aborted registers a callback with :func:`on_cancel`.
+"""
+
+import logging
+import threading
+import functools
+import contextvars
+
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from director.utils.exceptions import CancelledException
+
+logger = logging.getLogger(__name__)
+
+_token = contextvars.ContextVar("cancel_token", default=None)
+
+
+class CancelToken:
+    """Cancellation state of one reasoning run."""
+
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "The request was cancelled"):
+        """Cancel the run and call the registered callbacks, once."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Error in cancel callback: {e}")
+
+    def check(self):
+        """Raise :class:`CancelledException` if the run was cancelled."""
+        if self._event.is_set():
+            raise CancelledException(self.reason)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until the run is cancelled or ``timeout`` seconds passed, return whether it was cancelled."""
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback) -> bool:
+        """Call ``callback`` when the run is cancelled. Returns False and calls nothing if it already is."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self._callbacks.append(callback)
+            return True
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @contextmanager
+    def activate(self):
+        """Make this the token of the current run for the ``with`` block."""
+        token = _token.set(self)
+        try:
+            yield self
+        finally:
+            _token.reset(token)
+
+
+def check_cancelled():
+    """Raise :class:`CancelledException` if the current run was cancelled. Call it between the steps of long running work."""
+    token = _token.get()
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def on_cancel(callback):
+    """Call ``callback`` if the current run is cancelled during the ``with`` block, e.g. to close a streaming response. It is called right away if the run already is cancelled."""
+    token = _token.get()
+    if token is None:
+        yield
+        return
+    if not token.add_callback(callback):
+        callback()
+    try:
+        yield
+    finally:
+        token.remove_callback(callback)
+
+
+def as_completed(futures, poll_interval: float = 0.1):
+    """Like :func:`concurrent.futures.as_completed`, but raises :class:`CancelledException` when the current run is cancelled, after cancelling the futures that have not started."""
+    token = _token.get()
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+        yield from done
+        if token is not None and token.cancelled:
+            for future in pending:
+                future.cancel()
+            token.check()
+
+
+def cancellable_llm_call(chat_completions):
+    """Wrap the ``chat_completions`` method of an LLM to check the current run before and after every call."""
+
+    @functools.wraps(chat_completions)
+    def wrapper(*args, **kwargs):
+        check_cancelled()
+        response = chat_completions(*args, **kwargs)
+        check_cancelled()
+        return response
+
+    return wrapper
+
+
+def cancellable_llm_stream(chat_completions_stream):
+    """Wrap the ``chat_completions_stream`` method of an LLM to check the current run at every event. Stopping the iteration closes the stream, the providers also close the HTTP response when the run is cancelled while waiting for data."""
+
+    @functools.wraps(chat_completions_stream)
+    def wrapper(*args, **kwargs):
+        check_cancelled()
+        events = chat_completions_stream(*args, **kwargs)
+        try:
+            for event in events:
+                check_cancelled()
+                yield event
+        finally:
+            events.close()
+        check_cancelled()
+
+    return wrapper
+
+
+class RunRegistry:
+    """Active reasoning runs of this process by session and conversation. With several server processes, a run can only be cancelled through the process that runs it."""
+
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def register(self, session_id: str, conv_id: str, token: CancelToken):
+        """Register the run of a conversation for the ``with`` block."""
+        key = (session_id, conv_id)
+        with self._lock:
+            self._runs[key] = token
+        try:
+            yield token
+        finally:
+            with self._lock:
+                if self._runs.get(key) is token:
+                    del self._runs[key]
+
+    def active(self, session_id: str) -> list:
+        """Conversation ids of the active runs of a session."""
+        with self._lock:
+            return [conv_id for (sid, conv_id) in self._runs if sid == session_id]
+
+    def cancel(
+        self,
+        session_id: str,
+        conv_id: str = None,
+        reason: str = "The request was cancelled by the user",
+    ) -> list:
+        """Cancel the active run of a conversation, or all runs of the session if ``conv_id`` is not given.
+
+        :return: Conversation ids of the cancelled runs.
+        """
+        with self._lock:
+            runs = [
+                (key[1], token)
+                for key, token in self._runs.items()
+                if key[0] == session_id and (conv_id is None or key[1] == conv_id)
+            ]
+        for run_conv_id, token in runs:
+            logger.info(f"Cancelling run of session {session_id} conversation {run_conv_id}")
+            token.cancel(reason)
+        return [run_conv_id for run_conv_id, _ in runs]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_run_registry() -> RunRegistry:
+    """Return the process-wide registry of active reasoning runs."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = RunRegistry()
+        return _registry
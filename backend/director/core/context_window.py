@@ -0,0 +1,209 @@
+import os
+import json
+import logging
+from typing import List
+
+from director.core.session import Session, ContextMessage, RoleTypes
+from director.llm.base import BaseLLM
+
+logger = logging.getLogger(__name__)
+
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+CONTEXT_SUMMARY_PROMPT = """
+Summarize the conversation below so that you can continue it later without the original messages.
+Keep the ids of videos, collections, images and audios, stream and image urls, user preferences and the outcome of each request.
+Drop greetings and intermediate reasoning. Answer with the summary only.
+""".strip()
+
+# Tokens a chat API adds around every message
+MESSAGE_OVERHEAD = 4
+
+
+class ContextWindow:
+    """Fits the reasoning context of a session into a token budget before it is sent to the LLM.
+
+    The context is split into the leading system messages (the system prompt, the description of the session's media and the summary of earlier turns), the older turns and the current run, each turn starting at a user message. The leading system messages and the current run are always sent. When the whole context doesn't fit, the oldest turns are folded into the summary, which is saved with the context so it is computed only once. With the ``drop`` strategy, or if summarization fails, the oldest turns are left out of the request instead and stay in the saved context. A current run that exceeds the budget on its own is sent as it is, with a warning.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        llm: BaseLLM,
+        budget: int = None,
+        strategy: str = None,
+        summary_tokens: int = 1024,
+        max_summary_input_chars: int = 2000,
+    ):
+        """
+        :param Session session: Session whose reasoning context is sent.
+        :param BaseLLM llm: LLM the context is sent to, it also writes the summaries.
+        :param int budget: Maximum tokens of a request, defaults to ``REASONING_CONTEXT_BUDGET`` or the context window of the model minus its ``max_tokens``.
+        :param str strategy: ``summarize`` or ``drop``, defaults to ``REASONING_CONTEXT_STRATEGY`` or ``summarize``.
+        :param int summary_tokens: Tokens kept free for the summary.
+        :param int max_summary_input_chars: Characters of each message passed to the summarizer, longer tool outputs are cut.
+        """
+        self.session = session
+        self.llm = llm
+        self.budget = (
+            budget
+            or int(os.getenv("REASONING_CONTEXT_BUDGET", 0))
+            or llm.context_window - llm.max_tokens
+        )
+        self.strategy = strategy or os.getenv("REASONING_CONTEXT_STRATEGY", "summarize")
+        self.summary_tokens = summary_tokens
+        self.max_summary_input_chars = max_summary_input_chars
+        self.reserved_tokens = 0
+        self._counts = {}
+        # LLM messages of the leading system messages and the system message built from them
+        self._system = None
+
+    def reserve(self, tokens: int):
+        """Keep ``tokens`` of the budget free for other parts of the request, like the tool definitions."""
+        self.reserved_tokens = tokens
+
+    def count(self, message: ContextMessage) -> int:
+        """Tokens of a context message, counted once per message."""
+        cached = self._counts.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        text = _message_text(message)
+        if message.tool_calls:
+            text += json.dumps(message.tool_calls)
+        tokens = self.llm.count_tokens(text) + MESSAGE_OVERHEAD
+        self._counts[id(message)] = (message, tokens)
+        return tokens
+
+    def count_messages(self, messages: List[ContextMessage]) -> int:
+        return sum(self.count(message) for message in messages)
+
+    def split(self, messages: List[ContextMessage]):
+        """Split messages into the leading system messages, the older turns and the current run."""
+        start = 0
+        while start < len(messages) and messages[start].role == RoleTypes.system:
+            start += 1
+        head, turns = messages[:start], []
+        for message in messages[start:]:
+            if message.role == RoleTypes.user or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        if not turns:
+            return head, [], []
+        return head, turns[:-1], turns[-1]
+
+    def fit(self) -> List[dict]:
+        """Return the reasoning context as LLM messages within the budget, summarizing older turns if needed."""
+        context = self.session.reasoning_context
+        if self.count_messages(context) + self.reserved_tokens <= self.budget:
+            return self._to_llm_msgs(context)
+
+        head, older, current = self.split(context)
+        available = (
+            self.budget
+            - self.reserved_tokens
+            - self.count_messages(head)
+            - self.count_messages(current)
+            - self.summary_tokens
+        )
+        kept = 0
+        for turn in reversed(older):
+            tokens = self.count_messages(turn)
+            if tokens > available:
+                break
+            available -= tokens
+            kept += 1
+        evicted, recent = older[: len(older) - kept], older[len(older) - kept :]
+        recent = [message for turn in recent for message in turn]
+        if available < 0:
+            logger.warning(
+                f"Current run of session {self.session.session_id} exceeds the context budget of {self.budget} tokens"
+            )
+
+        # Nothing to fold when the current run alone exceeds the budget
+        if self.strategy == "summarize" and evicted:
+            summary = self.summarize(head, evicted)
+            if summary is not None:
+                head = [message for message in head if not _is_summary(message)]
+                head.append(ContextMessage(content=f"{SUMMARY_PREFIX}\n{summary}"))
+                self.session.reasoning_context = head + recent + current
+                self.session.compact_context_messages()
+                logger.info(
+                    f"Summarized {len(evicted)} turns of session {self.session.session_id}"
+                )
+                return self._to_llm_msgs(self.session.reasoning_context)
+
+        return self._to_llm_msgs(head + recent + current)
+
+    def summarize(self, head: List[ContextMessage], turns: List[list]):
+        """Fold ``turns`` into the existing summary in ``head``.
+
+        :return: The new summary, or ``None`` if the LLM call failed.
+        """
+        lines = [
+            _message_text(message)
+            for message in head
+            if _is_summary(message)
+        ]
+        for turn in turns:
+            for message in turn:
+                text = _message_text(message)
+                if message.tool_calls:
+                    text += " " + json.dumps(
+                        [tool_call["tool"] for tool_call in message.tool_calls]
+                    )
+                if len(text) > self.max_summary_input_chars:
+                    text = text[: self.max_summary_input_chars] + " ..."
+                lines.append(f"{message.role}: {text}")
+        response = self.llm.chat_completions(
+            messages=[
+                {"role": RoleTypes.system.value, "content": CONTEXT_SUMMARY_PROMPT},
+                {"role": RoleTypes.user.value, "content": "\n".join(lines)},
+            ]
+        )
+        if not response.status or not response.content:
+            logger.warning(f"Failed to summarize the reasoning context: {response.content}")
+            return None
+        return response.content
+
+    def _to_llm_msgs(self, messages: List[ContextMessage]) -> List[dict]:
+        # The leading system messages, i.e. the system prompt, the media description and the summary, are sent as one system message with a text part each, as some LLMs take only one system message
+        start = 0
+        while start < len(messages) and messages[start].role == RoleTypes.system:
+            start += 1
+        llm_msgs = [message.to_llm_msg() for message in messages]
+        if start < 2:
+            return llm_msgs
+        # Reused while the system messages are unchanged, so every request starts with the same cacheable prefix
+        head = llm_msgs[:start]
+        if self._system is None or not _same_messages(self._system[0], head):
+            self._system = (
+                head,
+                {
+                    "role": RoleTypes.system.value,
+                    "content": [
+                        {"type": "text", "text": llm_msg["content"]} for llm_msg in head
+                    ],
+                },
+            )
+        return [self._system[1]] + llm_msgs[start:]
+
+
+def _message_text(message: ContextMessage) -> str:
+    if message.content is None:
+        return ""
+    if isinstance(message.content, str):
+        return message.content
+    return json.dumps(message.content)
+
+
+def _same_messages(cached: List[dict], messages: List[dict]) -> bool:
+    return len(cached) == len(messages) and all(
+        a is b for a, b in zip(cached, messages)
+    )
+
+
+def _is_summary(message: ContextMessage) -> bool:
+    return isinstance(message.content, str) and message.content.startswith(
+        SUMMARY_PREFIX
+    )
@@ -0,0 +1,182 @@
+"""Delta protocol for output message updates over socket.io.
+
+Instead of the whole message on every change, a client that connects with ``protocol=delta`` receives ``chat_delta`` frames:
+
+- ``{"v": 1, "type": "snapshot", "msg_id", "seq", "final", "data"}`` carries the whole message.
+- ``{"v": 1, "type": "patch", "msg_id", "seq", "final", "ops"}`` carries JSON Patch (RFC 6902) ``add``, ``remove`` and ``replace`` operations against the state of frame ``seq - 1``.
+
+``seq`` starts at 0 for every message and increases by one per frame. The first frame, every ``SOCKET_DELTA_SNAPSHOT_INTERVAL``-th frame and the final frame are snapshots. A client that sees a gap in ``seq`` sends a ``resync`` event with the ``msg_id`` and gets a snapshot back.
+"""
+
+import os
+import copy
+import threading
+
+from collections import OrderedDict
+
+PROTOCOL_VERSION = 1
+
+
+def _escape(key) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def make_patch(old, new, path: str = "") -> list:
+    """Return the JSON Patch operations that turn ``old`` into ``new``.
+
+    Dictionaries are diffed by key and lists by position, so appended items and changed fields produce small operations.
+    """
+    if type(old) is type(new) and old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [
+            {"op": "remove", "path": f"{path}/{_escape(key)}"}
+            for key in old
+            if key not in new
+        ]
+        for key, value in new.items():
+            key_path = f"{path}/{_escape(key)}"
+            if key in old:
+                ops.extend(make_patch(old[key], value, key_path))
+            else:
+                ops.append({"op": "add", "path": key_path, "value": value})
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        ops = []
+        for i in range(common):
+            ops.extend(make_patch(old[i], new[i], f"{path}/{i}"))
+        for i in range(len(old) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+        for value in new[common:]:
+            ops.append({"op": "add", "path": f"{path}/-", "value": value})
+        return ops
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def apply_patch(doc, ops: list):
+    """Apply JSON Patch operations created by :func:`make_patch` to a copy of ``doc`` and return it."""
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        if op["path"] == "":
+            doc = copy.deepcopy(op["value"])
+            continue
+        *parents, last = [_unescape(token) for token in op["path"].split("/")[1:]]
+        target = doc
+        for token in parents:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+        value = copy.deepcopy(op.get("value"))
+        if isinstance(target, list):
+            if op["op"] == "add" and last == "-":
+                target.append(value)
+            elif op["op"] == "add":
+                target.insert(int(last), value)
+            elif op["op"] == "remove":
+                del target[int(last)]
+            else:
+                target[int(last)] = value
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = value
+    return doc
+
+
+class DeltaStream:
+    """Creates the frames of one message, diffing each new state against the last one sent."""
+
+    def __init__(self, msg_id: str, snapshot_interval: int = None):
+        """
+        :param str msg_id: ID of the message.
+        :param int snapshot_interval: Send a snapshot every this many frames, defaults to ``SOCKET_DELTA_SNAPSHOT_INTERVAL`` or 20.
+        """
+        self.msg_id = msg_id
+        self.snapshot_interval = snapshot_interval or int(
+            os.getenv("SOCKET_DELTA_SNAPSHOT_INTERVAL", 20)
+        )
+        self.seq = -1
+        self.state = None
+        self.final = False
+        self._lock = threading.Lock()
+
+    def frame(self, state: dict, final: bool = False):
+        """Return the next frame for ``state``, or ``None`` if nothing changed since the last frame.
+
+        ``state`` is kept as the base of the next diff, so it must not be modified afterwards.
+
+        :param dict state: Current state of the message.
+        :param bool final: Whether this is the last state of the message, it is always sent as a snapshot.
+        """
+        with self._lock:
+            if self.state is None or final or (self.seq + 1) % self.snapshot_interval == 0:
+                self.seq += 1
+                self.state = state
+                self.final = final
+                return self._snapshot()
+            ops = make_patch(self.state, state)
+            if not ops:
+                return None
+            self.seq += 1
+            self.state = state
+            return {
+                "v": PROTOCOL_VERSION,
+                "type": "patch",
+                "msg_id": self.msg_id,
+                "seq": self.seq,
+                "final": False,
+                "ops": ops,
+            }
+
+    def snapshot(self):
+        """Return a snapshot of the last state sent, for clients that missed a frame. It reuses the current ``seq``."""
+        with self._lock:
+            return self._snapshot() if self.state is not None else None
+
+    def _snapshot(self) -> dict:
+        return {
+            "v": PROTOCOL_VERSION,
+            "type": "snapshot",
+            "msg_id": self.msg_id,
+            "seq": self.seq,
+            "final": self.final,
+            "data": self.state,
+        }
+
+
+# Streams of recent messages, kept after they finish so late resyncs are answered from memory
+_streams = OrderedDict()
+_streams_lock = threading.Lock()
+_max_streams = int(os.getenv("SOCKET_DELTA_MAX_STREAMS", 1024))
+
+# socket.io session IDs of the clients that connected with ``protocol=delta``
+_delta_clients = set()
+
+
+def get_stream(msg_id: str, create: bool = True) -> DeltaStream:
+    """Return the delta stream of ``msg_id``, creating it if needed unless ``create`` is false."""
+    with _streams_lock:
+        stream = _streams.get(msg_id)
+        if stream is not None:
+            _streams.move_to_end(msg_id)
+        elif create:
+            stream = _streams[msg_id] = DeltaStream(msg_id)
+            while len(_streams) > _max_streams:
+                _streams.popitem(last=False)
+        return stream
+
+
+def enable_delta(sid: str):
+    """Send delta frames to the client with socket.io session ID ``sid``."""
+    _delta_clients.add(sid)
+
+
+def disable_delta(sid: str):
+    _delta_clients.discard(sid)
+
+
+def wants_delta(sid: str) -> bool:
+    return sid in _delta_clients
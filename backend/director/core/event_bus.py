@@ -0,0 +1,139 @@
+import os
+import time
+import logging
+import threading
+
+from director.core.delta import get_stream, wants_delta
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """Sits between :class:`OutputMessage` and socket.io, so agent threads never wait on socket I/O.
+
+    Updates are queued per message and sent by a dedicated emitter thread. A burst of updates to the same message is coalesced into the latest state, and each message is sent at most ``max_rate`` times per second. Final states skip the rate limit and go out immediately. The time of the last emit of a message is forgotten on its final state, or once it no longer limits the rate, so messages that never finish, e.g. of a failed or cancelled run, aren't kept.
+    """
+
+    def __init__(self, socketio, max_rate: float = None, namespace: str = "/chat"):
+        """
+        :param socketio: The ``flask_socketio.SocketIO`` server to emit with.
+        :param float max_rate: Maximum emits per second per message, defaults to ``SOCKET_MAX_EMITS_PER_SECOND`` or 10.
+        :param str namespace: socket.io namespace of the events.
+        """
+        self.socketio = socketio
+        self.namespace = namespace
+        self.max_rate = max_rate or float(os.getenv("SOCKET_MAX_EMITS_PER_SECOND", 10))
+        self._pending = {}
+        self._last_emit = {}
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self.stats = {"published": 0, "emitted": 0, "coalesced": 0, "dropped": 0}
+
+    def publish(self, sid: str, msg_id: str, state: dict, final: bool = False):
+        """Queue the latest state of a message for the client ``sid``. Returns immediately.
+
+        :param str sid: socket.io session ID of the client.
+        :param str msg_id: ID of the message.
+        :param dict state: The whole message, it must not be modified afterwards.
+        :param bool final: Whether the message reached a terminal state.
+        """
+        with self._cond:
+            self.stats["published"] += 1
+            previous = self._pending.get(msg_id)
+            if previous is not None:
+                self.stats["coalesced"] += 1
+                final = final or previous[2]
+            self._pending[msg_id] = (sid, state, final)
+            self._cond.notify_all()
+        self._ensure_thread()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued update was sent.
+
+        :return: False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _ensure_thread(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = self.socketio.start_background_task(self._run)
+
+    def _next_batch(self) -> list:
+        """Wait until at least one message is due and take the due ones from the queue."""
+        interval = 1.0 / self.max_rate
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                due, wait = [], None
+                for msg_id, (_, _, final) in self._pending.items():
+                    due_at = now if final else self._last_emit.get(msg_id, 0) + interval
+                    if due_at <= now:
+                        due.append(msg_id)
+                    else:
+                        wait = min(wait or due_at - now, due_at - now)
+                if due:
+                    for msg_id, emitted_at in list(self._last_emit.items()):
+                        if now - emitted_at >= interval:
+                            del self._last_emit[msg_id]
+                    batch = []
+                    for msg_id in due:
+                        sid, state, final = self._pending.pop(msg_id)
+                        if final:
+                            self._last_emit.pop(msg_id, None)
+                        else:
+                            self._last_emit[msg_id] = now
+                        batch.append((sid, msg_id, state, final))
+                    self._in_flight = len(batch)
+                    return batch
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            for sid, msg_id, state, final in self._next_batch():
+                self._send(sid, msg_id, state, final)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _send(self, sid: str, msg_id: str, state: dict, final: bool):
+        if sid is None:
+            self.stats["dropped"] += 1
+            return
+        try:
+            if wants_delta(sid):
+                frame = get_stream(msg_id).frame(state, final=final)
+                if frame is None:
+                    self.stats["coalesced"] += 1
+                    return
+                self.socketio.emit(
+                    "chat_delta", frame, namespace=self.namespace, to=sid
+                )
+            else:
+                self.socketio.emit("chat", state, namespace=self.namespace, to=sid)
+            self.stats["emitted"] += 1
+        except Exception as e:
+            self.stats["dropped"] += 1
+            logger.error(f"Error in emitting message {msg_id}: {e}")
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus(socketio) -> EventBus:
+    """Return the process-wide event bus, creating it for ``socketio`` on first use."""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = EventBus(socketio)
+        return _bus
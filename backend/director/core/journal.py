@@ -0,0 +1,247 @@
+import os
+import glob
+import json
+import time
+import socket
+import logging
+import threading
+
+from director.core.delta import DeltaStream, apply_patch
+from director.db.base import BaseDB
+
+logger = logging.getLogger(__name__)
+
+
+class MessageJournal:
+    """Append-only log of the live updates of output messages, used to rebuild in-progress messages after a crash.
+
+    Output messages are only stored in the database on content changes and terminal states, so the latest actions and text of a running message exist only in memory. The journal records every update as a delta frame of :mod:`director.core.delta`. It is truncated whenever no message is in progress. With runs that overlap it is compacted once it grows past ``max_bytes``: it is rewritten with a snapshot of each message in progress, which drops the frames of finished messages.
+
+    Frames are diffed under a lock per message, only the file write is serialized. The file is flushed on terminal states and at most every ``flush_interval`` seconds otherwise.
+    """
+
+    def __init__(self, path: str, max_bytes: int = None, flush_interval: float = None):
+        """
+        :param str path: Path of the journal file.
+        :param int max_bytes: Size after which the journal is compacted, defaults to ``MESSAGE_JOURNAL_MAX_BYTES`` or 4 MB.
+        :param float flush_interval: Seconds between flushes of the file, defaults to ``MESSAGE_JOURNAL_FLUSH_INTERVAL`` or 0.2.
+        """
+        self.path = path
+        self.max_bytes = max_bytes or int(
+            os.getenv("MESSAGE_JOURNAL_MAX_BYTES", 4 * 1024 * 1024)
+        )
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else float(os.getenv("MESSAGE_JOURNAL_FLUSH_INTERVAL", 0.2))
+        )
+        # msg_id -> (DeltaStream, lock held while a frame of the message is made and written)
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._compact_at = self.max_bytes
+        self._flushed_at = 0.0
+
+    def record(self, state: dict, final: bool = False):
+        """Append the latest state of a message.
+
+        :param dict state: The whole message, as stored in the database.
+        :param bool final: Whether the message reached a terminal state.
+        """
+        msg_id = state["msg_id"]
+        with self._lock:
+            entry = self._streams.get(msg_id)
+            if entry is None:
+                entry = self._streams[msg_id] = (DeltaStream(msg_id), threading.Lock())
+        stream, message_lock = entry
+        # Frames of a message are written in the order of their seq
+        with message_lock:
+            frame = stream.frame(state, final=final)
+            line = json.dumps(frame) + "\n" if frame is not None else None
+            with self._lock:
+                if line is not None:
+                    self._write(line, flush=final)
+                if final:
+                    self._streams.pop(msg_id, None)
+                    if not self._streams:
+                        self._truncate()
+                if self._size >= self._compact_at:
+                    self._compact()
+
+    def _write(self, line: str, flush: bool = False):
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a")
+                self._size = self._file.tell()
+            self._file.write(line)
+            self._size += len(line)
+            if flush or time.monotonic() - self._flushed_at >= self.flush_interval:
+                self._file.flush()
+                self._flushed_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error in writing message journal: {e}")
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _truncate(self):
+        try:
+            self._close()
+            open(self.path, "w").close()
+            self._size = 0
+            self._compact_at = self.max_bytes
+        except Exception as e:
+            logger.error(f"Error in truncating message journal: {e}")
+
+    def _compact(self):
+        """Rewrite the journal with a snapshot of each message in progress."""
+        snapshots = [stream.snapshot() for stream, _ in self._streams.values()]
+        lines = "".join(
+            json.dumps(snapshot) + "\n" for snapshot in snapshots if snapshot
+        )
+        try:
+            self._close()
+            with open(self.path + ".tmp", "w") as f:
+                f.write(lines)
+            os.replace(self.path + ".tmp", self.path)
+            self._size = len(lines)
+            logger.info(
+                f"Compacted message journal to {len(snapshots)} messages in progress"
+            )
+        except Exception as e:
+            logger.error(f"Error in compacting message journal: {e}")
+        # The snapshots alone may be large, don't compact again until the journal doubled
+        self._compact_at = max(self.max_bytes, 2 * self._size)
+
+    def replay(self) -> dict:
+        """Rebuild the last recorded state of every message in the journal.
+
+        :return: ``{msg_id: (state, final)}``. Messages whose frames have a gap keep the state before the gap.
+        """
+        messages = {}
+        if not os.path.exists(self.path):
+            return messages
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    frame = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short by the crash
+                    continue
+                msg_id = frame["msg_id"]
+                if frame["type"] == "snapshot":
+                    messages[msg_id] = (frame["data"], frame["final"], frame["seq"])
+                elif msg_id in messages and messages[msg_id][2] == frame["seq"] - 1:
+                    state = apply_patch(messages[msg_id][0], frame["ops"])
+                    messages[msg_id] = (state, frame["final"], frame["seq"])
+        return {msg_id: (state, final) for msg_id, (state, final, _) in messages.items()}
+
+    def recover(self, db: BaseDB) -> int:
+        """Store the messages left in the journal by a crashed process and truncate it. Call it on startup, before any message is recorded, or on the journal of a stopped process, see :func:`recover_journals`.
+
+        Messages that never reached a terminal state are stored with the ``error`` status, as their run is gone.
+
+        :return: Number of interrupted messages.
+        """
+        from director.core.session import MsgStatus
+
+        with self._lock:
+            messages = self.replay()
+            stored = {}
+            session_ids = {state["session_id"] for state, _ in messages.values()}
+            for session_id in session_ids:
+                for message in db.get_conversations(session_id):
+                    stored[message["msg_id"]] = message
+            interrupted = 0
+            recovered = []
+            for msg_id, (state, final) in messages.items():
+                if not final:
+                    status = stored.get(msg_id, {}).get("status", MsgStatus.progress)
+                    if status != MsgStatus.progress:
+                        # Stored as finished just before the crash
+                        continue
+                    interrupted += 1
+                    state["status"] = MsgStatus.error.value
+                    state["actions"] = state.get("actions", []) + [
+                        "Interrupted by a server restart"
+                    ]
+                recovered.append(state)
+            if recovered:
+                db.add_or_update_msgs_to_conv(recovered)
+                logger.info(
+                    f"Recovered {len(recovered)} messages from {self.path}, {interrupted} were interrupted"
+                )
+            self._truncate()
+        return interrupted
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def _journal_prefix(base_path: str) -> str:
+    """Prefix of the journal paths of the processes of this host."""
+    return f"{base_path}.{socket.gethostname()}."
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def get_journal():
+    """Return the message journal of this process, or ``None`` if ``MESSAGE_JOURNAL_PATH`` is set empty.
+
+    Every process writes its own journal, at ``MESSAGE_JOURNAL_PATH`` (default ``director.journal``) suffixed with the host name and the process id, so workers and replicas sharing a directory never touch each other's journal. A forked worker gets a new journal.
+    """
+    global _journal
+    with _journal_lock:
+        if _journal is None or _journal[0] != os.getpid():
+            base_path = os.getenv("MESSAGE_JOURNAL_PATH", "director.journal")
+            if not base_path:
+                return None
+            _journal = (
+                os.getpid(),
+                MessageJournal(f"{_journal_prefix(base_path)}{os.getpid()}"),
+            )
+        return _journal[1]
+
+
+def recover_journals(db: BaseDB) -> int:
+    """Store the messages left in the journals of stopped processes of this host and delete those journals. Call it on startup, before any message is recorded.
+
+    A journal is stale when its process is not running or is this process, whose pid was reused. Each journal is claimed by renaming it, so workers starting at the same time recover it once.
+
+    :return: Number of interrupted messages.
+    """
+    base_path = os.getenv("MESSAGE_JOURNAL_PATH", "director.journal")
+    if not base_path:
+        return 0
+    prefix = _journal_prefix(base_path)
+    interrupted = 0
+    for path in glob.glob(f"{glob.escape(prefix)}*"):
+        pid = path[len(prefix) :]
+        if not pid.isdigit():
+            continue
+        if int(pid) != os.getpid() and _is_running(int(pid)):
+            continue
+        claimed = f"{path}.recover.{os.getpid()}"
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            # Claimed by another worker
+            continue
+        try:
+            interrupted += MessageJournal(claimed).recover(db)
+            os.remove(claimed)
+        except Exception as e:
+            logger.error(f"Error in recovering message journal {path}: {e}")
+    return interrupted
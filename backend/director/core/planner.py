@@ -0,0 +1,276 @@
+"""Plan and execute strategy of the reasoning engine.
+
+Instead of one LLM round trip per agent, the LLM calls the ``plan`` tool once with all the agent steps of the request. A step can use the output of earlier steps as arguments, which makes it depend on them. :class:`PlanExecutor` runs the steps locally as their dependencies succeed, and the LLM is only asked again to repair a failed step and to summarize.
+"""
+
+import re
+import logging
+import contextvars
+
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+from director.agents.base import AgentResponse, AgentStatus
+from director.core.cancellation import check_cancelled
+
+logger = logging.getLogger(__name__)
+
+PLAN_TOOL_NAME = "plan"
+
+#: A string argument that refers to the output of a step, e.g. ``$s1.data.video_id``
+REFERENCE_PATTERN = re.compile(r"^\$([A-Za-z_][\w-]*)((?:\.[\w-]+)+)$")
+
+PLAN_TOOL = {
+    "name": PLAN_TOOL_NAME,
+    "description": "Run several agents as one plan instead of calling them one by one. A step runs as soon as the steps it depends on succeed, independent steps may run at the same time.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "steps": {
+                "type": "array",
+                "description": "The agent steps of the request, in the order they should run.",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {
+                            "type": "string",
+                            "description": "Unique id of the step, e.g. s1.",
+                        },
+                        "agent": {
+                            "type": "string",
+                            "description": "Name of the agent to run.",
+                        },
+                        "arguments": {
+                            "type": "object",
+                            "description": 'Arguments of the agent. A string argument "$<step id>.data.<key>" is replaced by that value from the output of an earlier step, and makes this step depend on it.',
+                        },
+                        "depends_on": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Ids of other steps that must succeed before this one.",
+                        },
+                    },
+                    "required": ["id", "agent", "arguments"],
+                },
+            }
+        },
+        "required": ["steps"],
+    },
+}
+
+PLANNING_PROMPT = """
+Plan the whole request before running any agent. Call the plan tool once with every agent step the request needs, using "$<step id>.data.<key>" arguments to pass the output of a step to a later one.
+If the request needs no agent, answer it directly without calling tools.
+""".strip()
+
+REPAIR_PROMPT = """
+The plan could not be completed: {failure}
+Steps that succeeded: {succeeded}.
+Steps that did not run: {not_run}.
+Call the plan tool again with the steps that are still needed to complete the request. They may use the output of the steps that succeeded, use new ids for the new steps.
+If the request cannot be completed, answer without calling tools and explain why.
+""".strip()
+
+
+class PlanStep(BaseModel):
+    """One agent invocation of a plan."""
+
+    id: str
+    agent: str
+    arguments: dict = {}
+    depends_on: List[str] = []
+
+    def dependencies(self) -> set:
+        """Ids of the steps this one waits for, the listed ones and the referenced ones."""
+        return set(self.depends_on) | references(self.arguments)
+
+
+class Plan(BaseModel):
+    """Agent steps and their dependencies, a directed acyclic graph."""
+
+    steps: List[PlanStep] = []
+
+    @classmethod
+    def from_tool_calls(cls, tool_calls: List[dict]) -> "Plan":
+        """Build a plan from the tool calls of an LLM response. The steps of ``plan`` calls are taken as they are, a direct call of an agent becomes a step without dependencies.
+
+        :raises TypeError: If the plan or a step is not an object.
+        :raises ValueError: If a step has missing or invalid fields, a pydantic ``ValidationError``.
+        """
+        steps = []
+        for tool_call in tool_calls:
+            if tool_call["tool"]["name"] == PLAN_TOOL_NAME:
+                arguments = tool_call["tool"]["arguments"]
+                if not isinstance(arguments, dict) or not isinstance(
+                    arguments.get("steps", []), list
+                ):
+                    raise TypeError("The plan must be an object with a list of steps.")
+                for step in arguments.get("steps", []):
+                    if not isinstance(step, dict):
+                        raise TypeError(f"Step {step!r} is not an object.")
+                    steps.append(PlanStep(**step))
+            else:
+                steps.append(
+                    PlanStep(
+                        id=tool_call["id"],
+                        agent=tool_call["tool"]["name"],
+                        arguments=tool_call["tool"]["arguments"],
+                    )
+                )
+        return cls(steps=steps)
+
+    def validate_steps(self, agent_names: set, completed: set = None):
+        """Check that the steps run known agents, have unique ids and only depend on steps of the plan or ``completed`` steps, without cycles.
+
+        :raises ValueError: Describing the first problem found.
+        """
+        completed = completed or set()
+        ids = set()
+        for step in self.steps:
+            if step.id in ids or step.id in completed:
+                raise ValueError(f"Step id {step.id} is used more than once.")
+            if step.agent not in agent_names:
+                raise ValueError(f"Step {step.id} runs unknown agent {step.agent}.")
+            ids.add(step.id)
+        for step in self.steps:
+            unknown = step.dependencies() - ids - completed
+            if unknown:
+                raise ValueError(
+                    f"Step {step.id} depends on unknown steps {sorted(unknown)}."
+                )
+        # Kahn's algorithm, steps left over are part of a cycle
+        waiting = {step.id: step.dependencies() & ids for step in self.steps}
+        while waiting:
+            ready = [step_id for step_id, deps in waiting.items() if not deps]
+            if not ready:
+                raise ValueError(f"Steps {sorted(waiting)} depend on each other.")
+            for step_id in ready:
+                del waiting[step_id]
+            for deps in waiting.values():
+                deps.difference_update(ready)
+
+
+def references(value) -> set:
+    """Ids of the steps referenced by the string values of ``value``."""
+    match = REFERENCE_PATTERN.match(value) if isinstance(value, str) else None
+    if match:
+        return {match.group(1)}
+    if isinstance(value, dict):
+        return set().union(*(references(item) for item in value.values()))
+    if isinstance(value, list):
+        return set().union(*(references(item) for item in value))
+    return set()
+
+
+def resolve(value, results: Dict[str, AgentResponse]):
+    """Replace the references in ``value`` with the outputs of the steps in ``results``.
+
+    :raises ValueError: If a referenced value does not exist, with the keys that do.
+    """
+    if isinstance(value, dict):
+        return {key: resolve(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve(item, results) for item in value]
+    match = REFERENCE_PATTERN.match(value) if isinstance(value, str) else None
+    if not match:
+        return value
+    current = results[match.group(1)].model_dump()
+    for key in match.group(2)[1:].split("."):
+        if isinstance(current, list) and key.isdigit() and int(key) < len(current):
+            current = current[int(key)]
+        elif isinstance(current, dict) and key in current:
+            current = current[key]
+        else:
+            available = list(current) if isinstance(current, dict) else []
+            raise ValueError(f"{value} does not exist, {key} is not one of {available}")
+    return current
+
+
+class PlanExecutor:
+    """Runs the steps of a :class:`Plan` on the executor of a :class:`ReasoningEngine` as their dependencies succeed.
+
+    With ``REASONING_PARALLEL_TOOL_CALLS=true``, steps of parallel safe agents whose dependencies succeeded run at the same time. A step of an agent that is not parallel safe runs on its own. After a step fails no new steps start, the running ones finish.
+    """
+
+    def __init__(self, engine, plan: Plan, results: Dict[str, AgentResponse] = None):
+        """
+        :param engine: The reasoning engine, runs the agents.
+        :param Plan plan: The plan to run, validated.
+        :param dict results: Responses of steps that succeeded before, by step id. The responses of this plan's successful steps are added.
+        """
+        self.engine = engine
+        self.plan = plan
+        self.results = results if results is not None else {}
+        #: Steps that ran, with their resolved arguments and responses, in the order they finished
+        self.executed = []
+        #: Why the plan failed, None if all steps succeeded
+        self.failure = None
+        #: Ids of the steps that did not run because of a failure
+        self.not_run = []
+
+    def _parallel(self, step: PlanStep) -> bool:
+        agent = self.engine.get_agent(step.agent)
+        return self.engine.parallel_tool_calls and agent.parallel_safe
+
+    def _run_step(self, step: PlanStep, arguments: dict) -> AgentResponse:
+        try:
+            return self.engine.run_agent(step.agent, **arguments)
+        except Exception as e:
+            logger.exception(f"Error running step {step.id}")
+            return AgentResponse(
+                status=AgentStatus.ERROR, message=f"Step failed with error {e}"
+            )
+
+    def _finish(self, step: PlanStep, arguments: dict, response: AgentResponse):
+        self.executed.append((step, arguments, response))
+        if response.status == AgentStatus.ERROR:
+            if self.failure is None:
+                self.failure = f"Step {step.id} ({step.agent}) failed: {response.message}"
+        else:
+            self.results[step.id] = response
+
+    def run(self) -> "PlanExecutor":
+        """Run the plan, checking for cancellation while waiting for steps."""
+        pending = list(self.plan.steps)
+        running = {}
+        exclusive = False
+        while pending or running:
+            check_cancelled()
+            for step in list(pending):
+                if self.failure is not None or exclusive:
+                    break
+                if not step.dependencies() <= self.results.keys():
+                    continue
+                parallel = self._parallel(step)
+                if not parallel and running:
+                    break
+                pending.remove(step)
+                try:
+                    arguments = resolve(step.arguments, self.results)
+                except ValueError as e:
+                    self._finish(
+                        step,
+                        step.arguments,
+                        AgentResponse(status=AgentStatus.ERROR, message=str(e)),
+                    )
+                    break
+                # Each step gets a copy of the context, so its usage is attributed to its agent
+                future = self.engine.get_executor().submit(
+                    contextvars.copy_context().run, self._run_step, step, arguments
+                )
+                running[future] = (step, arguments)
+                exclusive = not parallel
+            if not running:
+                # Nothing left that can run, the remaining steps depend on a failed one
+                break
+            done, _ = wait(running, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                step, arguments = running.pop(future)
+                self._finish(step, arguments, future.result())
+                exclusive = False
+        self.not_run = [step.id for step in pending]
+        if self.failure is None and self.not_run:
+            self.failure = f"Steps {self.not_run} could not run."
+        return self
@@ -1,8 +1,27 @@
+import os
+import json
 import logging
+import time
+import uuid
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List
 
 
 from director.agents.base import BaseAgent, AgentStatus, AgentResponse
+from director.core.context_window import ContextWindow
+from director.core.usage import UsageLedger
+from director.core.cancellation import CancelToken, get_run_registry
+from director.core.tool_router import ToolRouter, tool_tokens
+from director.core.planner import (
+    PLAN_TOOL,
+    PLANNING_PROMPT,
+    REPAIR_PROMPT,
+    Plan,
+    PlanExecutor,
+)
+from director.db.base import content_to_text
 from director.core.session import (
     Session,
     OutputMessage,
@@ -12,8 +31,10 @@ from director.core.session import (
     TextContent,
     MsgStatus,
 )
-from director.llm.base import LLMResponse
+from director.llm.base import LLMResponse, LLMStreamEventType
 from director.llm.openai import OpenAI
+from director.tools.media_index import get_media_index_registry
+from director.utils.exceptions import CancelledException
 
 
 logger = logging.getLogger(__name__)
@@ -41,6 +62,48 @@ Agent responses are already displayed to the user until specified explicitly in
 """
 
 
+class ToolCallDispatcher:
+    """Runs the tool calls of an LLM response on the executor of a :class:`ReasoningEngine` as they are submitted, so a call can start while the response is still streaming.
+
+    Calls of parallel safe agents run at the same time when the engine allows parallel tool calls. Any other call waits for every call before it, and the calls after it wait for it.
+    """
+
+    def __init__(self, engine: "ReasoningEngine"):
+        self.engine = engine
+        self.futures = []
+        # Last call that runs on its own, and the calls started after it
+        self._barrier = None
+        self._since_barrier = []
+
+    def submit(self, tool_call: dict):
+        agent = self.engine.get_agent(tool_call["tool"]["name"])
+        parallel = (
+            self.engine.parallel_tool_calls
+            and agent is not None
+            and agent.parallel_safe
+        )
+        wait_for = [self._barrier] if self._barrier is not None else []
+        if not parallel:
+            wait_for += self._since_barrier
+        # Each call gets a copy of the context, so its usage is attributed to its agent
+        future = self.engine.get_executor().submit(
+            contextvars.copy_context().run, self._run, wait_for, tool_call
+        )
+        if parallel:
+            self._since_barrier.append(future)
+        else:
+            self._barrier, self._since_barrier = future, []
+        self.futures.append(future)
+
+    def _run(self, wait_for: list, tool_call: dict) -> AgentResponse:
+        wait(wait_for)
+        return self.engine._run_tool_call(tool_call)
+
+    def results(self) -> List[AgentResponse]:
+        """Wait for all submitted calls and return their responses in the order of submission."""
+        return [future.result() for future in self.futures]
+
+
 class ReasoningEngine:
     """The Reasoning Engine is the core class that directly interfaces with the user. It interprets natural language input in any conversation and orchestrates agents to fulfill the user's requests. The primary functions of the Reasoning Engine are:
 
@@ -65,11 +128,38 @@ class ReasoningEngine:
         self.system_prompt = REASONING_SYSTEM_PROMPT
         self.max_iterations = 10
         self.llm = OpenAI()
+        self.context_window = ContextWindow(session=self.session, llm=self.llm)
+        self.usage = UsageLedger(
+            db=self.session.db,
+            session_id=self.session.session_id,
+            conv_id=self.session.conv_id,
+        )
         self.agents: List[BaseAgent] = []
+        self._tools = None
+        # Agents the tool router offers in this run, None offers all agents
+        self.routed_agents: List[BaseAgent] = None
+        self.tool_router = os.getenv("REASONING_TOOL_ROUTER", "false").lower() == "true"
+        self.tool_tokens_saved = 0
         self.stop_flag = False
+        self.cancel_token = CancelToken()
         self.output_message: OutputMessage = self.session.output_message
         self.summary_content = None
         self.failed_agents = []
+        self.parallel_tool_calls = (
+            os.getenv("REASONING_PARALLEL_TOOL_CALLS", "false").lower() == "true"
+        )
+        self.max_parallel_tool_calls = int(
+            os.getenv("REASONING_MAX_PARALLEL_TOOL_CALLS", 4)
+        )
+        self.stream = os.getenv("REASONING_STREAM", "true").lower() == "true"
+        # Seconds between updates of the output message while text is streamed
+        self.stream_update_interval = 0.1
+        # Media of a collection listed in the context, larger collections get the most relevant ones
+        self.media_top_k = int(os.getenv("REASONING_MEDIA_TOP_K", 20))
+        # "react" asks the LLM after every agent step, "plan" runs a plan of all steps
+        self.strategy = os.getenv("REASONING_STRATEGY", "react").lower()
+        self.plan_max_repairs = int(os.getenv("REASONING_PLAN_MAX_REPAIRS", 2))
+        self._executor = None
 
     def register_agents(self, agents: List[BaseAgent]):
         """Register an agents.
@@ -77,45 +167,83 @@ class ReasoningEngine:
         :param agents: The list of agents to register.
         """
         self.agents.extend(agents)
+        self.routed_agents = None
+        self._tools = None
+
+    @property
+    def tools(self) -> List[dict]:
+        """Tool schemas of the registered agents, or of the agents picked by the tool router, built once per agent set. The same list is passed on every step, so the LLM formats it only once. They are sorted by name, so the prompt prefix doesn't depend on the order the agents were registered in."""
+        if self._tools is None:
+            agents = self.agents if self.routed_agents is None else self.routed_agents
+            tools = [agent.to_llm_format() for agent in agents]
+            if self.strategy == "plan":
+                tools.append(PLAN_TOOL)
+            self._tools = sorted(tools, key=lambda tool: tool["name"])
+        return self._tools
+
+    def describe_media(self) -> str:
+        """Describe the video or the collection of the session for the LLM. Collections with more than ``media_top_k`` videos and images are described by their size and the media that match the first message best, from the media index of the collection."""
+        collection = self.session.state["collection"]
+        if self.session.video_id:
+            video = self.session.state["video"]
+            return f"""This is a video in the collection titled {collection.name} collection_id is {collection.id} \nHere is the video refer to this for search, summary and editing \n- title: {video.name}, video_id: {video.id}, media_description: {video.description}, length: {video.length}"""
+
+        index = get_media_index_registry().get(collection)
+        if len(index) <= self.media_top_k:
+            media = index.list(k=len(index))
+            intro = "Here are the videos in this collection user may refer to them for search, summary and editing"
+        else:
+            media = index.search(
+                content_to_text(self.input_message.content), k=self.media_top_k
+            )
+            intro = f"The collection has {index.count('video')} videos and {index.count('image')} images. Here are the ones that match the first message of the user"
+            if any(agent.name == "lookup_media" for agent in self.agents):
+                intro += ", use the lookup_media agent to find the others"
+
+        video_titles = "\n".join(
+            f"\n- title: {video['name']}, video_id: {video['id']}, media_description: {video['description']}, length: {video['length']}, video_stream: {video['stream_url']}"
+            for video in media
+            if video["type"] == "video"
+        )
+        image_titles = "\n".join(
+            f"\n- title: {image['name']}, image_id: {image['id']}, url: {image['url']}"
+            for image in media
+            if image["type"] == "image"
+        )
+        return f"""This is a collection of videos and the collection description is {collection.description} and collection_id is {collection.id} \n\n{intro} {video_titles}\n\nHere are the images in this collection {image_titles}"""
 
     def build_context(self):
-        """Build the context for the reasoning engine it adds the information about the video or collection to the reasoning context."""
+        """Build the context for the reasoning engine it adds the information about the video or collection to the reasoning context.
+
+        A new session starts with the system prompt and the description of its media as two system messages. Both stay unchanged for the whole session, so together with the tool schemas they form a prompt prefix the LLM providers can cache.
+        """
         input_context = ContextMessage(
             content=self.input_message.content, role=RoleTypes.user
         )
-        if self.session.reasoning_context:
-            self.session.reasoning_context.append(input_context)
-        else:
-            if self.session.video_id:
-                video = self.session.state["video"]
-                self.session.reasoning_context.append(
-                    ContextMessage(
-                        content=self.system_prompt
-                        + f"""\nThis is a video in the collection titled {self.session.state["collection"].name} collection_id is {self.session.state["collection"].id} \nHere is the video refer to this for search, summary and editing \n- title: {video.name}, video_id: {video.id}, media_description: {video.description}, length: {video.length}"""
-                    )
-                )
-            else:
-                videos = self.session.state["collection"].get_videos()
-                video_title_list = []
-                for video in videos:
-                    video_title_list.append(
-                        f"\n- title: {video.name}, video_id: {video.id}, media_description: {video.description}, length: {video.length}, video_stream: {video.stream_url}"
-                    )
-                video_titles = "\n".join(video_title_list)
-                images = self.session.state["collection"].get_images()
-                image_title_list = []
-                for image in images:
-                    image_title_list.append(
-                        f"\n- title: {image.name}, image_id: {image.id}, url: {image.url}"
-                    )
-                image_titles = "\n".join(image_title_list)
-                self.session.reasoning_context.append(
-                    ContextMessage(
-                        content=self.system_prompt
-                        + f"""\nThis is a collection of videos and the collection description is {self.session.state["collection"].description} and collection_id is {self.session.state["collection"].id} \n\nHere are the videos in this collection user may refer to them for search, summary and editing {video_titles}\n\nHere are the images in this collection {image_titles}"""
-                    )
-                )
-            self.session.reasoning_context.append(input_context)
+        if not self.session.reasoning_context:
+            self.session.reasoning_context.extend(
+                [
+                    ContextMessage(content=self.system_prompt),
+                    ContextMessage(content=self.describe_media()),
+                ]
+            )
+        self.session.reasoning_context.append(input_context)
+
+    def route_tools(self):
+        """Offer only the agents the tool router ranks relevant to the user message and the recent context, see :class:`ToolRouter`.
+
+        The agents are picked once per run, so the tool schemas stay the same on every step and remain part of the cached prompt prefix. Agents that are not offered can still be run by name.
+        """
+        all_tokens = tool_tokens(self.llm, self.tools)
+        self.routed_agents = ToolRouter(self.agents).route(
+            self.session.reasoning_context
+        )
+        self._tools = None
+        self.tool_tokens_saved = all_tokens - tool_tokens(self.llm, self.tools)
+        logger.info(
+            f"Tool router offers {[tool['name'] for tool in self.tools]}, "
+            f"{self.tool_tokens_saved} of {all_tokens} tool tokens saved per call"
+        )
 
     def get_current_run_context(self):
         for i in range(len(self.session.reasoning_context) - 1, -1, -1):
@@ -148,13 +276,176 @@ class ReasoningEngine:
         print("-" * 40, f"Running {agent_name} Agent", "-" * 40)
         print(kwargs, "\n\n")
 
-        agent = next(
+        agent = self.get_agent(agent_name)
+        with self.output_message.lock:
+            self.output_message.actions.append(f"Running @{agent_name} agent")
+            self.output_message.agents.append(agent_name)
+            self.output_message.push_update()
+        return agent.safe_call(*args, **kwargs)
+
+    def get_agent(self, agent_name: str) -> BaseAgent:
+        return next(
             (agent for agent in self.agents if agent.agent_name == agent_name), None
         )
-        self.output_message.actions.append(f"Running @{agent_name} agent")
-        self.output_message.agents.append(agent_name)
+
+    def _run_tool_call(self, tool_call: dict) -> AgentResponse:
+        return self.run_agent(tool_call["tool"]["name"], **tool_call["tool"]["arguments"])
+
+    def run_tool_calls(self, tool_calls: List[dict]) -> List[AgentResponse]:
+        """Run the agents of the tool calls of an LLM response and return their responses in the order of the calls.
+
+        With ``REASONING_PARALLEL_TOOL_CALLS=true``, consecutive calls of parallel safe agents run at the same time on up to ``REASONING_MAX_PARALLEL_TOOL_CALLS`` threads. A call of an agent that is not parallel safe waits for the calls before it, and the calls after it wait for it.
+        """
+        if not self.parallel_tool_calls or len(tool_calls) < 2:
+            return [self._run_tool_call(tool_call) for tool_call in tool_calls]
+
+        dispatcher = ToolCallDispatcher(self)
+        for tool_call in tool_calls:
+            dispatcher.submit(tool_call)
+        return dispatcher.results()
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        """Executor the agents of tool calls run on, created on first use and shut down when the run ends."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, self.max_parallel_tool_calls),
+                thread_name_prefix="reasoning-agent",
+            )
+        return self._executor
+
+    def stream_text(self, content: TextContent, events) -> LLMResponse:
+        """Append the text of streamed LLM events to ``content``, updating the output message at most every ``stream_update_interval`` seconds.
+
+        :return: The whole response from the ``done`` event.
+        """
+        response, last_update = None, 0.0
+        for event in events:
+            if event.type == LLMStreamEventType.text:
+                content.text += event.text
+                if time.monotonic() - last_update >= self.stream_update_interval:
+                    self.output_message.push_update()
+                    last_update = time.monotonic()
+            elif event.type == LLMStreamEventType.done:
+                response = event.response
         self.output_message.push_update()
-        return agent.safe_call(*args, **kwargs)
+        return response
+
+    def reason(self, messages: List[dict], tools: List[dict]):
+        """Ask the LLM for the next step and run the agents of its tool calls.
+
+        When streaming, each tool call is dispatched as soon as its arguments are complete, and in the first step the text of the response is streamed to the user as it may be the direct answer.
+
+        :return: The LLM response and the agent responses, in the order of its tool calls.
+        """
+        if not self.stream:
+            llm_response = self.llm.chat_completions(messages=messages, tools=tools)
+            if not llm_response.status or not llm_response.tool_calls:
+                return llm_response, []
+            return llm_response, self.run_tool_calls(llm_response.tool_calls)
+
+        direct = self.iterations == self.max_iterations - 1
+        dispatcher = ToolCallDispatcher(self)
+        llm_response, last_update = None, 0.0
+        for event in self.llm.chat_completions_stream(messages=messages, tools=tools):
+            if event.type == LLMStreamEventType.text and direct and not dispatcher.futures:
+                if not self.summary_content:
+                    self.add_summary_content()
+                    self.summary_content.status_message = "Responding..."
+                self.summary_content.text += event.text
+                if time.monotonic() - last_update >= self.stream_update_interval:
+                    self.output_message.push_update()
+                    last_update = time.monotonic()
+            elif event.type == LLMStreamEventType.tool_call:
+                if self.summary_content:
+                    self.remove_summary_content()
+                    self.output_message.push_update()
+                dispatcher.submit(event.tool_call)
+            elif event.type == LLMStreamEventType.done:
+                llm_response = event.response
+        return llm_response, dispatcher.results()
+
+    def add_tool_results(
+        self, content: str, tool_calls: List[dict], agent_responses: List[AgentResponse]
+    ):
+        """Add tool calls and the responses of their agents to the reasoning context."""
+        self.session.reasoning_context.append(
+            ContextMessage(
+                content=content,
+                tool_calls=tool_calls,
+                role=RoleTypes.assistant,
+            )
+        )
+        for tool_call, agent_response in zip(tool_calls, agent_responses):
+            if agent_response.status == AgentStatus.ERROR:
+                self.failed_agents.append(tool_call["tool"]["name"])
+            self.session.reasoning_context.append(
+                ContextMessage(
+                    content=agent_response.__str__(),
+                    tool_call_id=tool_call["id"],
+                    role=RoleTypes.tool,
+                )
+            )
+            print("-" * 40, "Agent Response", "-" * 40)
+            print(agent_response, "\n\n")
+
+    def summarize(self):
+        """Ask the LLM to summarize the agent responses of the run into the summary content."""
+        self.session.reasoning_context.append(
+            ContextMessage(
+                content=SUMMARIZATION_PROMPT.format(query=self.input_message.content),
+                role=RoleTypes.system,
+            )
+        )
+        summary_messages = [
+            message.to_llm_msg() for message in self.get_current_run_context()
+        ]
+        if self.stream:
+            self.summary_content.text = ""
+            summary_response = self.stream_text(
+                self.summary_content,
+                self.llm.chat_completions_stream(messages=summary_messages),
+            )
+        else:
+            summary_response = self.llm.chat_completions(messages=summary_messages)
+        self.summary_content.text = summary_response.content
+        if self.failed_agents:
+            self.summary_content.status = MsgStatus.error
+        else:
+            self.summary_content.status = MsgStatus.success
+        self.summary_content.status_message = "Final Cut"
+
+    def fail(self, text: str, status_message: str):
+        """Replace the summary with an error and fail the output message."""
+        if self.summary_content:
+            self.remove_summary_content()
+        self.output_message.content.append(
+            TextContent(
+                text=text,
+                status=MsgStatus.error,
+                status_message=status_message,
+                agent_name="assistant",
+            )
+        )
+        self.output_message.actions.append(text)
+        self.output_message.status = MsgStatus.error
+        self.output_message.publish()
+
+    def stop_on_budget(self, reason: str):
+        """Fail the output message because a usage budget is exceeded and stop the run."""
+        self.fail(reason, "Usage budget exceeded")
+        self.stop()
+
+    def stop_on_cancel(self, reason: str):
+        """Fail the output message of a cancelled run and note the cancellation in the context, so the next message doesn't continue the abandoned request."""
+        self.fail(reason, "Cancelled")
+        self.session.reasoning_context.append(
+            ContextMessage(content=f"{reason}.", role=RoleTypes.assistant)
+        )
+        self.stop()
+
+    def cancel(self, reason: str = "The request was cancelled"):
+        """Cancel the run from another thread. It stops at the next checkpoint: before each step, LLM call, streamed event or agent run. Streaming LLM requests are aborted right away."""
+        self.cancel_token.cancel(reason)
 
     def stop(self):
         """Flag the tool to stop processing and exit the run() thread."""
@@ -174,21 +465,25 @@ class ReasoningEngine:
             tries += 1
             if tries > max_tries:
                 break
-            print("-" * 40, "Context", "-" * 40)
-            print(
-                [message.to_llm_msg() for message in self.session.reasoning_context],
-                "\n\n",
+            logger.debug(
+                f"Reasoning over {len(self.session.reasoning_context)} context messages"
             )
-            llm_response: LLMResponse = self.llm.chat_completions(
-                messages=[
-                    message.to_llm_msg() for message in self.session.reasoning_context
-                ]
-                + temp_messages,
-                tools=[agent.to_llm_format() for agent in self.agents],
+            llm_response, agent_responses = self.reason(
+                messages=self.context_window.fit() + temp_messages,
+                tools=self.tools,
             )
+            # Agents of a cancelled run return errors, don't build on them
+            self.cancel_token.check()
+            if self.routed_agents is not None:
+                logger.info(
+                    f"Tool router saved {self.tool_tokens_saved} prompt tokens, "
+                    f"{len(self.tools)} of {len(self.agents)} agents offered"
+                )
             logger.info(f"LLM Response: {llm_response}")
 
             if not llm_response.status:
+                if self.summary_content:
+                    self.remove_summary_content()
                 self.output_message.content.append(
                     TextContent(
                         text=llm_response.content,
@@ -207,30 +502,10 @@ class ReasoningEngine:
                 if self.summary_content:
                     self.remove_summary_content()
 
-                self.session.reasoning_context.append(
-                    ContextMessage(
-                        content=llm_response.content,
-                        tool_calls=llm_response.tool_calls,
-                        role=RoleTypes.assistant,
-                    )
+                self.add_tool_results(
+                    llm_response.content, llm_response.tool_calls, agent_responses
                 )
-                for tool_call in llm_response.tool_calls:
-                    agent_response: AgentResponse = self.run_agent(
-                        tool_call["tool"]["name"],
-                        **tool_call["tool"]["arguments"],
-                    )
-                    if agent_response.status == AgentStatus.ERROR:
-                        self.failed_agents.append(tool_call["tool"]["name"])
-                    self.session.reasoning_context.append(
-                        ContextMessage(
-                            content=agent_response.__str__(),
-                            tool_call_id=tool_call["id"],
-                            role=RoleTypes.tool,
-                        )
-                    )
-                    print("-" * 40, "Agent Response", "-" * 40)
-                    print(agent_response, "\n\n")
-                    status = agent_response.status
+                status = agent_responses[-1].status
 
             if not self.summary_content:
                 self.add_summary_content()
@@ -252,51 +527,152 @@ class ReasoningEngine:
                     self.summary_content.text = llm_response.content
                     self.summary_content.status = MsgStatus.success
                 else:
-                    self.session.reasoning_context.append(
-                        ContextMessage(
-                            content=SUMMARIZATION_PROMPT.format(
-                                query=self.input_message.content
-                            ),
-                            role=RoleTypes.system,
-                        )
-                    )
-                    summary_response = self.llm.chat_completions(
-                        messages=[
-                            message.to_llm_msg()
-                            for message in self.get_current_run_context()
-                        ]
-                    )
-                    self.summary_content.text = summary_response.content
-                    if self.failed_agents:
-                        self.summary_content.status = MsgStatus.error
-                    else:
-                        self.summary_content.status = MsgStatus.success
-                    self.summary_content.status_message = "Final Cut"
+                    self.summarize()
                 self.output_message.status = MsgStatus.success
                 self.output_message.publish()
                 print("-" * 40, "Stopping", "-" * 40)
                 self.stop()
                 break
 
-    def run(self, max_iterations: int = None):
-        """Run the reasoning engine.
+    def request_plan(self, prompt: str) -> LLMResponse:
+        """Ask the LLM for a plan, with ``prompt`` as an instruction after the context that is not saved."""
+        instruction = ContextMessage(content=prompt, role=RoleTypes.system)
+        return self.llm.chat_completions(
+            messages=self.context_window.fit() + [instruction.to_llm_msg()],
+            tools=self.tools,
+        )
 
-        :param int max_iterations: The number of max_iterations to run the reasoning engine
+    def plan_and_execute(self):
+        """Run the request with the plan and execute strategy, see :mod:`director.core.planner`.
+
+        The LLM is asked for a plan of all agent steps once. The steps run locally, and the LLM is asked again only to repair the plan after a step fails, at most ``plan_max_repairs`` times, and to summarize. The steps that ran are added to the context as tool calls.
         """
-        self.iterations = max_iterations or self.max_iterations
-        self.build_context()
-        self.output_message.actions.append("Reasoning the message..")
-        self.output_message.push_update()
+        prompt, results, succeeded = PLANNING_PROMPT, {}, {}
+        for attempt in range(self.plan_max_repairs + 1):
+            exceeded = self.usage.exceeded()
+            if exceeded:
+                self.stop_on_budget(exceeded)
+                return
+            llm_response = self.request_plan(prompt)
+            self.cancel_token.check()
+            logger.info(f"LLM Response: {llm_response}")
+            if not llm_response.status:
+                self.fail(llm_response.content, "Error in reasoning")
+                self.stop()
+                return
+            if not llm_response.tool_calls:
+                self.session.reasoning_context.append(
+                    ContextMessage(
+                        content=llm_response.content, role=RoleTypes.assistant
+                    )
+                )
+                if attempt == 0:
+                    # Direct response case
+                    self.add_summary_content()
+                    self.summary_content.status_message = "Here is the response"
+                    self.summary_content.text = llm_response.content
+                    self.summary_content.status = MsgStatus.success
+                    self.output_message.status = MsgStatus.success
+                    self.output_message.publish()
+                    self.stop()
+                    return
+                break
 
-        it = 0
-        while self.iterations > 0:
-            self.iterations -= 1
-            print("-" * 40, "Reasoning Engine Iteration", it, "-" * 40)
-            if self.stop_flag:
+            try:
+                plan = Plan.from_tool_calls(llm_response.tool_calls)
+                plan.validate_steps(
+                    {agent.name for agent in self.agents}, set(results)
+                )
+            except (ValueError, TypeError) as e:
+                logger.info(f"Invalid plan: {e}")
+                failure, not_run = f"Invalid plan: {e}", []
+            else:
+                self.output_message.actions.append(
+                    f"Running a plan of {len(plan.steps)} steps.."
+                )
+                self.output_message.push_update()
+                executor = PlanExecutor(self, plan, results).run()
+                if executor.executed:
+                    self.add_tool_results(
+                        llm_response.content,
+                        [
+                            {
+                                "id": f"call_{uuid.uuid4().hex}",
+                                "tool": {"name": step.agent, "arguments": arguments},
+                                "type": "function",
+                            }
+                            for step, arguments, _ in executor.executed
+                        ],
+                        [response for _, _, response in executor.executed],
+                    )
+                for step, _, response in executor.executed:
+                    if response.status != AgentStatus.ERROR:
+                        succeeded[step.id] = step.agent
+                failure, not_run = executor.failure, executor.not_run
+            if failure is None:
                 break
+            self.cancel_token.check()
+            prompt = REPAIR_PROMPT.format(
+                failure=failure,
+                succeeded=", ".join(
+                    f"{step_id} ({agent})" for step_id, agent in succeeded.items()
+                )
+                or "none",
+                not_run=", ".join(not_run) or "none",
+            )
+
+        self.add_summary_content()
+        self.summarize()
+        self.output_message.status = MsgStatus.success
+        self.output_message.publish()
+        self.stop()
+
+    def run(self, max_iterations: int = None):
+        """Run the reasoning engine.
 
-            self.step()
-            it = it + 1
+        The run is registered in the run registry under its session and conversation while it lasts, so it can be cancelled.
 
+        :param int max_iterations: The number of max_iterations to run the reasoning engine
+        """
+        self.iterations = max_iterations or self.max_iterations
+        registry = get_run_registry()
+        with registry.register(
+            self.session.session_id, self.session.conv_id, self.cancel_token
+        ), self.cancel_token.activate(), self.usage.activate():
+            try:
+                self.build_context()
+                if self.tool_router:
+                    self.route_tools()
+                self.context_window.reserve(
+                    self.llm.count_tokens(json.dumps(self.tools))
+                )
+                self.output_message.actions.append("Reasoning the message..")
+                self.output_message.push_update()
+                if self.strategy == "plan":
+                    self.plan_and_execute()
+                else:
+                    it = 0
+                    while self.iterations > 0:
+                        self.iterations -= 1
+                        print("-" * 40, "Reasoning Engine Iteration", it, "-" * 40)
+                        self.cancel_token.check()
+                        if self.stop_flag:
+                            break
+
+                        exceeded = self.usage.exceeded()
+                        if exceeded:
+                            self.stop_on_budget(exceeded)
+                            break
+
+                        self.step()
+                        it = it + 1
+            except CancelledException as e:
+                logger.info(f"Run of session {self.session.session_id} cancelled: {e}")
+                self.stop_on_cancel(str(e))
+
+        if self._executor is not None:
+            # Calls of a cancelled run that haven't started are dropped
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
         self.session.save_context_messages()
         print("-" * 40, "Reasoning Engine Finished", "-" * 40)
@@ -1,11 +1,16 @@
+import threading
+
 from enum import Enum
 from datetime import datetime
 from typing import Optional, List, Union
 
-from flask_socketio import emit
-from pydantic import BaseModel, Field, ConfigDict
+from flask import current_app, request
+from pydantic import BaseModel, Field, ConfigDict, PrivateAttr
 
+from director.core.event_bus import get_event_bus
+from director.core.journal import get_journal
 from director.db.base import BaseDB
+from director.db.write_behind import get_writer
 
 
 class RoleTypes(str, Enum):
@@ -168,28 +173,70 @@ class OutputMessage(BaseMessage):
     msg_type: MsgType = MsgType.output
     status: MsgStatus = MsgStatus.progress
 
+    # socket.io client and server, captured on creation so updates can be sent from any thread
+    _sid: Optional[str] = PrivateAttr(default=None)
+    _socketio: object = PrivateAttr(default=None)
+    # Content structure of the last state written to the database
+    _stored_structure: Optional[tuple] = PrivateAttr(default=None)
+    # Serializes updates from agents running in parallel, so an older state is never sent after a newer one
+    _lock: object = PrivateAttr(default_factory=threading.RLock)
+
+    @property
+    def lock(self):
+        """Reentrant lock to hold around compound changes made from several threads, e.g. appending to ``actions`` and pushing the update."""
+        return self._lock
+
+    def model_post_init(self, __context):
+        try:
+            self._sid = request.sid
+            self._socketio = current_app.extensions["socketio"]
+        except (RuntimeError, AttributeError, KeyError):
+            # Not created while handling a socket.io event, there is no client to update
+            pass
+
     def update_status(self, status: MsgStatus):
-        """Update the status of the message and publish the message to the socket. for loading state."""
+        """Update the status of the message and publish the message to the socket. for loading state. The message is stored when the status is terminal or the content changed."""
         self.status = status
         self._publish()
 
     def push_update(self):
-        """Publish the message to the socket."""
-        try:
-            emit("chat", self.model_dump(), namespace="/chat")
-        except Exception as e:
-            print(f"Error in emitting message: {str(e)}")
+        """Publish the message to the socket. The message is stored only if its content items changed."""
+        self._publish()
 
     def publish(self):
         """Store the message in the database. for conversation history and publish the message to the socket."""
-        self._publish()
+        self._publish(store=True)
+
+    @staticmethod
+    def _structure(state: dict) -> tuple:
+        """Type and status of each content item. Changes to it are worth storing, changes to actions or text alone are not."""
+        return tuple((item.get("type"), item.get("status")) for item in state["content"])
+
+    def _publish(self, store: bool = False):
+        """Send every change on the live channel, and store it on the durable channel when ``store`` is set, the content structure changed or the status is terminal."""
+        with self._lock:
+            self._publish_state(store)
+
+    def _publish_state(self, store: bool):
+        state = self.model_dump()
+        final = self.status != MsgStatus.progress
+
+        # Live channel: the client
+        if self._socketio is not None:
+            get_event_bus(self._socketio).publish(
+                self._sid, self.msg_id, state, final=final
+            )
 
-    def _publish(self):
-        try:
-            emit("chat", self.model_dump(), namespace="/chat")
-        except Exception as e:
-            print(f"Error in emitting message: {str(e)}")
-        self.db.add_or_update_msg_to_conv(**self.model_dump())
+        # Durable channel: progress states are batched, terminal states are written before returning
+        structure = self._structure(state)
+        if store or final or structure != self._stored_structure:
+            self._stored_structure = structure
+            get_writer(self.db).upsert_msg(durable=final, **state)
+
+        # Recorded last, so the journal forgets a finished message only after it was stored
+        journal = get_journal()
+        if journal is not None:
+            journal.record(state, final=final)
 
 
 class ContextMessage(BaseModel):
@@ -206,8 +253,23 @@ class ContextMessage(BaseModel):
     tool_call_id: Optional[str] = None
     role: RoleTypes = RoleTypes.system
 
+    # LLM form of the message, built on first use
+    _llm_msg: Optional[dict] = PrivateAttr(default=None)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            self._llm_msg = None
+
     def to_llm_msg(self):
-        """Convert the context message to the llm message."""
+        """Convert the context message to the llm message. The result is cached, it must not be modified."""
+        # Read the private attribute directly, pydantic's attribute lookup costs more than building the message
+        private = self.__pydantic_private__
+        if private["_llm_msg"] is None:
+            private["_llm_msg"] = self._build_llm_msg()
+        return private["_llm_msg"]
+
+    def _build_llm_msg(self):
         msg = {
             "role": self.role,
             "content": self.content,
@@ -233,8 +295,58 @@ class ContextMessage(BaseModel):
         return cls(**json_data)
 
 
-class Session:
-    """A class to manage and interact with a session in the database. The session is used to store the conversation and reasoning context messages."""
+class SessionHandle:
+    """A lightweight reference to a session in the database, for listing, reading and deleting sessions. Unlike :class:`Session` it never loads the reasoning context."""
+
+    def __init__(self, db: BaseDB, session_id: str = "", **kwargs):
+        self.db = db
+        self.session_id = session_id
+
+    def get(self, limit: int = None, before: str = None, after: str = None):
+        """Get the session from the database.
+
+        :param int limit: If given, return only a page of the conversation with ``before``/``after`` cursors.
+        :param str before: Cursor to the older page of the conversation.
+        :param str after: Cursor to the newer page of the conversation.
+        """
+        session = self.db.get_session(self.session_id)
+        if not session:
+            return session
+        if limit is None:
+            session["conversation"] = self.db.get_conversations(self.session_id)
+        else:
+            session.update(
+                self.db.get_conversations_page(
+                    self.session_id, limit=limit, before=before, after=after
+                )
+            )
+        return session
+
+    def get_all(self, limit: int = None, before: str = None, after: str = None):
+        """Get all the sessions from the database.
+
+        :param int limit: If given, return only a page of sessions with ``before``/``after`` cursors.
+        :param str before: Cursor to the older page of sessions.
+        :param str after: Cursor to the newer page of sessions.
+        """
+        if limit is None:
+            return self.db.get_sessions()
+        return self.db.get_sessions_page(limit=limit, before=before, after=after)
+
+    def get_usage(self):
+        """Get the tokens, cost and latency used by the session, see :meth:`director.db.base.BaseDB.get_usage`."""
+        return self.db.get_usage(self.session_id)
+
+    def delete(self):
+        """Delete the session from the database."""
+        return self.db.delete_session(self.session_id)
+
+
+class Session(SessionHandle):
+    """A class to manage and interact with a session in the database. The session is used to store the conversation and reasoning context messages.
+
+    The reasoning context, conversation, state and output message are created on first access, so a session that is only passed around costs no database queries.
+    """
 
     def __init__(
         self,
@@ -245,41 +357,119 @@ class Session:
         video_id: str = None,
         **kwargs,
     ):
-        self.db = db
-        self.session_id = session_id
+        super().__init__(db=db, session_id=session_id)
         self.conv_id = conv_id
-        self.conversations = []
         self.video_id = video_id
         self.collection_id = collection_id
-        self.reasoning_context = []
-        self.state = {}
-        self.output_message = OutputMessage(
-            db=self.db, session_id=self.session_id, conv_id=self.conv_id
-        )
+        self._conversations = None
+        self._reasoning_context = None
+        self._context_offset = 0
+        self._state = None
+        self._output_message = None
+
+    @property
+    def reasoning_context(self) -> List[ContextMessage]:
+        """Reasoning context messages, loaded from the database on first access."""
+        if self._reasoning_context is None:
+            self.get_context_messages()
+        return self._reasoning_context
+
+    @reasoning_context.setter
+    def reasoning_context(self, messages: List[ContextMessage]):
+        self._reasoning_context = messages
+
+    @property
+    def conversations(self) -> list:
+        """Messages of the conversation, loaded from the database on first access."""
+        if self._conversations is None:
+            self._conversations = (
+                self.db.get_conversations(self.session_id) if self.session_id else []
+            )
+        return self._conversations
+
+    @property
+    def state(self) -> dict:
+        """Runtime state of the session, e.g. the VideoDB connection and collection."""
+        if self._state is None:
+            self._state = {}
+        return self._state
+
+    @state.setter
+    def state(self, state: dict):
+        self._state = state
+
+    @property
+    def output_message(self) -> OutputMessage:
+        """Output message of the current conversation turn."""
+        if self._output_message is None:
+            self._output_message = OutputMessage(
+                db=self.db, session_id=self.session_id, conv_id=self.conv_id
+            )
+        return self._output_message
 
-        self.get_context_messages()
+    @output_message.setter
+    def output_message(self, message: OutputMessage):
+        self._output_message = message
 
     def save_context_messages(self):
-        """Save the reasoning context messages to the database."""
-        context = {
-            "reasoning": [message.to_llm_msg() for message in self.reasoning_context],
-        }
-        self.db.add_or_update_context_msg(self.session_id, context)
+        """Save the reasoning context messages added since the last save to the database."""
+        if len(self.reasoning_context) < self._context_offset:
+            # Messages were removed or replaced, the log can't be appended to
+            return self.compact_context_messages()
+
+        new_messages = self.reasoning_context[self._context_offset :]
+        if not new_messages:
+            return
+        self.db.append_context_log(
+            self.session_id,
+            [message.to_llm_msg() for message in new_messages],
+            self._context_offset,
+        )
+        self._context_offset = len(self.reasoning_context)
+
+    def compact_context_messages(self):
+        """Rewrite the stored reasoning context with the current messages. Use this after modifying messages that were already saved."""
+        self.db.compact_context_log(
+            self.session_id,
+            [message.to_llm_msg() for message in self.reasoning_context],
+        )
+        self._context_offset = len(self.reasoning_context)
 
     def get_context_messages(self):
         """Get the reasoning context messages from the database."""
-        if not self.reasoning_context:
-            context = self.db.get_context_messages(self.session_id)
-            self.reasoning_context = [
-                ContextMessage.from_json(message)
-                for message in context.get("reasoning", [])
+        if not self._reasoning_context:
+            messages = self.db.get_context_log(self.session_id)
+            if messages:
+                self._context_offset = len(messages)
+            else:
+                # Sessions saved before the context log existed store one blob,
+                # they are moved to the log on the next save.
+                context = self.db.get_context_messages(self.session_id)
+                messages = context.get("reasoning", [])
+            self._reasoning_context = [
+                ContextMessage.from_json(message) for message in messages
             ]
 
         return self.reasoning_context
 
+    def refresh_context_messages(self):
+        """Read the reasoning context messages saved since the last load or save, e.g. by another server."""
+        if len(self.reasoning_context) != self._context_offset:
+            return self.reasoning_context
+        messages = self.db.get_context_log(self.session_id, self._context_offset)
+        self.reasoning_context.extend(
+            ContextMessage.from_json(message) for message in messages
+        )
+        self._context_offset = len(self.reasoning_context)
+        return self.reasoning_context
+
     def create(self):
         """Create a new session in the database."""
-        self.db.create_session(**self.__dict__)
+        self.db.create_session(
+            session_id=self.session_id,
+            video_id=self.video_id,
+            collection_id=self.collection_id,
+        )
 
     def new_message(
         self, msg_type: MsgType = MsgType.output, **kwargs
@@ -303,18 +493,3 @@ class Session:
             conv_id=self.conv_id,
             **kwargs,
         )
-
-    def get(self):
-        """Get the session from the database."""
-        session = self.db.get_session(self.session_id)
-        conversation = self.db.get_conversations(self.session_id)
-        session["conversation"] = conversation
-        return session
-
-    def get_all(self):
-        """Get all the sessions from the database."""
-        return self.db.get_sessions()
-
-    def delete(self):
-        """Delete the session from the database."""
-        return self.db.delete_session(self.session_id)
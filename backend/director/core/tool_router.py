@@ -0,0 +1,299 @@
+import os
+import json
+import logging
+from collections import Counter
+from typing import List
+
+from director.agents.base import BaseAgent
+from director.core.session import ContextMessage, RoleTypes
+from director.tools.media_index import MediaIndex, tokenize
+
+logger = logging.getLogger(__name__)
+
+#: Words of a user message that point to an agent
+AGENT_KEYWORDS = {
+    "brandkit": {
+        "brand",
+        "brandkit",
+        "branding",
+        "intro",
+        "outro",
+        "logo",
+        "watermark",
+    },
+    "download": {"download", "downloads", "downloadable"},
+    "image_generation": {
+        "image",
+        "images",
+        "picture",
+        "pictures",
+        "illustration",
+        "draw",
+        "poster",
+    },
+    "index": {"index", "indexing", "reindex", "indexed"},
+    "lookup_media": {
+        "list",
+        "videos",
+        "images",
+        "collection",
+        "latest",
+        "named",
+        "called",
+        "titled",
+    },
+    "pricing": {
+        "price",
+        "pricing",
+        "cost",
+        "costs",
+        "estimate",
+        "billing",
+        "plan",
+        "charge",
+    },
+    "profanity_remover": {
+        "profanity",
+        "profane",
+        "curse",
+        "cursing",
+        "swear",
+        "swearing",
+        "beep",
+        "censor",
+        "explicit",
+    },
+    "prompt_clip": {
+        "clip",
+        "clips",
+        "highlight",
+        "highlights",
+        "moments",
+        "reel",
+        "trailer",
+        "compilation",
+    },
+    "search": {
+        "search",
+        "find",
+        "where",
+        "mention",
+        "mentions",
+        "mentioned",
+        "talks",
+        "scene",
+        "scenes",
+    },
+    "slack": {"slack", "channel", "notify"},
+    "stream_video": {"play", "player", "watch", "stream", "m3u8"},
+    "subtitle": {
+        "subtitle",
+        "subtitles",
+        "caption",
+        "captions",
+        "translate",
+        "language",
+        "srt",
+    },
+    "thumbnail": {"thumbnail", "thumbnails", "preview", "snapshot", "frame", "cover"},
+    "upload": {"upload", "import", "youtube", "url", "link", "file"},
+    "video_summary": {
+        "summary",
+        "summarize",
+        "summarise",
+        "recap",
+        "overview",
+        "tldr",
+        "about",
+    },
+}
+
+#: Words too common in requests and agent descriptions to tell agents apart
+STOP_WORDS = {
+    "a",
+    "about",
+    "add",
+    "all",
+    "an",
+    "and",
+    "any",
+    "are",
+    "as",
+    "at",
+    "be",
+    "by",
+    "can",
+    "do",
+    "for",
+    "from",
+    "get",
+    "give",
+    "i",
+    "in",
+    "is",
+    "it",
+    "its",
+    "me",
+    "my",
+    "now",
+    "of",
+    "on",
+    "or",
+    "please",
+    "s",
+    "should",
+    "that",
+    "the",
+    "then",
+    "this",
+    "to",
+    "use",
+    "video",
+    "want",
+    "what",
+    "with",
+    "you",
+}
+
+# Agents that generate a new stream, and the agents that turn a stream into a video, see step 7 of the reasoning system prompt
+STREAM_AGENTS = {"brandkit", "profanity_remover", "prompt_clip", "subtitle"}
+STREAM_FOLLOW_UP_AGENTS = ["download", "upload"]
+
+# Score of a keyword hit, a BM25 score of a few shared words is in the same range
+KEYWORD_SCORE = 3.0
+# Score of an agent that was called in the recent context, follow-ups often reuse it
+RECENT_CALL_SCORE = 2.0
+# Weight of the recent context against the user message
+RECENT_CONTEXT_WEIGHT = 0.5
+
+
+class ToolRouter:
+    """Picks the agents offered to the LLM in a reasoning run, so requests don't carry the schemas of agents the run won't need.
+
+    Agents are ranked by keyword rules on the user message, by BM25 similarity of the user message and the recent context to the name, description and parameters of each agent, and by being called in the recent context. When no agent scores ``min_score``, or there are no more than ``top_k`` agents, all of them are offered.
+    """
+
+    def __init__(
+        self,
+        agents: List[BaseAgent],
+        top_k: int = None,
+        min_score: float = 1.0,
+        recent_messages: int = 6,
+    ):
+        """
+        :param list agents: The registered agents.
+        :param int top_k: Maximum agents offered, defaults to ``REASONING_TOOL_ROUTER_TOP_K`` or 5.
+        :param float min_score: Score the best agent needs, else all agents are offered.
+        :param int recent_messages: Messages before the user message that count as recent context.
+        """
+        self.agents = agents
+        self.top_k = top_k or int(os.getenv("REASONING_TOOL_ROUTER_TOP_K", 5))
+        self.min_score = min_score
+        self.recent_messages = recent_messages
+        # Agents are indexed like media, by name and description
+        self.index = MediaIndex(name_weight=3)
+        self.index.update(
+            [
+                {
+                    "id": agent.name,
+                    "type": "agent",
+                    "name": agent.name.replace("_", " "),
+                    "description": f"{agent.description} {_parameters_text(agent.parameters)}",
+                }
+                for agent in agents
+            ]
+        )
+
+    def _split(self, context: List[ContextMessage]):
+        """Return the last user message of ``context`` and the messages before it that count as recent context."""
+        start = len(context) - 1
+        while start >= 0 and context[start].role != RoleTypes.user:
+            start -= 1
+        if start < 0:
+            return None, []
+        recent = [
+            message
+            for message in context[max(0, start - self.recent_messages) : start]
+            if message.role != RoleTypes.system
+        ]
+        return context[start], recent
+
+    def rank(self, context: List[ContextMessage]) -> Counter:
+        """Score the agents for the last user message of ``context``, by name."""
+        message, recent = self._split(context)
+        if message is None:
+            return Counter()
+        query = _text(message.content)
+        names = {agent.name for agent in self.agents}
+        scores = Counter()
+        tokens = set(tokenize(query))
+        for name, keywords in AGENT_KEYWORDS.items():
+            if name in names and tokens & keywords:
+                scores[name] += KEYWORD_SCORE * len(tokens & keywords)
+        scores.update(self.index.scores(_content_words(query)))
+        recent_text = " ".join(
+            _text(message.content)
+            for message in recent
+            if message.role in (RoleTypes.user, RoleTypes.assistant)
+        )
+        for name, score in self.index.scores(_content_words(recent_text)).items():
+            scores[name] += score * RECENT_CONTEXT_WEIGHT
+        for name in _called_agents(recent):
+            if name in names:
+                scores[name] += RECENT_CALL_SCORE
+        return scores
+
+    def route(self, context: List[ContextMessage]) -> List[BaseAgent]:
+        """Return the agents to offer for the last user message of ``context``, best first, or all agents if the ranking is not conclusive."""
+        if len(self.agents) <= self.top_k:
+            return list(self.agents)
+        ranked = self.rank(context).most_common(self.top_k)
+        if not ranked or ranked[0][1] < self.min_score:
+            logger.info("Tool router found no relevant agent, offering all agents")
+            return list(self.agents)
+        names = [name for name, score in ranked if score > 0]
+        # A generated stream needs a video id before other agents can act on it
+        _, recent = self._split(context)
+        if STREAM_AGENTS & set(_called_agents(recent)):
+            names.extend(name for name in STREAM_FOLLOW_UP_AGENTS if name not in names)
+        by_name = {agent.name: agent for agent in self.agents}
+        return [by_name[name] for name in names if name in by_name]
+
+
+def tool_tokens(llm, tools: List[dict]) -> int:
+    """Tokens the tool schemas add to a request, as counted by ``llm``."""
+    return llm.count_tokens(json.dumps(tools))
+
+
+def _text(content) -> str:
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(
+            part.get("text", "") if isinstance(part, dict) else str(part)
+            for part in content
+        )
+    return json.dumps(content)
+
+
+def _called_agents(messages: List[ContextMessage]) -> List[str]:
+    return [
+        tool_call["tool"]["name"]
+        for message in messages
+        for tool_call in message.tool_calls or []
+    ]
+
+
+def _content_words(text: str) -> str:
+    return " ".join(token for token in tokenize(text) if token not in STOP_WORDS)
+
+
+def _parameters_text(parameters: dict) -> str:
+    properties = (parameters or {}).get("properties", {})
+    return " ".join(
+        f"{name.replace('_', ' ')} {spec.get('description', '')}"
+        for name, spec in properties.items()
+        if isinstance(spec, dict)
+    )
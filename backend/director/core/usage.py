@@ -0,0 +1,264 @@
+"""Usage ledger: records the tokens, cost and latency of every LLM call and agent run of a reasoning run.
+
+A :class:`UsageLedger` is activated for the duration of :meth:`ReasoningEngine.run`. LLM calls made in the same thread, or in a thread started with a copy of its ``contextvars`` context, are attributed to the session, the conversation and the agent that made them. Records are buffered and written to the ``usage_ledger`` table in batches.
+"""
+
+import os
+import time
+import logging
+import threading
+import functools
+import contextvars
+
+from contextlib import contextmanager
+
+from director.db.base import BaseDB
+
+logger = logging.getLogger(__name__)
+
+REASONING_AGENT = "reasoning"
+
+# (ledger, agent name) of the current run
+_scope = contextvars.ContextVar("usage_scope", default=None)
+
+
+class UsageBudget:
+    """Hard limits on the usage of a session. ``None`` means no limit."""
+
+    def __init__(
+        self,
+        max_run_tokens: int = None,
+        max_session_tokens: int = None,
+        max_session_cost: float = None,
+    ):
+        """
+        :param int max_run_tokens: Maximum tokens of a single reasoning run, i.e. one user message.
+        :param int max_session_tokens: Maximum tokens of the whole session.
+        :param float max_session_cost: Maximum cost of the whole session in USD.
+        """
+        self.max_run_tokens = max_run_tokens
+        self.max_session_tokens = max_session_tokens
+        self.max_session_cost = max_session_cost
+
+    @classmethod
+    def from_env(cls) -> "UsageBudget":
+        """Read the budget from ``USAGE_MAX_RUN_TOKENS``, ``USAGE_MAX_SESSION_TOKENS`` and ``USAGE_MAX_SESSION_COST``."""
+        max_run_tokens = os.getenv("USAGE_MAX_RUN_TOKENS")
+        max_session_tokens = os.getenv("USAGE_MAX_SESSION_TOKENS")
+        max_session_cost = os.getenv("USAGE_MAX_SESSION_COST")
+        return cls(
+            max_run_tokens=int(max_run_tokens) if max_run_tokens else None,
+            max_session_tokens=int(max_session_tokens) if max_session_tokens else None,
+            max_session_cost=float(max_session_cost) if max_session_cost else None,
+        )
+
+    @property
+    def limits_session(self) -> bool:
+        return self.max_session_tokens is not None or self.max_session_cost is not None
+
+
+class UsageLedger:
+    """Collects the usage records of one reasoning run and checks them against a :class:`UsageBudget`."""
+
+    def __init__(
+        self,
+        db: BaseDB,
+        session_id: str,
+        conv_id: str,
+        budget: UsageBudget = None,
+        flush_size: int = 20,
+    ):
+        """
+        :param BaseDB db: Database to write the records to.
+        :param str session_id: Session of the run.
+        :param str conv_id: Conversation of the run.
+        :param UsageBudget budget: Limits to check, defaults to :meth:`UsageBudget.from_env`.
+        :param int flush_size: Records buffered before they are written.
+        """
+        self.db = db
+        self.session_id = session_id
+        self.conv_id = conv_id
+        self.budget = budget or UsageBudget.from_env()
+        self.flush_size = flush_size
+        self.run_tokens = 0
+        self.run_cost = 0.0
+        self._session_tokens = 0
+        self._session_cost = 0.0
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """Attribute LLM calls and agent runs in the ``with`` block to this ledger, and write its records when the block ends."""
+        if self.budget.limits_session:
+            total = self.db.get_usage(self.session_id)["total"]
+            self._session_tokens = total["total_tokens"]
+            self._session_cost = total["cost"]
+        token = _scope.set((self, REASONING_AGENT))
+        try:
+            yield self
+        finally:
+            _scope.reset(token)
+            self.flush()
+
+    def record(
+        self,
+        kind: str,
+        agent: str,
+        model: str = None,
+        send_tokens: int = 0,
+        recv_tokens: int = 0,
+        total_tokens: int = 0,
+        cost: float = 0.0,
+        latency: float = 0.0,
+        status: str = "success",
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ):
+        """Add a record, ``kind`` is ``llm`` or ``agent`` and ``latency`` is in seconds."""
+        with self._lock:
+            self.run_tokens += total_tokens
+            self.run_cost += cost
+            self._pending.append(
+                {
+                    "session_id": self.session_id,
+                    "conv_id": self.conv_id,
+                    "kind": kind,
+                    "agent": agent,
+                    "model": model,
+                    "send_tokens": send_tokens,
+                    "recv_tokens": recv_tokens,
+                    "total_tokens": total_tokens,
+                    "cache_read_tokens": cache_read_tokens,
+                    "cache_write_tokens": cache_write_tokens,
+                    "cost": cost,
+                    "latency_ms": int(latency * 1000),
+                    "status": status,
+                    "created_at": int(time.time()),
+                }
+            )
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records."""
+        with self._lock:
+            records, self._pending = self._pending, []
+        if not records:
+            return
+        try:
+            self.db.add_usage_records(records)
+        except Exception as e:
+            logger.error(f"Error in writing usage of session {self.session_id}: {e}")
+
+    def exceeded(self):
+        """Return why the budget is exceeded, or ``None`` if it isn't."""
+        budget = self.budget
+        if budget.max_run_tokens is not None and self.run_tokens >= budget.max_run_tokens:
+            return f"Token budget of {budget.max_run_tokens} tokens per message exceeded"
+        if (
+            budget.max_session_tokens is not None
+            and self._session_tokens + self.run_tokens >= budget.max_session_tokens
+        ):
+            return f"Token budget of {budget.max_session_tokens} tokens per session exceeded"
+        if (
+            budget.max_session_cost is not None
+            and self._session_cost + self.run_cost >= budget.max_session_cost
+        ):
+            return f"Cost budget of ${budget.max_session_cost} per session exceeded"
+        return None
+
+
+@contextmanager
+def agent_scope(agent_name: str):
+    """Attribute the LLM calls in the ``with`` block to ``agent_name`` and record the run of the agent.
+
+    Yields a dict, set its ``status`` to the status of the agent response.
+    """
+    scope = _scope.get()
+    run = {"status": "success"}
+    if scope is None:
+        yield run
+        return
+    ledger = scope[0]
+    token = _scope.set((ledger, agent_name))
+    start = time.monotonic()
+    try:
+        yield run
+    except BaseException:
+        run["status"] = "error"
+        raise
+    finally:
+        _scope.reset(token)
+        ledger.record(
+            "agent",
+            agent_name,
+            latency=time.monotonic() - start,
+            status=run["status"],
+        )
+
+
+def _record_llm_response(ledger: UsageLedger, agent: str, llm, response, latency: float):
+    ledger.record(
+        "llm",
+        agent,
+        model=llm.model_name,
+        send_tokens=response.send_tokens,
+        recv_tokens=response.recv_tokens,
+        total_tokens=response.total_tokens,
+        cache_read_tokens=response.cache_read_tokens,
+        cache_write_tokens=response.cache_write_tokens,
+        cost=llm.cost(
+            response.send_tokens,
+            response.recv_tokens,
+            response.cache_read_tokens,
+            response.cache_write_tokens,
+        ),
+        latency=latency,
+        status="success" if response.status else "error",
+    )
+
+
+def track_llm_usage(llm, chat_completions):
+    """Wrap the ``chat_completions`` method of ``llm`` to record every call in the active ledger."""
+
+    @functools.wraps(chat_completions)
+    def wrapper(*args, **kwargs):
+        scope = _scope.get()
+        if scope is None:
+            return chat_completions(*args, **kwargs)
+        ledger, agent = scope
+        start = time.monotonic()
+        try:
+            response = chat_completions(*args, **kwargs)
+        except Exception:
+            ledger.record(
+                "llm",
+                agent,
+                model=llm.model_name,
+                latency=time.monotonic() - start,
+                status="error",
+            )
+            raise
+        _record_llm_response(ledger, agent, llm, response, time.monotonic() - start)
+        return response
+
+    return wrapper
+
+
+def track_llm_stream_usage(llm, chat_completions_stream):
+    """Wrap the ``chat_completions_stream`` method of ``llm`` to record every streamed call in the active ledger when its ``done`` event arrives."""
+
+    @functools.wraps(chat_completions_stream)
+    def wrapper(*args, **kwargs):
+        scope = _scope.get()
+        start = time.monotonic()
+        for event in chat_completions_stream(*args, **kwargs):
+            if scope is not None and event.type == "done":
+                _record_llm_response(
+                    scope[0], scope[1], llm, event.response, time.monotonic() - start
+                )
+            yield event
+
+    return wrapper
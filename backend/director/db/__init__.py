@@ -1,18 +1,58 @@
+import os
+import threading
+
 from director.constants import DBType
 
 from .base import BaseDB
+from .async_base import AsyncBaseDB
+from .async_adapter import AsyncDBAdapter
 from .sqlite.db import SQLiteDB
+from .sqlite.async_db import AsyncSQLiteDB
+from .postgres.db import PostgresDB
 
 
 db_types = {
     DBType.SQLITE: SQLiteDB,
+    DBType.POSTGRES: PostgresDB,
+}
+
+async_db_types = {
+    DBType.SQLITE: AsyncSQLiteDB,
 }
 
+# DB instances are thread-safe and share a process-wide connection pool, so a
+# single instance per db type is handed out to every request.
+_db_instances = {}
+_db_instances_lock = threading.Lock()
+
 
 def load_db(db_type: DBType) -> BaseDB:
+    """Return the database of ``db_type``. With ``DB_ASYNC_WRITES=true``, db types with an async database get it wrapped in an :class:`AsyncDBAdapter`, so sessions write without waiting for the database."""
     if db_type not in db_types:
         raise ValueError(
             f"Unknown DB type: {db_type}, Valid db types are: {[db_type.value for db_type in db_types]}"
         )
 
-    return db_types[db_type]()
+    db_type = DBType(db_type)
+    with _db_instances_lock:
+        if db_type not in _db_instances:
+            if (
+                os.getenv("DB_ASYNC_WRITES", "false").lower() == "true"
+                and db_type in async_db_types
+            ):
+                _db_instances[db_type] = AsyncDBAdapter(
+                    load_async_db(db_type), sync_db=db_types[db_type]()
+                )
+            else:
+                _db_instances[db_type] = db_types[db_type]()
+        return _db_instances[db_type]
+
+
+def load_async_db(db_type: DBType) -> AsyncBaseDB:
+    """Return a new async database of ``db_type``. Async databases are bound to the event loop they connect on, so they are not shared."""
+    if db_type not in async_db_types:
+        raise ValueError(
+            f"Unknown async DB type: {db_type}, Valid db types are: {[db_type.value for db_type in async_db_types]}"
+        )
+
+    return async_db_types[DBType(db_type)]()
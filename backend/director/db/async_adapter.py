@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import threading
+
+from concurrent.futures import Future, wait
+
+from director.db.async_base import AsyncBaseDB
+from director.db.base import BaseDB
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDBAdapter(BaseDB):
+    """Exposes an :class:`AsyncBaseDB` through the blocking :class:`BaseDB` interface so :class:`Session` and :class:`OutputMessage` can use it unchanged.
+
+    The async database runs on an event loop in a background thread. Upserts of messages in progress, best-effort live updates, are scheduled on that loop and return immediately, their errors are only logged. All other writes, including terminal message states, wait for the database and raise its errors. Reads wait for their result, and because the loop runs coroutines in submission order they see every write scheduled before them. Use :meth:`flush` to wait for outstanding writes. Maintenance methods without an async counterpart, like ``purge_sessions`` and ``vacuum``, run on ``sync_db``.
+    """
+
+    def __init__(self, db: AsyncBaseDB, sync_db: BaseDB = None):
+        """
+        :param AsyncBaseDB db: The async database to adapt.
+        :param BaseDB sync_db: Blocking database of the same storage, for the methods the async database lacks.
+        """
+        self.async_db = db
+        self.sync_db = sync_db
+        self.db_type = getattr(db, "db_type", None)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="async-db-loop", daemon=True
+        )
+        self._thread.start()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._read(db.connect())
+
+    def __getattr__(self, name: str):
+        sync_db = self.__dict__.get("sync_db")
+        if sync_db is None:
+            raise AttributeError(
+                f"{type(self).__name__} object has no attribute {name!r}"
+            )
+        return getattr(sync_db, name)
+
+    def _submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _read(self, coro):
+        return self._submit(coro).result()
+
+    def _write(self, coro, durable: bool = True):
+        """Schedule a write. A durable write waits for it and raises its error, a best-effort one returns its future."""
+        future = self._submit(coro)
+        if durable:
+            return future.result()
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._write_done)
+        return future
+
+    def _write_done(self, future: Future):
+        with self._pending_lock:
+            self._pending.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Error in async DB write: {future.exception()}")
+
+    def flush(self, timeout: float = None):
+        """Wait until all writes scheduled so far are done."""
+        with self._pending_lock:
+            pending = list(self._pending)
+        wait(pending, timeout=timeout)
+
+    def close(self):
+        """Wait for outstanding writes, close the database and stop the event loop."""
+        self.flush()
+        self._read(self.async_db.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def create_session(self, *args, **kwargs) -> None:
+        self._write(self.async_db.create_session(*args, **kwargs))
+
+    def get_session(self, session_id: str) -> dict:
+        return self._read(self.async_db.get_session(session_id))
+
+    def get_sessions(self) -> list:
+        return self._read(self.async_db.get_sessions())
+
+    def get_sessions_page(
+        self, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        return self._read(self.async_db.get_sessions_page(limit, before, after))
+
+    def add_or_update_msg_to_conv(self, *args, **kwargs) -> None:
+        self._write(
+            self.async_db.add_or_update_msg_to_conv(*args, **kwargs),
+            durable=bool(args) or not _in_progress(kwargs),
+        )
+
+    def add_or_update_msgs_to_conv(self, messages: list) -> None:
+        self._write(
+            self.async_db.add_or_update_msgs_to_conv(messages),
+            durable=not all(_in_progress(message) for message in messages),
+        )
+
+    def get_conversations(self, session_id: str) -> list:
+        return self._read(self.async_db.get_conversations(session_id))
+
+    def get_message(self, session_id: str, msg_id: str) -> dict:
+        return self._read(self.async_db.get_message(session_id, msg_id))
+
+    def get_conversations_page(
+        self, session_id: str, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        return self._read(
+            self.async_db.get_conversations_page(session_id, limit, before, after)
+        )
+
+    def search_conversations(self, query: str, limit: int = 20) -> list:
+        return self._read(self.async_db.search_conversations(query, limit))
+
+    def get_context_messages(self, session_id: str) -> list:
+        return self._read(self.async_db.get_context_messages(session_id))
+
+    def add_or_update_context_msg(self, *args, **kwargs) -> None:
+        self._write(self.async_db.add_or_update_context_msg(*args, **kwargs))
+
+    def append_context_log(self, session_id: str, messages: list, offset: int) -> None:
+        self._write(self.async_db.append_context_log(session_id, messages, offset))
+
+    def get_context_log(self, session_id: str, offset: int = 0) -> list:
+        return self._read(self.async_db.get_context_log(session_id, offset))
+
+    def compact_context_log(self, session_id: str, messages: list) -> None:
+        self._write(self.async_db.compact_context_log(session_id, messages))
+
+    def add_usage_records(self, records: list) -> None:
+        self._write(self.async_db.add_usage_records(records))
+
+    def get_usage(self, session_id: str) -> dict:
+        return self._read(self.async_db.get_usage(session_id))
+
+    def delete_session(self, session_id: str) -> tuple:
+        return self._read(self.async_db.delete_session(session_id))
+
+    def purge_sessions(self, *args, **kwargs) -> int:
+        if self.sync_db is None:
+            raise NotImplementedError(
+                f"{self.__class__.__name__} without sync_db does not support purging sessions"
+            )
+        self.flush()
+        return self.sync_db.purge_sessions(*args, **kwargs)
+
+    def vacuum(self, *args, **kwargs) -> int:
+        if self.sync_db is None:
+            return super().vacuum(*args, **kwargs)
+        return self.sync_db.vacuum(*args, **kwargs)
+
+    def health_check(self) -> bool:
+        return self._read(self.async_db.health_check())
+
+
+def _in_progress(message: dict) -> bool:
+    # The value of MsgStatus.progress, director.core.session imports the databases
+    return message.get("status") == "progress"
@@ -0,0 +1,124 @@
+from abc import ABC, abstractmethod
+
+
+class AsyncBaseDB(ABC):
+    """Asyncio interface for all databases. It mirrors :class:`director.db.base.BaseDB` with coroutine methods, so persistence can overlap with other I/O."""
+
+    async def connect(self) -> None:
+        """Open the connection to the database. Called before the first query."""
+        pass
+
+    async def close(self) -> None:
+        """Close the connection to the database."""
+        pass
+
+    @abstractmethod
+    async def create_session(
+        self, session_id: str, video_id: str = None, collection_id: str = None
+    ) -> None:
+        """Create a new session."""
+        pass
+
+    @abstractmethod
+    async def get_session(self, session_id: str) -> dict:
+        """Get a session by session_id."""
+        pass
+
+    @abstractmethod
+    async def get_sessions(self) -> list:
+        """Get all sessions."""
+        pass
+
+    @abstractmethod
+    async def get_sessions_page(
+        self, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of sessions, most recently updated first. See :meth:`director.db.base.BaseDB.get_sessions_page`."""
+        pass
+
+    @abstractmethod
+    async def add_or_update_msg_to_conv() -> None:
+        """Add a new message (input or output) to the conversation."""
+        pass
+
+    async def add_or_update_msgs_to_conv(self, messages: list) -> None:
+        """Add or update several conversation messages. Databases should override this to write them in a single transaction.
+
+        :param list messages: Keyword arguments of :meth:`add_or_update_msg_to_conv` for each message.
+        """
+        for message in messages:
+            await self.add_or_update_msg_to_conv(**message)
+
+    @abstractmethod
+    async def get_conversations(self, session_id: str) -> list:
+        """Get all conversations for a given session."""
+        pass
+
+    @abstractmethod
+    async def get_message(self, session_id: str, msg_id: str) -> dict:
+        """Get a message of a session by msg_id. See :meth:`director.db.base.BaseDB.get_message`."""
+        pass
+
+    @abstractmethod
+    async def get_conversations_page(
+        self, session_id: str, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of messages for a given session. See :meth:`director.db.base.BaseDB.get_conversations_page`."""
+        pass
+
+    @abstractmethod
+    async def search_conversations(self, query: str, limit: int = 20) -> list:
+        """Full-text search over the text of all conversation messages. See :meth:`director.db.base.BaseDB.search_conversations`."""
+        pass
+
+    @abstractmethod
+    async def get_context_messages(self, session_id: str) -> list:
+        """Get context messages for a session."""
+        pass
+
+    @abstractmethod
+    async def add_or_update_context_msg(
+        self, session_id: str, context_messages: list
+    ) -> None:
+        """Update context messages for a session."""
+        pass
+
+    @abstractmethod
+    async def append_context_log(
+        self, session_id: str, messages: list, offset: int
+    ) -> None:
+        """Append reasoning context messages to the context log of a session."""
+        pass
+
+    @abstractmethod
+    async def get_context_log(self, session_id: str, offset: int = 0) -> list:
+        """Get the reasoning context messages of a session from the context log."""
+        pass
+
+    @abstractmethod
+    async def compact_context_log(self, session_id: str, messages: list) -> None:
+        """Replace the whole context log of a session with ``messages`` in a single transaction."""
+        pass
+
+    @abstractmethod
+    async def add_usage_records(self, records: list) -> None:
+        """Append LLM calls and agent runs to the usage ledger. See :meth:`director.db.base.BaseDB.add_usage_records`."""
+        pass
+
+    @abstractmethod
+    async def get_usage(self, session_id: str) -> dict:
+        """Get the usage of a session from the usage ledger. See :meth:`director.db.base.BaseDB.get_usage`."""
+        pass
+
+    @abstractmethod
+    async def delete_session(self, session_id: str) -> tuple:
+        """Delete a session and all its associated data.
+
+        :return: Whether the session was deleted and the list of components that failed to delete.
+        """
+        pass
+
+    @abstractmethod
+    async def health_check(self) -> bool:
+        """Check if the database is healthy."""
+        pass
@@ -1,6 +1,91 @@
+import json
+import base64
+
 from abc import ABC, abstractmethod
 
 
+def encode_cursor(*values) -> str:
+    """Encode the sort key of a row into an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    """Decode a pagination cursor created with :func:`encode_cursor`.
+
+    :raises ValueError: If the cursor is malformed.
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def content_to_text(content: list) -> str:
+    """Extract the searchable text of a message's content items, e.g. text, video names and search result transcripts."""
+    parts = []
+    for item in content or []:
+        if isinstance(item, str):
+            parts.append(item)
+            continue
+        if not isinstance(item, dict):
+            continue
+        if item.get("text"):
+            parts.append(item["text"])
+        for media in (item.get("video"), item.get("image")):
+            if isinstance(media, dict):
+                parts.extend(
+                    media[key] for key in ("name", "description") if media.get(key)
+                )
+        for result in item.get("search_results") or []:
+            parts.append(result.get("video_title") or "")
+            parts.extend(shot.get("text") or "" for shot in result.get("shots", []))
+    return "\n".join(part for part in parts if part)
+
+
+# Sums of usage_ledger rows, shared by the SQL databases. Agent rows carry the run latency, LLM rows the tokens and cost.
+USAGE_AGGREGATES = """
+COALESCE(SUM(CASE WHEN kind = 'llm' THEN 1 ELSE 0 END), 0) AS llm_calls,
+COALESCE(SUM(CASE WHEN kind = 'agent' THEN 1 ELSE 0 END), 0) AS agent_runs,
+COALESCE(SUM(send_tokens), 0) AS send_tokens,
+COALESCE(SUM(recv_tokens), 0) AS recv_tokens,
+COALESCE(SUM(total_tokens), 0) AS total_tokens,
+COALESCE(SUM(cache_read_tokens), 0) AS cache_read_tokens,
+COALESCE(SUM(cache_write_tokens), 0) AS cache_write_tokens,
+COALESCE(SUM(cost), 0) AS cost,
+COALESCE(SUM(CASE WHEN kind = 'llm' THEN latency_ms ELSE 0 END), 0) AS llm_latency_ms,
+COALESCE(SUM(CASE WHEN kind = 'agent' THEN latency_ms ELSE 0 END), 0) AS agent_latency_ms,
+COALESCE(SUM(CASE WHEN status = 'error' THEN 1 ELSE 0 END), 0) AS errors
+"""
+
+USAGE_RECORD_FIELDS = (
+    "session_id",
+    "conv_id",
+    "kind",
+    "agent",
+    "model",
+    "send_tokens",
+    "recv_tokens",
+    "total_tokens",
+    "cache_read_tokens",
+    "cache_write_tokens",
+    "cost",
+    "latency_ms",
+    "status",
+    "created_at",
+)
+
+
+def usage_query(group_by: str = None, placeholder: str = "?") -> str:
+    """SQL summing the usage of a session, optionally per value of the ``group_by`` column."""
+    if group_by is None:
+        return f"SELECT {USAGE_AGGREGATES} FROM usage_ledger WHERE session_id = {placeholder}"
+    return (
+        f"SELECT {group_by}, {USAGE_AGGREGATES} FROM usage_ledger "
+        f"WHERE session_id = {placeholder} AND {group_by} IS NOT NULL "
+        f"GROUP BY {group_by} ORDER BY total_tokens DESC"
+    )
+
+
 class BaseDB(ABC):
     """Interface for all databases. It provides a common interface for all databases to follow."""
 
@@ -21,16 +106,71 @@ class BaseDB(ABC):
         """Get all sessions."""
         pass
 
+    @abstractmethod
+    def get_sessions_page(
+        self, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of sessions, most recently updated first.
+
+        :param int limit: Maximum number of sessions in the page.
+        :param str before: Cursor, return sessions updated before it (older).
+        :param str after: Cursor, return sessions updated after it (newer).
+        :return: ``{"sessions": [...], "before": cursor or None, "after": cursor or None}``. A ``None`` cursor means there are no more sessions in that direction.
+        """
+        pass
+
     @abstractmethod
     def add_or_update_msg_to_conv() -> None:
         """Add a new message (input or output) to the conversation."""
         pass
 
+    def add_or_update_msgs_to_conv(self, messages: list) -> None:
+        """Add or update several conversation messages. Databases should override this to write them in a single transaction.
+
+        :param list messages: Keyword arguments of :meth:`add_or_update_msg_to_conv` for each message.
+        """
+        for message in messages:
+            self.add_or_update_msg_to_conv(**message)
+
     @abstractmethod
     def get_conversations(self, session_id: str) -> list:
         """Get all conversations for a given session."""
         pass
 
+    @abstractmethod
+    def get_message(self, session_id: str, msg_id: str) -> dict:
+        """Get a message of a session by msg_id.
+
+        :param str session_id: Unique session ID.
+        :param str msg_id: Unique message ID.
+        :return: The message, or None if the session has no such message.
+        """
+        pass
+
+    @abstractmethod
+    def get_conversations_page(
+        self, session_id: str, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of messages for a given session, in chronological order. Without a cursor the latest page is returned.
+
+        :param str session_id: Unique session ID.
+        :param int limit: Maximum number of messages in the page.
+        :param str before: Cursor, return messages created before it (older).
+        :param str after: Cursor, return messages created after it (newer).
+        :return: ``{"conversation": [...], "before": cursor or None, "after": cursor or None}``. A ``None`` cursor means there are no more messages in that direction.
+        """
+        pass
+
+    @abstractmethod
+    def search_conversations(self, query: str, limit: int = 20) -> list:
+        """Full-text search over the text of all conversation messages.
+
+        :param str query: Words to search for. All words must match, the last one as a prefix.
+        :param int limit: Maximum number of hits.
+        :return: Hits ranked by relevance, each with ``session_id``, ``conv_id``, ``msg_id``, ``msg_type``, ``created_at`` and a highlighted ``snippet``.
+        """
+        pass
+
     @abstractmethod
     def get_context_messages(self, session_id: str) -> list:
         """Get context messages for a session."""
@@ -43,6 +183,79 @@ class BaseDB(ABC):
         """Update context messages for a session."""
         pass
 
+    @abstractmethod
+    def append_context_log(self, session_id: str, messages: list, offset: int) -> None:
+        """Append reasoning context messages to the context log of a session.
+
+        :param str session_id: Unique session ID.
+        :param list messages: Context messages to append.
+        :param int offset: Position of the first message in the log, i.e. the number of messages already in it.
+        """
+        pass
+
+    @abstractmethod
+    def get_context_log(self, session_id: str, offset: int = 0) -> list:
+        """Get the reasoning context messages of a session from the context log.
+
+        :param str session_id: Unique session ID.
+        :param int offset: Return only the messages at or after this position.
+        :return: List of context messages in order.
+        """
+        pass
+
+    @abstractmethod
+    def compact_context_log(self, session_id: str, messages: list) -> None:
+        """Replace the whole context log of a session with ``messages`` in a single transaction.
+
+        :param str session_id: Unique session ID.
+        :param list messages: Context messages the log should contain.
+        """
+        pass
+
+    @abstractmethod
+    def add_usage_records(self, records: list) -> None:
+        """Append LLM calls and agent runs to the usage ledger.
+
+        :param list records: Dicts with the fields of :data:`USAGE_RECORD_FIELDS`.
+        """
+        pass
+
+    @abstractmethod
+    def get_usage(self, session_id: str) -> dict:
+        """Get the usage of a session from the usage ledger.
+
+        :param str session_id: Unique session ID.
+        :return: ``{"session_id", "total", "conversations", "agents", "models"}``. ``total`` sums the whole session, the others are lists of sums per ``conv_id``, ``agent`` and ``model``. Each sum has ``llm_calls``, ``agent_runs``, ``send_tokens``, ``recv_tokens``, ``total_tokens``, ``cache_read_tokens``, ``cache_write_tokens``, ``cost``, ``llm_latency_ms``, ``agent_latency_ms`` and ``errors``.
+        """
+        pass
+
+    @abstractmethod
+    def purge_sessions(
+        self,
+        max_age: int = None,
+        max_sessions: int = None,
+        batch_size: int = 100,
+        pause: float = 0.0,
+    ) -> int:
+        """Delete expired sessions and all their data, in batches of one transaction each.
+
+        :param int max_age: Delete sessions without activity for this many seconds.
+        :param int max_sessions: Keep only this many of the most recently updated sessions.
+        :param int batch_size: Sessions deleted per transaction.
+        :param float pause: Seconds to sleep between batches.
+        :return: Number of sessions deleted.
+        """
+        pass
+
+    def vacuum(
+        self, max_pages: int = None, slice_pages: int = 256, pause: float = 0.0
+    ) -> int:
+        """Return space freed by deleted rows to the file system in bounded slices. Databases that reclaim space on their own keep this no-op.
+
+        :return: Number of pages freed.
+        """
+        return 0
+
     @abstractmethod
     def health_check(self) -> bool:
         """Check if the database is healthy."""
@@ -0,0 +1,655 @@
+import os
+import re
+import time
+import logging
+
+from contextlib import contextmanager
+from typing import List
+
+from director.constants import DBType
+from director.db.base import (
+    BaseDB,
+    encode_cursor,
+    decode_cursor,
+    content_to_text,
+    usage_query,
+    USAGE_RECORD_FIELDS,
+)
+from director.db.postgres.initialize import connection_params, create_schema
+
+logger = logging.getLogger(__name__)
+
+
+# Messages of sessions that were deleted meanwhile are skipped instead of failing the foreign key.
+# Parameters of a SELECT are typed as text, the JSONB ones are cast.
+UPSERT_CONVERSATION_QUERY = """
+INSERT INTO conversations (session_id, conv_id, msg_id, msg_type, agents, actions, content, status, created_at, updated_at, metadata, search_text)
+SELECT %s, %s, %s, %s, %s::jsonb, %s::jsonb, %s::jsonb, %s, %s, %s, %s::jsonb, %s
+WHERE EXISTS (SELECT 1 FROM sessions WHERE session_id = %s)
+ON CONFLICT (msg_id) DO UPDATE SET
+    session_id = EXCLUDED.session_id,
+    conv_id = EXCLUDED.conv_id,
+    msg_type = EXCLUDED.msg_type,
+    agents = EXCLUDED.agents,
+    actions = EXCLUDED.actions,
+    content = EXCLUDED.content,
+    status = EXCLUDED.status,
+    updated_at = EXCLUDED.updated_at,
+    metadata = EXCLUDED.metadata,
+    search_text = EXCLUDED.search_text
+"""
+
+INSERT_USAGE_QUERY = f"""
+INSERT INTO usage_ledger ({", ".join(USAGE_RECORD_FIELDS)})
+SELECT {", ".join("%s" for _ in USAGE_RECORD_FIELDS)}
+WHERE EXISTS (SELECT 1 FROM sessions WHERE session_id = %s)
+"""
+
+SEARCH_CONVERSATIONS_QUERY = """
+SELECT session_id, conv_id, msg_id, msg_type, created_at,
+    ts_headline('english', search_text, query, 'StartSel=<b>, StopSel=</b>, MaxWords=16, MinWords=8') AS snippet,
+    ts_rank(to_tsvector('english', coalesce(search_text, '')), query) AS rank
+FROM conversations, to_tsquery('english', %s) AS query
+WHERE to_tsvector('english', coalesce(search_text, '')) @@ query
+ORDER BY rank DESC
+LIMIT %s
+"""
+
+INSERT_CONTEXT_LOG_QUERY = """
+INSERT INTO context_log (session_id, seq, message, created_at)
+VALUES (%s, %s, %s, %s)
+ON CONFLICT (session_id, seq) DO UPDATE SET
+    message = EXCLUDED.message,
+    created_at = EXCLUDED.created_at
+"""
+
+# Sessions last updated before the cutoff and without newer messages
+SELECT_EXPIRED_SESSIONS_QUERY = """
+SELECT session_id FROM sessions AS s
+WHERE s.updated_at < %s
+AND NOT EXISTS (SELECT 1 FROM conversations AS c WHERE c.session_id = s.session_id AND c.updated_at >= %s)
+ORDER BY s.updated_at
+LIMIT %s
+"""
+
+# Oldest sessions beyond the newest ``keep``
+SELECT_EXCESS_SESSIONS_QUERY = """
+SELECT session_id FROM sessions
+ORDER BY updated_at DESC, session_id DESC
+LIMIT %s OFFSET %s
+"""
+
+
+class PostgresDB(BaseDB):
+    """PostgreSQL database with a bounded, thread-safe connection pool. JSON columns are stored as JSONB and upserts run server side with ``ON CONFLICT``, so several backend replicas can share one database."""
+
+    def __init__(
+        self, dsn: str = None, min_connections: int = None, max_connections: int = None
+    ):
+        """
+        :param str dsn: Connection string, defaults to ``POSTGRES_DSN`` and the ``POSTGRES_*`` environment variables.
+        :param int min_connections: Connections opened up front, defaults to ``POSTGRES_POOL_MIN`` or 1.
+        :param int max_connections: Maximum open connections, defaults to ``POSTGRES_POOL_MAX`` or 10.
+        """
+        try:
+            import psycopg2
+            import psycopg2.extras
+            import psycopg2.pool
+        except ImportError:
+            raise ImportError("Please install psycopg2 python library.")
+
+        self._extras = psycopg2.extras
+        self._pool_exhausted = psycopg2.pool.PoolError
+        self.db_type = DBType.POSTGRES
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            min_connections or int(os.getenv("POSTGRES_POOL_MIN", 1)),
+            max_connections or int(os.getenv("POSTGRES_POOL_MAX", 10)),
+            dsn or os.getenv("POSTGRES_DSN", ""),
+            **connection_params(),
+        )
+        self.pool_timeout = float(os.getenv("POSTGRES_POOL_TIMEOUT", 30))
+        with self.connection() as conn:
+            create_schema(conn)
+        logger.info("Connected to PostgreSQL DB...")
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the ``with`` block, committing on success and rolling back on error.
+
+        Waits up to ``POSTGRES_POOL_TIMEOUT`` seconds when all connections are in use.
+        """
+        deadline = time.monotonic() + self.pool_timeout
+        while True:
+            try:
+                conn = self.pool.getconn()
+                break
+            except self._pool_exhausted:
+                if time.monotonic() > deadline:
+                    raise TimeoutError("Timed out waiting for a PostgreSQL connection")
+                time.sleep(0.05)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    @contextmanager
+    def cursor(self):
+        """Cursor returning rows as dictionaries, in its own transaction."""
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=self._extras.RealDictCursor) as cursor:
+                yield cursor
+
+    def _json(self, value):
+        return self._extras.Json(value)
+
+    def create_session(
+        self,
+        session_id: str,
+        video_id: str,
+        collection_id: str,
+        created_at: int = None,
+        updated_at: int = None,
+        metadata: dict = {},
+        **kwargs,
+    ) -> None:
+        """Create a new session.
+
+        :param session_id: Unique session ID.
+        :param video_id: ID of the video associated with the session.
+        :param collection_id: ID of the collection associated with the session.
+        :param created_at: Timestamp when the session was created.
+        :param updated_at: Timestamp when the session was last updated.
+        :param metadata: Additional metadata for the session.
+        """
+        created_at = created_at or int(time.time())
+        updated_at = updated_at or int(time.time())
+
+        with self.cursor() as cursor:
+            cursor.execute(
+                """
+            INSERT INTO sessions (session_id, video_id, collection_id, created_at, updated_at, metadata)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (session_id) DO NOTHING
+            """,
+                (
+                    session_id,
+                    video_id,
+                    collection_id,
+                    created_at,
+                    updated_at,
+                    self._json(metadata),
+                ),
+            )
+
+    def get_session(self, session_id: str) -> dict:
+        """Get a session by session_id.
+
+        :param session_id: Unique session ID.
+        :return: Session data as a dictionary.
+        :rtype: dict
+        """
+        with self.cursor() as cursor:
+            cursor.execute("SELECT * FROM sessions WHERE session_id = %s", (session_id,))
+            row = cursor.fetchone()
+        return dict(row) if row is not None else {}
+
+    def get_sessions(self) -> list:
+        """Get all sessions.
+
+        :return: List of all sessions.
+        :rtype: list
+        """
+        with self.cursor() as cursor:
+            cursor.execute("SELECT * FROM sessions ORDER BY updated_at DESC")
+            return [dict(row) for row in cursor.fetchall()]
+
+    def _get_page(
+        self,
+        table: str,
+        sort_column: str,
+        key_column: str,
+        where: str,
+        params: tuple,
+        limit: int,
+        before: str = None,
+        after: str = None,
+    ) -> tuple:
+        """Fetch one keyset page of ``table`` ordered by ``(sort_column, key_column)``.
+
+        :return: Rows from oldest to newest, and the cursors to the older and newer pages.
+        """
+        if after:
+            order, op, cursor = "ASC", ">", after
+        else:
+            order, op, cursor = "DESC", "<", before
+
+        query = f"SELECT * FROM {table} WHERE {where}"
+        if cursor:
+            key = decode_cursor(cursor)
+            if not isinstance(key, list) or len(key) != 2:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            query += f" AND ({sort_column}, {key_column}) {op} (%s, %s)"
+            params = params + tuple(key)
+        query += f" ORDER BY {sort_column} {order}, {key_column} {order} LIMIT %s"
+
+        with self.cursor() as db_cursor:
+            db_cursor.execute(query, params + (limit + 1,))
+            rows = [dict(row) for row in db_cursor.fetchall()]
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "DESC":
+            rows.reverse()
+        if not rows:
+            return rows, None, None
+
+        has_older = has_more if order == "DESC" else True
+        has_newer = has_more if order == "ASC" else bool(cursor)
+        older_cursor = (
+            encode_cursor(rows[0][sort_column], rows[0][key_column])
+            if has_older
+            else None
+        )
+        newer_cursor = (
+            encode_cursor(rows[-1][sort_column], rows[-1][key_column])
+            if has_newer
+            else None
+        )
+        return rows, older_cursor, newer_cursor
+
+    def get_sessions_page(
+        self, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of sessions, most recently updated first.
+
+        :param int limit: Maximum number of sessions in the page.
+        :param str before: Cursor, return sessions updated before it (older).
+        :param str after: Cursor, return sessions updated after it (newer).
+        :return: Sessions in the page and the cursors to the older and newer pages.
+        :rtype: dict
+        """
+        sessions, older, newer = self._get_page(
+            "sessions", "updated_at", "session_id", "TRUE", (), limit, before, after
+        )
+        sessions.reverse()
+        return {"sessions": sessions, "before": older, "after": newer}
+
+    def _conversation_row(
+        self,
+        session_id: str,
+        conv_id: str,
+        msg_id: str,
+        msg_type: str,
+        agents: List[str],
+        actions: List[str],
+        content: List[dict],
+        status: str = None,
+        created_at: int = None,
+        updated_at: int = None,
+        metadata: dict = {},
+        **kwargs,
+    ) -> tuple:
+        created_at = created_at or int(time.time())
+        updated_at = updated_at or int(time.time())
+        return (
+            session_id,
+            conv_id,
+            msg_id,
+            msg_type,
+            self._json(agents),
+            self._json(actions),
+            self._json(content),
+            status,
+            created_at,
+            updated_at,
+            self._json(metadata),
+            content_to_text(content),
+            session_id,
+        )
+
+    def add_or_update_msg_to_conv(
+        self,
+        session_id: str,
+        conv_id: str,
+        msg_id: str,
+        msg_type: str,
+        agents: List[str],
+        actions: List[str],
+        content: List[dict],
+        status: str = None,
+        created_at: int = None,
+        updated_at: int = None,
+        metadata: dict = {},
+        **kwargs,
+    ) -> None:
+        """Add a new message (input or output) to the conversation.
+
+        :param str session_id: Unique session ID.
+        :param str conv_id: Unique conversation ID.
+        :param str msg_id: Unique message ID.
+        :param str msg_type: Type of message (input or output).
+        :param list agents: List of agents involved in the conversation.
+        :param list actions: List of actions taken by the agents.
+        :param list content: List of message content.
+        :param str status: Status of the message.
+        :param int created_at: Timestamp when the message was created.
+        :param int updated_at: Timestamp when the message was last updated.
+        :param dict metadata: Additional metadata for the message.
+        """
+        self.add_or_update_msgs_to_conv(
+            [
+                dict(
+                    session_id=session_id,
+                    conv_id=conv_id,
+                    msg_id=msg_id,
+                    msg_type=msg_type,
+                    agents=agents,
+                    actions=actions,
+                    content=content,
+                    status=status,
+                    created_at=created_at,
+                    updated_at=updated_at,
+                    metadata=metadata,
+                )
+            ]
+        )
+
+    def add_or_update_msgs_to_conv(self, messages: list) -> None:
+        """Add or update several conversation messages in a single transaction.
+
+        :param list messages: Keyword arguments of :meth:`add_or_update_msg_to_conv` for each message.
+        """
+        with self.cursor() as cursor:
+            self._extras.execute_batch(
+                cursor,
+                UPSERT_CONVERSATION_QUERY,
+                [self._conversation_row(**message) for message in messages],
+            )
+
+    def get_conversations(self, session_id: str) -> list:
+        """Get all conversations for a given session."""
+        with self.cursor() as cursor:
+            cursor.execute(
+                "SELECT * FROM conversations WHERE session_id = %s ORDER BY created_at, msg_id",
+                (session_id,),
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_message(self, session_id: str, msg_id: str) -> dict:
+        """Get a message of a session by msg_id."""
+        with self.cursor() as cursor:
+            cursor.execute(
+                "SELECT * FROM conversations WHERE msg_id = %s AND session_id = %s",
+                (msg_id, session_id),
+            )
+            row = cursor.fetchone()
+            return dict(row) if row is not None else None
+
+    def get_conversations_page(
+        self, session_id: str, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of messages for a given session, in chronological order. Without a cursor the latest page is returned.
+
+        :param str session_id: Unique session ID.
+        :param int limit: Maximum number of messages in the page.
+        :param str before: Cursor, return messages created before it (older).
+        :param str after: Cursor, return messages created after it (newer).
+        :return: Messages in the page and the cursors to the older and newer pages.
+        :rtype: dict
+        """
+        conversations, older, newer = self._get_page(
+            "conversations",
+            "created_at",
+            "msg_id",
+            "session_id = %s",
+            (session_id,),
+            limit,
+            before,
+            after,
+        )
+        return {"conversation": conversations, "before": older, "after": newer}
+
+    def search_conversations(self, query: str, limit: int = 20) -> list:
+        """Full-text search over the text of all conversation messages.
+
+        :param str query: Words to search for. All words must match, the last one as a prefix.
+        :param int limit: Maximum number of hits.
+        :return: Hits ranked by relevance, with a highlighted snippet of the matching text.
+        :rtype: list
+        """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        ts_query = " & ".join(words) + ":*"
+        with self.cursor() as cursor:
+            cursor.execute(SEARCH_CONVERSATIONS_QUERY, (ts_query, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_context_messages(self, session_id: str) -> list:
+        """Get context messages for a session.
+
+        :param str session_id: Unique session ID.
+        :return: List of context messages.
+        :rtype: list
+        """
+        with self.cursor() as cursor:
+            cursor.execute(
+                "SELECT context_data FROM context_messages WHERE session_id = %s",
+                (session_id,),
+            )
+            row = cursor.fetchone()
+        return row["context_data"] if row else {}
+
+    def add_or_update_context_msg(
+        self,
+        session_id: str,
+        context_messages: list,
+        created_at: int = None,
+        updated_at: int = None,
+        metadata: dict = {},
+        **kwargs,
+    ) -> None:
+        """Update context messages for a session.
+
+        :param str session_id: Unique session ID.
+        :param List context_messages: List of context messages.
+        :param int created_at: Timestamp when the context messages were created.
+        :param int updated_at: Timestamp when the context messages were last updated.
+        :param dict metadata: Additional metadata for the context messages.
+        """
+        created_at = created_at or int(time.time())
+        updated_at = updated_at or int(time.time())
+
+        with self.cursor() as cursor:
+            cursor.execute(
+                """
+            INSERT INTO context_messages (context_data, session_id, created_at, updated_at, metadata)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (session_id) DO UPDATE SET
+                context_data = EXCLUDED.context_data,
+                updated_at = EXCLUDED.updated_at,
+                metadata = EXCLUDED.metadata
+            """,
+                (
+                    self._json(context_messages),
+                    session_id,
+                    created_at,
+                    updated_at,
+                    self._json(metadata),
+                ),
+            )
+
+    def _context_log_rows(self, session_id: str, messages: list, offset: int) -> list:
+        created_at = int(time.time())
+        return [
+            (session_id, offset + i, self._json(message), created_at)
+            for i, message in enumerate(messages)
+        ]
+
+    def append_context_log(self, session_id: str, messages: list, offset: int) -> None:
+        """Append reasoning context messages to the context log of a session.
+
+        :param str session_id: Unique session ID.
+        :param list messages: Context messages to append.
+        :param int offset: Position of the first message in the log, i.e. the number of messages already in it.
+        """
+        if not messages:
+            return
+        with self.cursor() as cursor:
+            self._extras.execute_batch(
+                cursor,
+                INSERT_CONTEXT_LOG_QUERY,
+                self._context_log_rows(session_id, messages, offset),
+            )
+
+    def get_context_log(self, session_id: str, offset: int = 0) -> list:
+        """Get the reasoning context messages of a session from the context log.
+
+        :param str session_id: Unique session ID.
+        :param int offset: Return only the messages at or after this position.
+        :return: List of context messages in order.
+        :rtype: list
+        """
+        with self.cursor() as cursor:
+            cursor.execute(
+                "SELECT message FROM context_log WHERE session_id = %s AND seq >= %s ORDER BY seq",
+                (session_id, offset),
+            )
+            return [row["message"] for row in cursor.fetchall()]
+
+    def compact_context_log(self, session_id: str, messages: list) -> None:
+        """Replace the whole context log of a session with ``messages`` in a single transaction.
+
+        :param str session_id: Unique session ID.
+        :param list messages: Context messages the log should contain.
+        """
+        with self.cursor() as cursor:
+            cursor.execute("DELETE FROM context_log WHERE session_id = %s", (session_id,))
+            self._extras.execute_batch(
+                cursor,
+                INSERT_CONTEXT_LOG_QUERY,
+                self._context_log_rows(session_id, messages, 0),
+            )
+
+    def add_usage_records(self, records: list) -> None:
+        """Append LLM calls and agent runs to the usage ledger in a single transaction.
+
+        :param list records: Dicts with the fields of :data:`director.db.base.USAGE_RECORD_FIELDS`.
+        """
+        if not records:
+            return
+        with self.cursor() as cursor:
+            self._extras.execute_batch(
+                cursor,
+                INSERT_USAGE_QUERY,
+                [
+                    tuple(record.get(field) for field in USAGE_RECORD_FIELDS)
+                    + (record["session_id"],)
+                    for record in records
+                ],
+            )
+
+    def get_usage(self, session_id: str) -> dict:
+        """Get the usage of a session, in total and per conversation, agent and model.
+
+        :param str session_id: Unique session ID.
+        :return: Usage sums, see :meth:`director.db.base.BaseDB.get_usage`.
+        :rtype: dict
+        """
+        usage = {"session_id": session_id}
+        with self.cursor() as cursor:
+            cursor.execute(usage_query(placeholder="%s"), (session_id,))
+            usage["total"] = dict(cursor.fetchone())
+            for key, column in (
+                ("conversations", "conv_id"),
+                ("agents", "agent"),
+                ("models", "model"),
+            ):
+                cursor.execute(usage_query(column, placeholder="%s"), (session_id,))
+                usage[key] = [dict(row) for row in cursor.fetchall()]
+        return usage
+
+    def delete_session(self, session_id: str) -> tuple:
+        """Delete a session and all its associated data in a single transaction.
+
+        :param str session_id: Unique session ID.
+        :return: Whether the session was deleted and the list of components that failed to delete.
+        """
+        failed_components = []
+        with self.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM conversations WHERE session_id = %s", (session_id,)
+            )
+            if not cursor.rowcount > 0:
+                failed_components.append("conversation")
+            deleted = 0
+            for table in ("context_messages", "context_log"):
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE session_id = %s", (session_id,)
+                )
+                deleted += cursor.rowcount
+            if not deleted > 0:
+                failed_components.append("context")
+            cursor.execute("DELETE FROM sessions WHERE session_id = %s", (session_id,))
+            if not cursor.rowcount > 0:
+                failed_components.append("session")
+        success = len(failed_components) < 3
+        return success, failed_components
+
+    def purge_sessions(
+        self,
+        max_age: int = None,
+        max_sessions: int = None,
+        batch_size: int = 100,
+        pause: float = 0.0,
+    ) -> int:
+        """Delete expired sessions and all their data, in batches of one transaction each. Child rows go with ``ON DELETE CASCADE``.
+
+        :param int max_age: Delete sessions without activity for this many seconds.
+        :param int max_sessions: Keep only this many of the most recently updated sessions.
+        :param int batch_size: Sessions deleted per transaction.
+        :param float pause: Seconds to sleep between batches.
+        :return: Number of sessions deleted.
+        :rtype: int
+        """
+        cutoff = int(time.time()) - max_age if max_age else None
+        purged = 0
+        while True:
+            with self.cursor() as cursor:
+                session_ids = set()
+                if cutoff is not None:
+                    cursor.execute(
+                        SELECT_EXPIRED_SESSIONS_QUERY, (cutoff, cutoff, batch_size)
+                    )
+                    session_ids.update(row["session_id"] for row in cursor.fetchall())
+                if max_sessions is not None and len(session_ids) < batch_size:
+                    cursor.execute(
+                        SELECT_EXCESS_SESSIONS_QUERY,
+                        (batch_size - len(session_ids), max_sessions),
+                    )
+                    session_ids.update(row["session_id"] for row in cursor.fetchall())
+                if not session_ids:
+                    break
+                cursor.execute(
+                    "DELETE FROM sessions WHERE session_id = ANY(%s)",
+                    (list(session_ids),),
+                )
+            purged += len(session_ids)
+            if pause:
+                time.sleep(pause)
+        return purged
+
+    def health_check(self) -> bool:
+        """Check if the PostgreSQL database is reachable, creating the tables if needed."""
+        try:
+            with self.connection() as conn:
+                create_schema(conn)
+            return True
+
+        except Exception as e:
+            logger.exception(f"PostgreSQL health check failed: {e}")
+            return False
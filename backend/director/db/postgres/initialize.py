@@ -0,0 +1,134 @@
+import os
+
+# SQL to create the sessions table
+CREATE_SESSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    video_id TEXT,
+    collection_id TEXT,
+    created_at BIGINT,
+    updated_at BIGINT,
+    metadata JSONB DEFAULT '{}'::jsonb
+)
+"""
+
+# SQL to create the conversations table
+CREATE_CONVERSATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS conversations (
+    session_id TEXT REFERENCES sessions(session_id) ON DELETE CASCADE,
+    conv_id TEXT,
+    msg_id TEXT PRIMARY KEY,
+    msg_type TEXT,
+    agents JSONB,
+    actions JSONB,
+    content JSONB,
+    status TEXT,
+    created_at BIGINT,
+    updated_at BIGINT,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    search_text TEXT
+)
+"""
+
+# SQL to create the context_messages table
+CREATE_CONTEXT_MESSAGES_TABLE = """
+CREATE TABLE IF NOT EXISTS context_messages (
+    session_id TEXT PRIMARY KEY REFERENCES sessions(session_id) ON DELETE CASCADE,
+    context_data JSONB,
+    created_at BIGINT,
+    updated_at BIGINT,
+    metadata JSONB DEFAULT '{}'::jsonb
+)
+"""
+
+# SQL to create the context_log table, an append-only log of reasoning context messages
+CREATE_CONTEXT_LOG_TABLE = """
+CREATE TABLE IF NOT EXISTS context_log (
+    session_id TEXT REFERENCES sessions(session_id) ON DELETE CASCADE,
+    seq INTEGER,
+    message JSONB,
+    created_at BIGINT,
+    PRIMARY KEY (session_id, seq)
+)
+"""
+
+# SQL to create the usage_ledger table, one row per LLM call or agent run
+CREATE_USAGE_LEDGER_TABLE = """
+CREATE TABLE IF NOT EXISTS usage_ledger (
+    session_id TEXT REFERENCES sessions(session_id) ON DELETE CASCADE,
+    conv_id TEXT,
+    kind TEXT,
+    agent TEXT,
+    model TEXT,
+    send_tokens INTEGER,
+    recv_tokens INTEGER,
+    total_tokens INTEGER,
+    cache_read_tokens INTEGER DEFAULT 0,
+    cache_write_tokens INTEGER DEFAULT 0,
+    cost DOUBLE PRECISION,
+    latency_ms INTEGER,
+    status TEXT,
+    created_at BIGINT
+)
+"""
+
+CREATE_INDEXES = [
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS search_text TEXT",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_search ON conversations USING GIN (to_tsvector('english', coalesce(search_text, '')))",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_session_created ON conversations (session_id, created_at, msg_id)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_conv_id ON conversations (conv_id)",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at, session_id)",
+    "CREATE INDEX IF NOT EXISTS idx_usage_ledger_session ON usage_ledger (session_id, conv_id)",
+    "ALTER TABLE usage_ledger ADD COLUMN IF NOT EXISTS cache_read_tokens INTEGER DEFAULT 0",
+    "ALTER TABLE usage_ledger ADD COLUMN IF NOT EXISTS cache_write_tokens INTEGER DEFAULT 0",
+]
+
+SCHEMA = [
+    CREATE_SESSIONS_TABLE,
+    CREATE_CONVERSATIONS_TABLE,
+    CREATE_CONTEXT_MESSAGES_TABLE,
+    CREATE_CONTEXT_LOG_TABLE,
+    CREATE_USAGE_LEDGER_TABLE,
+    *CREATE_INDEXES,
+]
+
+
+def create_schema(conn):
+    """Create the tables and indexes if they don't exist, using an open connection."""
+    with conn.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    conn.commit()
+
+
+def connection_params() -> dict:
+    """Connection parameters from the ``POSTGRES_*`` environment variables."""
+    params = {
+        "dbname": os.getenv("POSTGRES_DB"),
+        "user": os.getenv("POSTGRES_USER"),
+        "password": os.getenv("POSTGRES_PASSWORD"),
+        "host": os.getenv("POSTGRES_HOST"),
+        "port": os.getenv("POSTGRES_PORT"),
+    }
+    return {key: value for key, value in params.items() if value}
+
+
+def initialize_postgres(dsn: str = None):
+    """Initialize the PostgreSQL database by creating the necessary tables and indexes.
+
+    :param str dsn: Connection string, defaults to the ``POSTGRES_*`` environment variables.
+    """
+    import psycopg2
+
+    conn = psycopg2.connect(dsn or os.getenv("POSTGRES_DSN", ""), **connection_params())
+    try:
+        create_schema(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    initialize_postgres()
@@ -0,0 +1,166 @@
+"""Session retention: purge expired sessions and give the freed space back to the file system.
+
+The policy is read from the environment:
+
+- ``DB_RETENTION_DAYS``: delete sessions without activity for this many days.
+- ``DB_RETENTION_MAX_SESSIONS``: keep only this many of the most recently updated sessions.
+- ``DB_RETENTION_BATCH_SIZE``: sessions deleted per transaction, default 100.
+- ``DB_VACUUM_MAX_PAGES``: pages freed per run, default all free pages.
+- ``DB_VACUUM_SLICE_PAGES``: pages freed per transaction, default 256.
+"""
+
+import os
+import logging
+import threading
+
+from director.db.base import BaseDB
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+class RetentionPolicy:
+    """How long sessions are kept and how the cleanup is split into small transactions."""
+
+    def __init__(
+        self,
+        max_age_days: float = None,
+        max_sessions: int = None,
+        batch_size: int = 100,
+        vacuum_max_pages: int = None,
+        vacuum_slice_pages: int = 256,
+        pause: float = 0.05,
+    ):
+        """
+        :param float max_age_days: Delete sessions without activity for this many days, ``None`` keeps them forever.
+        :param int max_sessions: Keep only this many of the most recently updated sessions, ``None`` for no limit.
+        :param int batch_size: Sessions deleted per transaction.
+        :param int vacuum_max_pages: Pages freed per run, ``None`` frees all free pages.
+        :param int vacuum_slice_pages: Pages freed per transaction.
+        :param float pause: Seconds to sleep between transactions, to leave room for the server.
+        """
+        self.max_age_days = max_age_days
+        self.max_sessions = max_sessions
+        self.batch_size = batch_size
+        self.vacuum_max_pages = vacuum_max_pages
+        self.vacuum_slice_pages = vacuum_slice_pages
+        self.pause = pause
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """Read the policy from the ``DB_RETENTION_*`` and ``DB_VACUUM_*`` environment variables."""
+        max_age_days = os.getenv("DB_RETENTION_DAYS")
+        return cls(
+            max_age_days=float(max_age_days) if max_age_days else None,
+            max_sessions=_env_int("DB_RETENTION_MAX_SESSIONS"),
+            batch_size=_env_int("DB_RETENTION_BATCH_SIZE") or 100,
+            vacuum_max_pages=_env_int("DB_VACUUM_MAX_PAGES"),
+            vacuum_slice_pages=_env_int("DB_VACUUM_SLICE_PAGES") or 256,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age_days is not None or self.max_sessions is not None
+
+
+def run_retention(db: BaseDB, policy: RetentionPolicy) -> dict:
+    """Purge the sessions expired by ``policy`` and vacuum the freed pages.
+
+    :return: Number of ``purged`` sessions and ``freed_pages``.
+    :rtype: dict
+    """
+    purged = 0
+    if policy.enabled:
+        purged = db.purge_sessions(
+            max_age=int(policy.max_age_days * 86400)
+            if policy.max_age_days is not None
+            else None,
+            max_sessions=policy.max_sessions,
+            batch_size=policy.batch_size,
+            pause=policy.pause,
+        )
+    freed_pages = db.vacuum(
+        max_pages=policy.vacuum_max_pages,
+        slice_pages=policy.vacuum_slice_pages,
+        pause=policy.pause,
+    )
+    logger.info(f"Retention purged {purged} sessions and freed {freed_pages} pages")
+    return {"purged": purged, "freed_pages": freed_pages}
+
+
+class RetentionTask:
+    """Runs :func:`run_retention` every ``interval`` seconds in a daemon thread."""
+
+    def __init__(self, db: BaseDB, policy: RetentionPolicy, interval: float):
+        """
+        :param BaseDB db: Database to clean up.
+        :param RetentionPolicy policy: Retention policy to apply.
+        :param float interval: Seconds between runs.
+        """
+        self.db = db
+        self.policy = policy
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="db-retention", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                run_retention(self.db, self.policy)
+            except Exception as e:
+                logger.exception(f"Error in running retention: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+
+    from director.db import load_db
+
+    load_dotenv()
+    policy = RetentionPolicy.from_env()
+
+    parser = argparse.ArgumentParser(
+        description="Purge expired sessions and vacuum the database."
+    )
+    parser.add_argument("--db-type", default=os.getenv("SERVER_DB_TYPE", "sqlite"))
+    parser.add_argument("--days", type=float, default=policy.max_age_days)
+    parser.add_argument("--max-sessions", type=int, default=policy.max_sessions)
+    parser.add_argument("--batch-size", type=int, default=policy.batch_size)
+    parser.add_argument("--vacuum-pages", type=int, default=policy.vacuum_max_pages)
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="Convert an existing SQLite file to incremental vacuum with a one-time full VACUUM",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = load_db(args.db_type)
+    if args.enable_incremental_vacuum:
+        db.enable_incremental_vacuum()
+    policy.max_age_days = args.days
+    policy.max_sessions = args.max_sessions
+    policy.batch_size = args.batch_size
+    policy.vacuum_max_pages = args.vacuum_pages
+    result = run_retention(db, policy)
+    print(
+        f"Purged {result['purged']} sessions, freed {result['freed_pages']} pages"
+    )
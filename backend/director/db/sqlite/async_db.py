@@ -0,0 +1,359 @@
+import json
+import time
+import asyncio
+import logging
+
+from contextlib import asynccontextmanager
+from typing import List
+
+from director.constants import DBType
+from director.db.async_base import AsyncBaseDB
+from director.db.base import usage_query
+from director.db.sqlite.db import (
+    SQLiteDB,
+    UPSERT_CONVERSATION_QUERY,
+    INDEX_CONVERSATION_TEXT_QUERY,
+    SEARCH_CONVERSATIONS_QUERY,
+    INSERT_CONTEXT_LOG_QUERY,
+    INSERT_USAGE_QUERY,
+)
+from director.db.sqlite.codec import get_codec, decode_column, encode_column
+from director.db.sqlite.initialize import initialize_sqlite
+from director.db.sqlite.pool import DEFAULT_PRAGMAS
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSQLiteDB(AsyncBaseDB):
+    """Asyncio SQLite database backed by aiosqlite. Queries run on the aiosqlite worker thread, so the event loop is never blocked."""
+
+    def __init__(self, db_path: str = "director.db", codec: str = None):
+        """
+        :param db_path: Path to the SQLite database file.
+        :param codec: Codec for the content and context columns, see :func:`director.db.sqlite.codec.get_codec`.
+        """
+        try:
+            import aiosqlite
+        except ImportError:
+            raise ImportError("Please install aiosqlite python library.")
+
+        self._aiosqlite = aiosqlite
+        self.db_type = DBType.SQLITE
+        self.db_path = db_path
+        self.codec = get_codec(codec)
+        self.conn = None
+        self._lock = None
+
+    async def connect(self) -> None:
+        """Open the connection, apply the pragmas and run pending schema migrations."""
+        if self.conn is not None:
+            return
+        await asyncio.to_thread(initialize_sqlite, self.db_path)
+        self.conn = await self._aiosqlite.connect(self.db_path)
+        self.conn.row_factory = self._aiosqlite.Row
+        for pragma, value in DEFAULT_PRAGMAS.items():
+            await self.conn.execute(f"PRAGMA {pragma}={value}")
+        self._lock = asyncio.Lock()
+        logger.info("Connected to SQLite DB with aiosqlite...")
+
+    async def close(self) -> None:
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Run the statements of the ``async with`` block in one transaction."""
+        await self.connect()
+        async with self._lock:
+            try:
+                yield self.conn
+                await self.conn.commit()
+            except BaseException:
+                await self.conn.rollback()
+                raise
+
+    async def _fetchall(self, query: str, params: tuple = ()) -> list:
+        await self.connect()
+        # The lock is fair, so reads see every write queued before them
+        async with self._lock:
+            async with self.conn.execute(query, params) as cursor:
+                return await cursor.fetchall()
+
+    async def create_session(
+        self,
+        session_id: str,
+        video_id: str,
+        collection_id: str,
+        created_at: int = None,
+        updated_at: int = None,
+        metadata: dict = {},
+        **kwargs,
+    ) -> None:
+        """Create a new session."""
+        created_at = created_at or int(time.time())
+        updated_at = updated_at or int(time.time())
+
+        async with self.transaction() as conn:
+            await conn.execute(
+                """
+            INSERT OR IGNORE INTO sessions (session_id, video_id, collection_id, created_at, updated_at, metadata)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    session_id,
+                    video_id,
+                    collection_id,
+                    created_at,
+                    updated_at,
+                    json.dumps(metadata),
+                ),
+            )
+
+    async def get_session(self, session_id: str) -> dict:
+        """Get a session by session_id."""
+        rows = await self._fetchall(
+            "SELECT * FROM sessions WHERE session_id = ?", (session_id,)
+        )
+        if not rows:
+            return {}
+        session = dict(rows[0])
+        session["metadata"] = json.loads(session["metadata"])
+        return session
+
+    async def get_sessions(self) -> list:
+        """Get all sessions."""
+        rows = await self._fetchall("SELECT * FROM sessions ORDER BY updated_at DESC")
+        sessions = [dict(r) for r in rows]
+        for s in sessions:
+            s["metadata"] = json.loads(s["metadata"])
+        return sessions
+
+    async def _get_page(
+        self,
+        table: str,
+        sort_column: str,
+        where: str,
+        params: tuple,
+        limit: int,
+        before: str = None,
+        after: str = None,
+    ) -> tuple:
+        query, params, order, has_cursor = SQLiteDB._page_query(
+            table, sort_column, where, params, limit, before, after
+        )
+        rows = await self._fetchall(query, params)
+        return SQLiteDB._page_result(rows, sort_column, limit, order, has_cursor)
+
+    async def get_sessions_page(
+        self, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of sessions, most recently updated first."""
+        sessions, older, newer = await self._get_page(
+            "sessions", "updated_at", "1", (), limit, before, after
+        )
+        sessions.reverse()
+        for s in sessions:
+            s["metadata"] = json.loads(s["metadata"])
+        return {"sessions": sessions, "before": older, "after": newer}
+
+    async def add_or_update_msg_to_conv(
+        self,
+        session_id: str,
+        conv_id: str,
+        msg_id: str,
+        msg_type: str,
+        agents: List[str],
+        actions: List[str],
+        content: List[dict],
+        status: str = None,
+        created_at: int = None,
+        updated_at: int = None,
+        metadata: dict = {},
+        **kwargs,
+    ) -> None:
+        """Add a new message (input or output) to the conversation."""
+        await self.add_or_update_msgs_to_conv(
+            [
+                dict(
+                    session_id=session_id,
+                    conv_id=conv_id,
+                    msg_id=msg_id,
+                    msg_type=msg_type,
+                    agents=agents,
+                    actions=actions,
+                    content=content,
+                    status=status,
+                    created_at=created_at,
+                    updated_at=updated_at,
+                    metadata=metadata,
+                )
+            ]
+        )
+
+    async def add_or_update_msgs_to_conv(self, messages: list) -> None:
+        """Add or update several conversation messages in a single transaction."""
+        rows = [SQLiteDB._conversation_row(self.codec, **message) for message in messages]
+        text_rows = SQLiteDB._conversation_text_rows(messages)
+        async with self.transaction() as conn:
+            await conn.executemany(UPSERT_CONVERSATION_QUERY, rows)
+            await conn.executemany(INDEX_CONVERSATION_TEXT_QUERY, text_rows)
+
+    async def get_conversations(self, session_id: str) -> list:
+        """Get all conversations for a given session."""
+        rows = await self._fetchall(
+            "SELECT * FROM conversations WHERE session_id = ? ORDER BY created_at, rowid",
+            (session_id,),
+        )
+        return [SQLiteDB._load_conversation_row(dict(row)) for row in rows]
+
+    async def get_message(self, session_id: str, msg_id: str) -> dict:
+        """Get a message of a session by msg_id."""
+        rows = await self._fetchall(
+            "SELECT * FROM conversations WHERE msg_id = ? AND session_id = ?",
+            (msg_id, session_id),
+        )
+        return SQLiteDB._load_conversation_row(dict(rows[0])) if rows else None
+
+    async def get_conversations_page(
+        self, session_id: str, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of messages for a given session, in chronological order."""
+        rows, older, newer = await self._get_page(
+            "conversations",
+            "created_at",
+            "session_id = ?",
+            (session_id,),
+            limit,
+            before,
+            after,
+        )
+        conversations = [SQLiteDB._load_conversation_row(row) for row in rows]
+        return {"conversation": conversations, "before": older, "after": newer}
+
+    async def search_conversations(self, query: str, limit: int = 20) -> list:
+        """Full-text search over the text of all conversation messages."""
+        fts_query = SQLiteDB._fts_query(query)
+        if not fts_query:
+            return []
+        rows = await self._fetchall(SEARCH_CONVERSATIONS_QUERY, (fts_query, limit))
+        return [dict(row) for row in rows]
+
+    async def get_context_messages(self, session_id: str) -> list:
+        """Get context messages for a session."""
+        rows = await self._fetchall(
+            "SELECT context_data FROM context_messages WHERE session_id = ?",
+            (session_id,),
+        )
+        return decode_column(rows[0][0]) if rows else {}
+
+    async def add_or_update_context_msg(
+        self,
+        session_id: str,
+        context_messages: list,
+        created_at: int = None,
+        updated_at: int = None,
+        metadata: dict = {},
+        **kwargs,
+    ) -> None:
+        """Update context messages for a session."""
+        created_at = created_at or int(time.time())
+        updated_at = updated_at or int(time.time())
+
+        async with self.transaction() as conn:
+            await conn.execute(
+                """
+            INSERT OR REPLACE INTO context_messages (context_data, session_id, created_at, updated_at, metadata)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+                (
+                    encode_column(context_messages, self.codec),
+                    session_id,
+                    created_at,
+                    updated_at,
+                    json.dumps(metadata),
+                ),
+            )
+
+    async def append_context_log(
+        self, session_id: str, messages: list, offset: int
+    ) -> None:
+        """Append reasoning context messages to the context log of a session."""
+        if not messages:
+            return
+        rows = SQLiteDB._context_log_rows(self.codec, session_id, messages, offset)
+        async with self.transaction() as conn:
+            await conn.executemany(INSERT_CONTEXT_LOG_QUERY, rows)
+
+    async def get_context_log(self, session_id: str, offset: int = 0) -> list:
+        """Get the reasoning context messages of a session from the context log."""
+        rows = await self._fetchall(
+            "SELECT message FROM context_log WHERE session_id = ? AND seq >= ? ORDER BY seq",
+            (session_id, offset),
+        )
+        return [decode_column(row[0]) for row in rows]
+
+    async def compact_context_log(self, session_id: str, messages: list) -> None:
+        """Replace the whole context log of a session with ``messages`` in a single transaction."""
+        rows = SQLiteDB._context_log_rows(self.codec, session_id, messages, 0)
+        async with self.transaction() as conn:
+            await conn.execute(
+                "DELETE FROM context_log WHERE session_id = ?", (session_id,)
+            )
+            await conn.executemany(INSERT_CONTEXT_LOG_QUERY, rows)
+
+    async def add_usage_records(self, records: list) -> None:
+        """Append LLM calls and agent runs to the usage ledger in a single transaction."""
+        if not records:
+            return
+        async with self.transaction() as conn:
+            await conn.executemany(INSERT_USAGE_QUERY, SQLiteDB._usage_rows(records))
+
+    async def get_usage(self, session_id: str) -> dict:
+        """Get the usage of a session, in total and per conversation, agent and model."""
+        usage = {"session_id": session_id}
+        rows = await self._fetchall(usage_query(), (session_id,))
+        usage["total"] = dict(rows[0])
+        for key, column in (
+            ("conversations", "conv_id"),
+            ("agents", "agent"),
+            ("models", "model"),
+        ):
+            rows = await self._fetchall(usage_query(column), (session_id,))
+            usage[key] = [dict(row) for row in rows]
+        return usage
+
+    async def delete_session(self, session_id: str) -> tuple:
+        """Delete a session and all its associated data."""
+        failed_components = []
+        async with self.transaction() as conn:
+            cursor = await conn.execute(
+                "DELETE FROM conversations WHERE session_id = ?", (session_id,)
+            )
+            if not cursor.rowcount > 0:
+                failed_components.append("conversation")
+            deleted = 0
+            for table in ("context_messages", "context_log"):
+                cursor = await conn.execute(
+                    f"DELETE FROM {table} WHERE session_id = ?", (session_id,)
+                )
+                deleted += cursor.rowcount
+            if not deleted > 0:
+                failed_components.append("context")
+            cursor = await conn.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            )
+            if not cursor.rowcount > 0:
+                failed_components.append("session")
+        success = len(failed_components) < 3
+        return success, failed_components
+
+    async def health_check(self) -> bool:
+        """Check if the SQLite database is healthy, creating or upgrading the schema if needed."""
+        try:
+            await self.connect()
+            await self._fetchall("SELECT 1")
+            return True
+        except Exception as e:
+            logger.exception(f"SQLite health check failed: {e}")
+            return False
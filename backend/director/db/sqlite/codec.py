@@ -0,0 +1,117 @@
+"""Compressed binary encoding for the large JSON columns of the SQLite database.
+
+Encoded values are stored as BLOBs whose first byte is the format version, so the reader picks the right decoder per row. Rows written before the codec existed are TEXT and are decoded as plain JSON, so old and new rows can live side by side.
+"""
+
+import os
+import json
+import zlib
+
+from typing import Union
+
+# Format version byte of each codec. Never reuse a number, rows encoded with it may still exist.
+FORMAT_ZLIB_JSON = 1
+FORMAT_ZSTD_MSGPACK = 2
+
+
+class ColumnCodec:
+    """Interface for column codecs. ``format_version`` is written in front of every encoded value."""
+
+    name: str = None
+    format_version: int = None
+
+    def encode(self, value) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes):
+        raise NotImplementedError
+
+
+class ZlibJSONCodec(ColumnCodec):
+    """zlib-compressed JSON, needs only the standard library."""
+
+    name = "zlib"
+    format_version = FORMAT_ZLIB_JSON
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def encode(self, value) -> bytes:
+        return zlib.compress(
+            json.dumps(value, separators=(",", ":")).encode(), self.level
+        )
+
+    def decode(self, data: bytes):
+        return json.loads(zlib.decompress(data))
+
+
+class ZstdMsgpackCodec(ColumnCodec):
+    """zstd-compressed msgpack, smaller and faster than :class:`ZlibJSONCodec`."""
+
+    name = "zstd"
+    format_version = FORMAT_ZSTD_MSGPACK
+
+    def __init__(self, level: int = 3):
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("Please install msgpack python library.")
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Please install zstandard python library.")
+
+        self._msgpack = msgpack
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, value) -> bytes:
+        return self._compressor.compress(self._msgpack.packb(value, use_bin_type=True))
+
+    def decode(self, data: bytes):
+        return self._msgpack.unpackb(self._decompressor.decompress(data), raw=False)
+
+
+codecs = {
+    ZlibJSONCodec.name: ZlibJSONCodec,
+    ZstdMsgpackCodec.name: ZstdMsgpackCodec,
+}
+
+_codecs_by_version = {codec.format_version: codec for codec in codecs.values()}
+_decoders = {}
+
+
+def get_codec(name: str = None) -> Union[ColumnCodec, None]:
+    """Return the codec called ``name``, defaulting to the ``SQLITE_COLUMN_CODEC`` environment variable or ``zlib``.
+
+    ``json`` returns ``None``, i.e. columns are written as plain JSON text like before.
+    """
+    name = name or os.getenv("SQLITE_COLUMN_CODEC", ZlibJSONCodec.name)
+    if name == "json":
+        return None
+    if name not in codecs:
+        raise ValueError(
+            f"Unknown column codec: {name}, Valid codecs are: {['json', *codecs]}"
+        )
+    return codecs[name]()
+
+
+def encode_column(value, codec: ColumnCodec = None) -> Union[str, bytes]:
+    """Encode a JSON value for storage, as plain JSON text when ``codec`` is ``None``."""
+    if codec is None:
+        return json.dumps(value)
+    return bytes([codec.format_version]) + codec.encode(value)
+
+
+def decode_column(data: Union[str, bytes, None]):
+    """Decode a value written by :func:`encode_column` with any codec, or a legacy plain JSON value."""
+    if data is None:
+        return None
+    if isinstance(data, str):
+        return json.loads(data)
+    version = data[0]
+    if version not in _decoders:
+        if version not in _codecs_by_version:
+            raise ValueError(f"Unknown column format version: {version}")
+        _decoders[version] = _codecs_by_version[version]()
+    return _decoders[version].decode(data[1:])
@@ -1,27 +1,101 @@
+import re
 import json
-import sqlite3
 import time
 import logging
 
 from typing import List
 
 from director.constants import DBType
-from director.db.base import BaseDB
-from director.db.sqlite.initialize import initialize_sqlite
+from director.db.base import (
+    BaseDB,
+    encode_cursor,
+    decode_cursor,
+    content_to_text,
+    usage_query,
+    USAGE_RECORD_FIELDS,
+)
+from director.db.sqlite.codec import get_codec, encode_column, decode_column
+from director.db.sqlite.migrations import run_migrations
+from director.db.sqlite.pool import get_pool
 
 logger = logging.getLogger(__name__)
 
+# Updates in place so the rowid, which keys the full-text index, and created_at stay stable.
+# Messages of sessions that were deleted meanwhile are skipped instead of failing the foreign key.
+UPSERT_CONVERSATION_QUERY = """
+INSERT INTO conversations (session_id, conv_id, msg_id, msg_type, agents, actions, content, status, created_at, updated_at, metadata)
+SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+WHERE EXISTS (SELECT 1 FROM sessions WHERE session_id = ?)
+ON CONFLICT (msg_id) DO UPDATE SET
+    session_id = excluded.session_id,
+    conv_id = excluded.conv_id,
+    msg_type = excluded.msg_type,
+    agents = excluded.agents,
+    actions = excluded.actions,
+    content = excluded.content,
+    status = excluded.status,
+    updated_at = excluded.updated_at,
+    metadata = excluded.metadata
+"""
+
+INDEX_CONVERSATION_TEXT_QUERY = """
+INSERT OR REPLACE INTO conversations_fts (rowid, text)
+SELECT rowid, ? FROM conversations WHERE msg_id = ?
+"""
+
+SEARCH_CONVERSATIONS_QUERY = """
+SELECT c.session_id, c.conv_id, c.msg_id, c.msg_type, c.created_at,
+    snippet(conversations_fts, 0, '<b>', '</b>', '...', 16) AS snippet,
+    bm25(conversations_fts) AS rank
+FROM conversations_fts
+JOIN conversations c ON c.rowid = conversations_fts.rowid
+WHERE conversations_fts MATCH ?
+ORDER BY rank
+LIMIT ?
+"""
+
+INSERT_CONTEXT_LOG_QUERY = """
+INSERT OR REPLACE INTO context_log (session_id, seq, message, created_at)
+VALUES (?, ?, ?, ?)
+"""
+
+# Usage of sessions that were deleted meanwhile is skipped instead of failing the foreign key
+INSERT_USAGE_QUERY = f"""
+INSERT INTO usage_ledger ({", ".join(USAGE_RECORD_FIELDS)})
+SELECT {", ".join("?" for _ in USAGE_RECORD_FIELDS)}
+WHERE EXISTS (SELECT 1 FROM sessions WHERE session_id = ?)
+"""
+
+# Sessions last updated before the cutoff and without newer messages
+SELECT_EXPIRED_SESSIONS_QUERY = """
+SELECT session_id FROM sessions AS s
+WHERE s.updated_at < ?
+AND NOT EXISTS (SELECT 1 FROM conversations AS c WHERE c.session_id = s.session_id AND c.updated_at >= ?)
+ORDER BY s.updated_at
+LIMIT ?
+"""
+
+# Oldest sessions beyond the newest ``keep``
+SELECT_EXCESS_SESSIONS_QUERY = """
+SELECT session_id FROM sessions
+ORDER BY updated_at DESC, rowid DESC
+LIMIT ? OFFSET ?
+"""
+
 
 class SQLiteDB(BaseDB):
-    def __init__(self, db_path: str = "director.db"):
+    def __init__(self, db_path: str = "director.db", codec: str = None, **kwargs):
         """
         :param db_path: Path to the SQLite database file.
+        :param codec: Codec for the content and context columns, see :func:`director.db.sqlite.codec.get_codec`.
+        :param kwargs: Passed to the connection pool when it is created, e.g. ``pool_size``.
         """
         self.db_type = DBType.SQLITE
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=True)
-        self.conn.row_factory = sqlite3.Row
-        self.cursor = self.conn.cursor()
+        self.codec = get_codec(codec)
+        self.pool = get_pool(self.db_path, **kwargs)
+        with self.pool.connection() as conn:
+            run_migrations(conn)
         logger.info("Connected to SQLite DB...")
 
     def create_session(
@@ -46,21 +120,21 @@ class SQLiteDB(BaseDB):
         created_at = created_at or int(time.time())
         updated_at = updated_at or int(time.time())
 
-        self.cursor.execute(
-            """
-        INSERT OR IGNORE INTO sessions (session_id, video_id, collection_id, created_at, updated_at, metadata)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-            (
-                session_id,
-                video_id,
-                collection_id,
-                created_at,
-                updated_at,
-                json.dumps(metadata),
-            ),
-        )
-        self.conn.commit()
+        with self.pool.connection() as conn:
+            conn.execute(
+                """
+            INSERT OR IGNORE INTO sessions (session_id, video_id, collection_id, created_at, updated_at, metadata)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    session_id,
+                    video_id,
+                    collection_id,
+                    created_at,
+                    updated_at,
+                    json.dumps(metadata),
+                ),
+            )
 
     def get_session(self, session_id: str) -> dict:
         """Get a session by session_id.
@@ -69,10 +143,10 @@ class SQLiteDB(BaseDB):
         :return: Session data as a dictionary.
         :rtype: dict
         """
-        self.cursor.execute(
-            "SELECT * FROM sessions WHERE session_id = ?", (session_id,)
-        )
-        row = self.cursor.fetchone()
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
         if row is not None:
             session = dict(row)  # Convert sqlite3.Row to dictionary
             session["metadata"] = json.loads(session["metadata"])
@@ -87,13 +161,148 @@ class SQLiteDB(BaseDB):
         :return: List of all sessions.
         :rtype: list
         """
-        self.cursor.execute("SELECT * FROM sessions ORDER BY updated_at DESC")
-        row = self.cursor.fetchall()
-        sessions = [dict(r) for r in row]
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT * FROM sessions ORDER BY updated_at DESC"
+            ).fetchall()
+        sessions = [dict(r) for r in rows]
         for s in sessions:
             s["metadata"] = json.loads(s["metadata"])
         return sessions
 
+    @staticmethod
+    def _page_query(
+        table: str,
+        sort_column: str,
+        where: str,
+        params: tuple,
+        limit: int,
+        before: str = None,
+        after: str = None,
+    ) -> tuple:
+        """Build the query for one keyset page of ``table`` ordered by ``(sort_column, rowid)``.
+
+        :return: The query, its params and the direction the rows are fetched in.
+        """
+        if after:
+            order, op = "ASC", ">"
+            cursor = after
+        else:
+            order, op = "DESC", "<"
+            cursor = before
+
+        query = f"SELECT rowid AS _rowid, * FROM {table} WHERE {where}"
+        if cursor:
+            query += f" AND ({sort_column}, rowid) {op} (?, ?)"
+            key = decode_cursor(cursor)
+            if not isinstance(key, list) or len(key) != 2:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            params = params + tuple(key)
+        query += f" ORDER BY {sort_column} {order}, rowid {order} LIMIT ?"
+        return query, params + (limit + 1,), order, bool(cursor)
+
+    @staticmethod
+    def _page_result(
+        rows: list, sort_column: str, limit: int, order: str, has_cursor: bool
+    ) -> tuple:
+        """Turn the rows fetched by a :meth:`_page_query` query into a page.
+
+        :return: Rows from oldest to newest, and the cursors to the older and newer pages.
+        """
+        has_more = len(rows) > limit
+        rows = [dict(row) for row in rows[:limit]]
+        if order == "DESC":
+            rows.reverse()
+        if not rows:
+            return rows, None, None
+
+        has_older = has_more if order == "DESC" else True
+        has_newer = has_more if order == "ASC" else has_cursor
+        older_cursor = (
+            encode_cursor(rows[0][sort_column], rows[0]["_rowid"]) if has_older else None
+        )
+        newer_cursor = (
+            encode_cursor(rows[-1][sort_column], rows[-1]["_rowid"])
+            if has_newer
+            else None
+        )
+        for row in rows:
+            del row["_rowid"]
+        return rows, older_cursor, newer_cursor
+
+    def _get_page(
+        self,
+        table: str,
+        sort_column: str,
+        where: str,
+        params: tuple,
+        limit: int,
+        before: str = None,
+        after: str = None,
+    ) -> tuple:
+        """Fetch one keyset page of ``table`` ordered by ``(sort_column, rowid)``.
+
+        :return: Rows from oldest to newest, and the cursors to the older and newer pages.
+        """
+        query, params, order, has_cursor = self._page_query(
+            table, sort_column, where, params, limit, before, after
+        )
+        with self.pool.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return self._page_result(rows, sort_column, limit, order, has_cursor)
+
+    def get_sessions_page(
+        self, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of sessions, most recently updated first.
+
+        :param int limit: Maximum number of sessions in the page.
+        :param str before: Cursor, return sessions updated before it (older).
+        :param str after: Cursor, return sessions updated after it (newer).
+        :return: Sessions in the page and the cursors to the older and newer pages.
+        :rtype: dict
+        """
+        sessions, older, newer = self._get_page(
+            "sessions", "updated_at", "1", (), limit, before, after
+        )
+        sessions.reverse()
+        for s in sessions:
+            s["metadata"] = json.loads(s["metadata"])
+        return {"sessions": sessions, "before": older, "after": newer}
+
+    @staticmethod
+    def _conversation_row(
+        codec,
+        session_id: str,
+        conv_id: str,
+        msg_id: str,
+        msg_type: str,
+        agents: List[str],
+        actions: List[str],
+        content: List[dict],
+        status: str = None,
+        created_at: int = None,
+        updated_at: int = None,
+        metadata: dict = {},
+        **kwargs,
+    ) -> tuple:
+        created_at = created_at or int(time.time())
+        updated_at = updated_at or int(time.time())
+        return (
+            session_id,
+            conv_id,
+            msg_id,
+            msg_type,
+            json.dumps(agents),
+            json.dumps(actions),
+            encode_column(content, codec),
+            status,
+            created_at,
+            updated_at,
+            json.dumps(metadata),
+            session_id,
+        )
+
     def add_or_update_msg_to_conv(
         self,
         session_id: str,
@@ -123,46 +332,121 @@ class SQLiteDB(BaseDB):
         :param int updated_at: Timestamp when the message was last updated.
         :param dict metadata: Additional metadata for the message.
         """
-        created_at = created_at or int(time.time())
-        updated_at = updated_at or int(time.time())
-
-        self.cursor.execute(
-            """
-        INSERT OR REPLACE INTO conversations (session_id, conv_id, msg_id, msg_type, agents, actions, content, status, created_at, updated_at, metadata)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                session_id,
-                conv_id,
-                msg_id,
-                msg_type,
-                json.dumps(agents),
-                json.dumps(actions),
-                json.dumps(content),
-                status,
-                created_at,
-                updated_at,
-                json.dumps(metadata),
-            ),
+        self.add_or_update_msgs_to_conv(
+            [
+                dict(
+                    session_id=session_id,
+                    conv_id=conv_id,
+                    msg_id=msg_id,
+                    msg_type=msg_type,
+                    agents=agents,
+                    actions=actions,
+                    content=content,
+                    status=status,
+                    created_at=created_at,
+                    updated_at=updated_at,
+                    metadata=metadata,
+                )
+            ]
         )
-        self.conn.commit()
+
+    def add_or_update_msgs_to_conv(self, messages: list) -> None:
+        """Add or update several conversation messages in a single transaction.
+
+        :param list messages: Keyword arguments of :meth:`add_or_update_msg_to_conv` for each message.
+        """
+        with self.pool.connection() as conn:
+            conn.executemany(
+                UPSERT_CONVERSATION_QUERY,
+                [self._conversation_row(self.codec, **message) for message in messages],
+            )
+            conn.executemany(
+                INDEX_CONVERSATION_TEXT_QUERY,
+                self._conversation_text_rows(messages),
+            )
+
+    @staticmethod
+    def _conversation_text_rows(messages: list) -> list:
+        return [
+            (content_to_text(message.get("content")), message["msg_id"])
+            for message in messages
+        ]
+
+    @staticmethod
+    def _load_conversation_row(conv_dict: dict) -> dict:
+        conv_dict["agents"] = json.loads(conv_dict["agents"])
+        conv_dict["actions"] = json.loads(conv_dict["actions"])
+        conv_dict["content"] = decode_column(conv_dict["content"])
+        conv_dict["metadata"] = json.loads(conv_dict["metadata"])
+        return conv_dict
 
     def get_conversations(self, session_id: str) -> list:
-        self.cursor.execute(
-            "SELECT * FROM conversations WHERE session_id = ?", (session_id,)
-        )
-        rows = self.cursor.fetchall()
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT * FROM conversations WHERE session_id = ? ORDER BY created_at, rowid",
+                (session_id,),
+            ).fetchall()
         conversations = []
         for row in rows:
             if row is not None:
-                conv_dict = dict(row)
-                conv_dict["agents"] = json.loads(conv_dict["agents"])
-                conv_dict["actions"] = json.loads(conv_dict["actions"])
-                conv_dict["content"] = json.loads(conv_dict["content"])
-                conv_dict["metadata"] = json.loads(conv_dict["metadata"])
-                conversations.append(conv_dict)
+                conversations.append(self._load_conversation_row(dict(row)))
         return conversations
 
+    def get_message(self, session_id: str, msg_id: str) -> dict:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM conversations WHERE msg_id = ? AND session_id = ?",
+                (msg_id, session_id),
+            ).fetchone()
+        return self._load_conversation_row(dict(row)) if row is not None else None
+
+    def get_conversations_page(
+        self, session_id: str, limit: int = 50, before: str = None, after: str = None
+    ) -> dict:
+        """Get a page of messages for a given session, in chronological order. Without a cursor the latest page is returned.
+
+        :param str session_id: Unique session ID.
+        :param int limit: Maximum number of messages in the page.
+        :param str before: Cursor, return messages created before it (older).
+        :param str after: Cursor, return messages created after it (newer).
+        :return: Messages in the page and the cursors to the older and newer pages.
+        :rtype: dict
+        """
+        rows, older, newer = self._get_page(
+            "conversations",
+            "created_at",
+            "session_id = ?",
+            (session_id,),
+            limit,
+            before,
+            after,
+        )
+        conversations = [self._load_conversation_row(row) for row in rows]
+        return {"conversation": conversations, "before": older, "after": newer}
+
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Turn free text into an FTS5 query that matches all words, the last one as a prefix."""
+        words = re.findall(r"\w+", query)
+        if not words:
+            return ""
+        return " ".join(f'"{word}"' for word in words) + "*"
+
+    def search_conversations(self, query: str, limit: int = 20) -> list:
+        """Full-text search over the text of all conversation messages.
+
+        :param str query: Words to search for. All words must match, the last one as a prefix.
+        :param int limit: Maximum number of hits.
+        :return: Hits ranked by relevance, with a highlighted snippet of the matching text.
+        :rtype: list
+        """
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return []
+        with self.pool.connection() as conn:
+            rows = conn.execute(SEARCH_CONVERSATIONS_QUERY, (fts_query, limit)).fetchall()
+        return [dict(row) for row in rows]
+
     def get_context_messages(self, session_id: str) -> list:
         """Get context messages for a session.
 
@@ -170,12 +454,12 @@ class SQLiteDB(BaseDB):
         :return: List of context messages.
         :rtype: list
         """
-        self.cursor.execute(
-            "SELECT context_data FROM context_messages WHERE session_id = ?",
-            (session_id,),
-        )
-        result = self.cursor.fetchone()
-        return json.loads(result[0]) if result else {}
+        with self.pool.connection() as conn:
+            result = conn.execute(
+                "SELECT context_data FROM context_messages WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        return decode_column(result[0]) if result else {}
 
     def add_or_update_context_msg(
         self,
@@ -197,20 +481,112 @@ class SQLiteDB(BaseDB):
         created_at = created_at or int(time.time())
         updated_at = updated_at or int(time.time())
 
-        self.cursor.execute(
-            """
-        INSERT OR REPLACE INTO context_messages (context_data, session_id, created_at, updated_at, metadata)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-            (
-                json.dumps(context_messages),
-                session_id,
-                created_at,
-                updated_at,
-                json.dumps(metadata),
-            ),
+        with self.pool.connection() as conn:
+            conn.execute(
+                """
+            INSERT OR REPLACE INTO context_messages (context_data, session_id, created_at, updated_at, metadata)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+                (
+                    encode_column(context_messages, self.codec),
+                    session_id,
+                    created_at,
+                    updated_at,
+                    json.dumps(metadata),
+                ),
+            )
+
+    @staticmethod
+    def _context_log_rows(codec, session_id: str, messages: list, offset: int) -> list:
+        created_at = int(time.time())
+        return [
+            (session_id, offset + i, encode_column(message, codec), created_at)
+            for i, message in enumerate(messages)
+        ]
+
+    def _insert_context_log(
+        self, conn, session_id: str, messages: list, offset: int
+    ) -> None:
+        conn.executemany(
+            INSERT_CONTEXT_LOG_QUERY,
+            self._context_log_rows(self.codec, session_id, messages, offset),
         )
-        self.conn.commit()
+
+    def append_context_log(self, session_id: str, messages: list, offset: int) -> None:
+        """Append reasoning context messages to the context log of a session.
+
+        :param str session_id: Unique session ID.
+        :param list messages: Context messages to append.
+        :param int offset: Position of the first message in the log, i.e. the number of messages already in it.
+        """
+        if not messages:
+            return
+        with self.pool.connection() as conn:
+            self._insert_context_log(conn, session_id, messages, offset)
+
+    def get_context_log(self, session_id: str, offset: int = 0) -> list:
+        """Get the reasoning context messages of a session from the context log.
+
+        :param str session_id: Unique session ID.
+        :param int offset: Return only the messages at or after this position.
+        :return: List of context messages in order.
+        :rtype: list
+        """
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT message FROM context_log WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                (session_id, offset),
+            ).fetchall()
+        return [decode_column(row[0]) for row in rows]
+
+    def compact_context_log(self, session_id: str, messages: list) -> None:
+        """Replace the whole context log of a session with ``messages`` in a single transaction.
+
+        :param str session_id: Unique session ID.
+        :param list messages: Context messages the log should contain.
+        """
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM context_log WHERE session_id = ?", (session_id,))
+            self._insert_context_log(conn, session_id, messages, 0)
+
+    @staticmethod
+    def _usage_rows(records: list) -> list:
+        return [
+            tuple(record.get(field) for field in USAGE_RECORD_FIELDS)
+            + (record["session_id"],)
+            for record in records
+        ]
+
+    def add_usage_records(self, records: list) -> None:
+        """Append LLM calls and agent runs to the usage ledger in a single transaction.
+
+        :param list records: Dicts with the fields of :data:`director.db.base.USAGE_RECORD_FIELDS`.
+        """
+        if not records:
+            return
+        with self.pool.connection() as conn:
+            conn.executemany(INSERT_USAGE_QUERY, self._usage_rows(records))
+
+    def get_usage(self, session_id: str) -> dict:
+        """Get the usage of a session, in total and per conversation, agent and model.
+
+        :param str session_id: Unique session ID.
+        :return: Usage sums, see :meth:`director.db.base.BaseDB.get_usage`.
+        :rtype: dict
+        """
+        usage = {"session_id": session_id}
+        with self.pool.connection() as conn:
+            usage["total"] = dict(
+                conn.execute(usage_query(), (session_id,)).fetchone()
+            )
+            for key, column in (
+                ("conversations", "conv_id"),
+                ("agents", "agent"),
+                ("models", "model"),
+            ):
+                rows = conn.execute(usage_query(column), (session_id,)).fetchall()
+                usage[key] = [dict(row) for row in rows]
+        return usage
 
     def delete_conversation(self, session_id: str) -> bool:
         """Delete all conversations for a given session.
@@ -218,11 +594,11 @@ class SQLiteDB(BaseDB):
         :param str session_id: Unique session ID.
         :return: True if conversations were deleted, False otherwise.
         """
-        self.cursor.execute(
-            "DELETE FROM conversations WHERE session_id = ?", (session_id,)
-        )
-        self.conn.commit()
-        return self.cursor.rowcount > 0
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM conversations WHERE session_id = ?", (session_id,)
+            )
+        return cursor.rowcount > 0
 
     def delete_context(self, session_id: str) -> bool:
         """Delete context messages for a given session.
@@ -230,49 +606,140 @@ class SQLiteDB(BaseDB):
         :param str session_id: Unique session ID.
         :return: True if context messages were deleted, False otherwise.
         """
-        self.cursor.execute(
-            "DELETE FROM context_messages WHERE session_id = ?", (session_id,)
-        )
-        self.conn.commit()
-        return self.cursor.rowcount > 0
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM context_messages WHERE session_id = ?", (session_id,)
+            )
+            deleted = cursor.rowcount
+            cursor = conn.execute(
+                "DELETE FROM context_log WHERE session_id = ?", (session_id,)
+            )
+            deleted += cursor.rowcount
+        return deleted > 0
 
     def delete_session(self, session_id: str) -> bool:
-        """Delete a session and all its associated data.
+        """Delete a session and all its associated data in a single transaction.
 
         :param str session_id: Unique session ID.
         :return: True if the session was deleted, False otherwise.
         """
         failed_components = []
-        if not self.delete_conversation(session_id):
-            failed_components.append("conversation")
-        if not self.delete_context(session_id):
-            failed_components.append("context")
-        self.cursor.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
-        self.conn.commit()
-        if not self.cursor.rowcount > 0:
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM conversations WHERE session_id = ?", (session_id,)
+            )
+            if not cursor.rowcount > 0:
+                failed_components.append("conversation")
+            deleted = 0
+            for table in ("context_messages", "context_log"):
+                cursor = conn.execute(
+                    f"DELETE FROM {table} WHERE session_id = ?", (session_id,)
+                )
+                deleted += cursor.rowcount
+            if not deleted > 0:
+                failed_components.append("context")
+            cursor = conn.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            )
+        if not cursor.rowcount > 0:
             failed_components.append("session")
         success = len(failed_components) < 3
         return success, failed_components
 
+    def purge_sessions(
+        self,
+        max_age: int = None,
+        max_sessions: int = None,
+        batch_size: int = 100,
+        pause: float = 0.0,
+    ) -> int:
+        """Delete expired sessions and all their data, in batches of one transaction each.
+
+        :param int max_age: Delete sessions without activity for this many seconds.
+        :param int max_sessions: Keep only this many of the most recently updated sessions.
+        :param int batch_size: Sessions deleted per transaction.
+        :param float pause: Seconds to sleep between batches, to leave room for other writers.
+        :return: Number of sessions deleted.
+        :rtype: int
+        """
+        cutoff = int(time.time()) - max_age if max_age else None
+        purged = 0
+        while True:
+            with self.pool.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                session_ids = set()
+                if cutoff is not None:
+                    rows = conn.execute(
+                        SELECT_EXPIRED_SESSIONS_QUERY, (cutoff, cutoff, batch_size)
+                    ).fetchall()
+                    session_ids.update(row[0] for row in rows)
+                if max_sessions is not None and len(session_ids) < batch_size:
+                    rows = conn.execute(
+                        SELECT_EXCESS_SESSIONS_QUERY,
+                        (batch_size - len(session_ids), max_sessions),
+                    ).fetchall()
+                    session_ids.update(row[0] for row in rows)
+                if not session_ids:
+                    break
+                conn.executemany(
+                    "DELETE FROM sessions WHERE session_id = ?",
+                    [(session_id,) for session_id in session_ids],
+                )
+            purged += len(session_ids)
+            if pause:
+                time.sleep(pause)
+        return purged
+
+    def vacuum(
+        self, max_pages: int = None, slice_pages: int = 256, pause: float = 0.0
+    ) -> int:
+        """Return free pages to the file system with ``PRAGMA incremental_vacuum``, ``slice_pages`` pages per transaction so writers are never blocked for long.
+
+        :param int max_pages: Stop after freeing this many pages, all free pages by default.
+        :param int slice_pages: Pages freed per transaction.
+        :param float pause: Seconds to sleep between slices.
+        :return: Number of pages freed.
+        :rtype: int
+        """
+        with self.pool.connection() as conn:
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != 2:
+            logger.warning(
+                f"Incremental vacuum is not enabled for {self.db_path}, run the retention command with --enable-incremental-vacuum once"
+            )
+            return 0
+
+        freed = 0
+        while max_pages is None or freed < max_pages:
+            pages = slice_pages if max_pages is None else min(slice_pages, max_pages - freed)
+            with self.pool.connection() as conn:
+                pages = min(pages, conn.execute("PRAGMA freelist_count").fetchone()[0])
+                if not pages:
+                    break
+                # Frees one page per step, so the rows must be consumed
+                conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+            freed += pages
+            if pause:
+                time.sleep(pause)
+        return freed
+
+    def enable_incremental_vacuum(self) -> None:
+        """Switch a database created without incremental vacuum to ``auto_vacuum = INCREMENTAL``.
+
+        This runs a full ``VACUUM`` that rewrites the whole file and blocks writers until it is done, so it is only needed once, while the server is idle.
+        """
+        with self.pool.connection() as conn:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+
     def health_check(self) -> bool:
-        """Check if the SQLite database is healthy and the necessary tables exist. If not, create them."""
+        """Check if the SQLite database is healthy and upgrade it to the latest schema version, creating the tables if needed."""
         try:
-            query = """
-                SELECT COUNT(name)
-                FROM sqlite_master
-                WHERE type='table'
-                AND name IN ('sessions', 'conversations', 'context_messages');
-            """
-            self.cursor.execute(query)
-            table_count = self.cursor.fetchone()[0]
-            if table_count < 3:
-                logger.info("Tables not found. Initializing SQLite DB...")
-                initialize_sqlite(self.db_path)
+            with self.pool.connection() as conn:
+                version = run_migrations(conn)
+            logger.info(f"SQLite DB schema is at version {version}")
             return True
 
         except Exception as e:
             logger.exception(f"SQLite health check failed: {e}")
             return False
-
-    def __del__(self):
-        self.conn.close()
@@ -26,7 +26,7 @@ CREATE TABLE IF NOT EXISTS conversations (
     created_at INTEGER,
     updated_at INTEGER,
     metadata JSON,
-    FOREIGN KEY (session_id) REFERENCES sessions(session_id)
+    FOREIGN KEY (session_id) REFERENCES sessions(session_id) ON DELETE CASCADE
 )
 """
 
@@ -38,22 +38,67 @@ CREATE TABLE IF NOT EXISTS context_messages (
     created_at INTEGER,
     updated_at INTEGER,
     metadata JSON,
-    FOREIGN KEY (session_id) REFERENCES sessions(session_id)
+    FOREIGN KEY (session_id) REFERENCES sessions(session_id) ON DELETE CASCADE
 )
 """
 
+# SQL to create the context_log table, an append-only log of reasoning context messages
+CREATE_CONTEXT_LOG_TABLE = """
+CREATE TABLE IF NOT EXISTS context_log (
+    session_id TEXT,
+    seq INTEGER,
+    message JSON,
+    created_at INTEGER,
+    PRIMARY KEY (session_id, seq),
+    FOREIGN KEY (session_id) REFERENCES sessions(session_id) ON DELETE CASCADE
+)
+"""
 
-def initialize_sqlite(db_name="director.db"):
-    """Initialize the SQLite database by creating the necessary tables."""
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+# SQL to create the usage_ledger table, one row per LLM call or agent run. Migration 7 adds cache_read_tokens and cache_write_tokens
+CREATE_USAGE_LEDGER_TABLE = """
+CREATE TABLE IF NOT EXISTS usage_ledger (
+    session_id TEXT,
+    conv_id TEXT,
+    kind TEXT,
+    agent TEXT,
+    model TEXT,
+    send_tokens INTEGER,
+    recv_tokens INTEGER,
+    total_tokens INTEGER,
+    cost REAL,
+    latency_ms INTEGER,
+    status TEXT,
+    created_at INTEGER,
+    FOREIGN KEY (session_id) REFERENCES sessions(session_id) ON DELETE CASCADE
+)
+"""
+
+# SQL to create the conversations_fts table, a full-text index of conversation text keyed by conversations.rowid
+CREATE_CONVERSATIONS_FTS_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+    text,
+    tokenize = 'porter unicode61'
+)
+"""
+
+# Trigger keeping the full-text index in sync when conversations are deleted, including cascaded deletes
+CREATE_CONVERSATIONS_FTS_DELETE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations
+BEGIN
+    DELETE FROM conversations_fts WHERE rowid = old.rowid;
+END
+"""
 
-    cursor.execute(CREATE_SESSIONS_TABLE)
-    cursor.execute(CREATE_CONVERSATIONS_TABLE)
-    cursor.execute(CREATE_CONTEXT_MESSAGES_TABLE)
 
-    conn.commit()
-    conn.close()
+def initialize_sqlite(db_name="director.db"):
+    """Initialize the SQLite database by creating the necessary tables, or upgrade an existing database to the latest schema version."""
+    from director.db.sqlite.migrations import run_migrations
+
+    conn = sqlite3.connect(db_name)
+    try:
+        run_migrations(conn)
+    finally:
+        conn.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+"""Versioned schema migrations for the SQLite database.
+
+The schema version is stored in ``PRAGMA user_version``. Each migration runs in its own ``BEGIN IMMEDIATE`` transaction together with the version bump, so concurrent servers upgrading the same file apply every migration exactly once and readers keep working while it runs.
+"""
+
+import sqlite3
+import logging
+
+from typing import Callable, List, NamedTuple, Union
+
+from director.db.base import content_to_text
+from director.db.sqlite.codec import decode_column
+from director.db.sqlite.initialize import (
+    CREATE_SESSIONS_TABLE,
+    CREATE_CONVERSATIONS_TABLE,
+    CREATE_CONTEXT_MESSAGES_TABLE,
+    CREATE_CONTEXT_LOG_TABLE,
+    CREATE_CONVERSATIONS_FTS_TABLE,
+    CREATE_CONVERSATIONS_FTS_DELETE_TRIGGER,
+    CREATE_USAGE_LEDGER_TABLE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    """A single schema migration.
+
+    :param int version: Schema version after the migration is applied.
+    :param str description: Short description for the logs.
+    :param operations: SQL statements to execute, or a callable that receives the connection.
+    """
+
+    version: int
+    description: str
+    operations: Union[List[str], Callable[[sqlite3.Connection], None]]
+
+
+CONVERSATIONS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_conversations_session_created ON conversations (session_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_conv_id ON conversations (conv_id)",
+]
+
+
+def _rebuild_table(conn: sqlite3.Connection, table: str, create_table: str):
+    """Recreate ``table`` from ``create_table``, keeping the rowids and dropping rows of sessions that no longer exist."""
+    columns = ", ".join(
+        row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()
+    )
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    conn.execute(create_table)
+    conn.execute(
+        f"INSERT INTO {table} (rowid, {columns}) SELECT rowid, {columns} FROM {table}_old "
+        "WHERE session_id IN (SELECT session_id FROM sessions)"
+    )
+    conn.execute(f"DROP TABLE {table}_old")
+
+
+def add_cascading_foreign_keys(conn: sqlite3.Connection):
+    """Rebuild the child tables of sessions with ``ON DELETE CASCADE`` foreign keys, so deleting a session deletes all its data."""
+    _rebuild_table(conn, "conversations", CREATE_CONVERSATIONS_TABLE)
+    _rebuild_table(conn, "context_messages", CREATE_CONTEXT_MESSAGES_TABLE)
+    _rebuild_table(conn, "context_log", CREATE_CONTEXT_LOG_TABLE)
+    for statement in CONVERSATIONS_INDEXES:
+        conn.execute(statement)
+    conn.execute(
+        "DELETE FROM conversations_fts WHERE rowid NOT IN (SELECT rowid FROM conversations)"
+    )
+    conn.execute(CREATE_CONVERSATIONS_FTS_DELETE_TRIGGER)
+
+
+def create_conversations_fts(conn: sqlite3.Connection, batch_size: int = 1000):
+    """Create the full-text index of conversations and index the existing messages in batches."""
+    conn.execute(CREATE_CONVERSATIONS_FTS_TABLE)
+    last_rowid = 0
+    while True:
+        rows = conn.execute(
+            "SELECT rowid, content FROM conversations WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (last_rowid, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            "INSERT OR REPLACE INTO conversations_fts (rowid, text) VALUES (?, ?)",
+            [(rowid, content_to_text(decode_column(content))) for rowid, content in rows],
+        )
+        last_rowid = rows[-1][0]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "create sessions, conversations and context_messages tables",
+        [
+            CREATE_SESSIONS_TABLE,
+            CREATE_CONVERSATIONS_TABLE,
+            CREATE_CONTEXT_MESSAGES_TABLE,
+        ],
+    ),
+    Migration(
+        2,
+        "add conversation and session lookup indexes",
+        [
+            *CONVERSATIONS_INDEXES,
+            "CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at)",
+        ],
+    ),
+    Migration(
+        3,
+        "create append-only context_log table",
+        [CREATE_CONTEXT_LOG_TABLE],
+    ),
+    Migration(
+        4,
+        "create conversations_fts full-text index",
+        create_conversations_fts,
+    ),
+    Migration(
+        5,
+        "add ON DELETE CASCADE foreign keys to sessions",
+        add_cascading_foreign_keys,
+    ),
+    Migration(
+        6,
+        "create usage_ledger table",
+        [
+            CREATE_USAGE_LEDGER_TABLE,
+            "CREATE INDEX IF NOT EXISTS idx_usage_ledger_session ON usage_ledger (session_id, conv_id)",
+        ],
+    ),
+    Migration(
+        7,
+        "add prompt cache token columns to usage_ledger",
+        [
+            "ALTER TABLE usage_ledger ADD COLUMN cache_read_tokens INTEGER DEFAULT 0",
+            "ALTER TABLE usage_ledger ADD COLUMN cache_write_tokens INTEGER DEFAULT 0",
+        ],
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the schema version stored in the database file."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn: sqlite3.Connection, target: int = LATEST_VERSION) -> int:
+    """Apply all pending migrations up to ``target``.
+
+    :param conn: Connection to the database to upgrade.
+    :param int target: Schema version to upgrade to, defaults to the latest.
+    :return: The schema version after upgrading.
+    :rtype: int
+    """
+    if conn.in_transaction:
+        conn.commit()
+
+    if get_schema_version(conn) == 0:
+        # Only takes effect before the first table is created, existing files need a VACUUM
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    for migration in MIGRATIONS:
+        if migration.version > target:
+            break
+        if get_schema_version(conn) >= migration.version:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the lock
+            if get_schema_version(conn) >= migration.version:
+                conn.rollback()
+                continue
+
+            logger.info(
+                f"Applying SQLite migration {migration.version}: {migration.description}"
+            )
+            if callable(migration.operations):
+                migration.operations(conn)
+            else:
+                for statement in migration.operations:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return get_schema_version(conn)
@@ -0,0 +1,156 @@
+import os
+import queue
+import sqlite3
+import logging
+import threading
+
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+# Pragmas applied to every pooled connection. WAL lets readers run concurrently
+# with a single writer, and synchronous=NORMAL is durable in WAL mode except for
+# the last transactions on power loss. foreign_keys enables ON DELETE CASCADE.
+# auto_vacuum must come first, it only applies to files that are still empty.
+DEFAULT_PRAGMAS = {
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # negative value is in KiB, i.e. ~64MB
+    "mmap_size": 268435456,  # 256MB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # milliseconds
+    "foreign_keys": "ON",
+}
+
+
+class SQLiteConnectionPool:
+    """A thread-safe pool of SQLite connections for a single database file.
+
+    Connections are opened lazily up to ``pool_size`` and handed out with :meth:`connection`. Every connection is configured with :data:`DEFAULT_PRAGMAS` (WAL mode) when it is opened.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "director.db",
+        pool_size: int = 5,
+        timeout: float = 30,
+        pragmas: dict = None,
+    ):
+        """
+        :param str db_path: Path to the SQLite database file.
+        :param int pool_size: Maximum number of open connections.
+        :param float timeout: Seconds to wait for a free connection before failing.
+        :param dict pragmas: Pragmas to override on top of :data:`DEFAULT_PRAGMAS`.
+        """
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, timeout=self.timeout, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        logger.info(f"Opened SQLite connection to {self.db_path}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.db_path} is closed.")
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.pool_size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+
+        try:
+            return self._pool.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"Timed out waiting for a SQLite connection to {self.db_path}"
+            )
+
+    def _release(self, conn: sqlite3.Connection):
+        if self._closed:
+            conn.close()
+            return
+        self._pool.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the ``with`` block.
+
+        The open transaction is committed when the block exits normally and rolled back if it raises.
+
+        **Example**::
+
+            with pool.connection() as conn:
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Close all idle connections. Connections checked out at this time are closed on release."""
+        self._closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = "director.db", **kwargs) -> SQLiteConnectionPool:
+    """Return the process-wide connection pool for ``db_path``, creating it on first use.
+
+    :param str db_path: Path to the SQLite database file.
+    :param kwargs: Passed to :class:`SQLiteConnectionPool` when the pool is created.
+    """
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            kwargs.setdefault(
+                "pool_size", int(os.getenv("SQLITE_POOL_SIZE", 5))
+            )
+            pool = SQLiteConnectionPool(db_path, **kwargs)
+            _pools[key] = pool
+        return pool
+
+
+def close_pools():
+    """Close every process-wide connection pool."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,143 @@
+"""Re-encode the content and context columns of an existing SQLite database with a column codec.
+
+It runs in small batches, each in its own short transaction, so it can run in the background next to a live server. A row is only updated if it still holds the value that was read, so a write of the server between the read and the update is kept. Rows already in the target format are skipped, so an interrupted run can simply be restarted.
+"""
+
+import os
+import time
+import logging
+
+from director.db.sqlite.codec import get_codec, encode_column, decode_column
+from director.db.sqlite.pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+# (table, column) pairs holding large JSON values
+ENCODED_COLUMNS = [
+    ("conversations", "content"),
+    ("context_messages", "context_data"),
+    ("context_log", "message"),
+]
+
+
+def _size(value) -> int:
+    if value is None:
+        return 0
+    return len(value.encode() if isinstance(value, str) else value)
+
+
+def _is_encoded_with(value, codec) -> bool:
+    if codec is None:
+        return isinstance(value, str)
+    return isinstance(value, bytes) and value[:1] == bytes([codec.format_version])
+
+
+def reencode_column(
+    pool, table: str, column: str, codec, batch_size: int = 500, pause: float = 0.0
+) -> dict:
+    """Re-encode one column in batches of ``batch_size`` rows, sleeping ``pause`` seconds between batches.
+
+    :return: Number of rows scanned, re-encoded and left alone because they changed meanwhile, and the column size in bytes before and after.
+    """
+    stats = {
+        "rows": 0,
+        "reencoded": 0,
+        "changed": 0,
+        "bytes_before": 0,
+        "bytes_after": 0,
+    }
+    last_rowid = 0
+    while True:
+        with pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT rowid, {column} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            updates = []
+            for rowid, value in rows:
+                stats["rows"] += 1
+                stats["bytes_before"] += _size(value)
+                if value is None or _is_encoded_with(value, codec):
+                    stats["bytes_after"] += _size(value)
+                    continue
+                encoded = encode_column(decode_column(value), codec)
+                stats["bytes_after"] += _size(encoded)
+                updates.append((encoded, rowid, value))
+            # Compare with the value read, the server may have written the row meanwhile
+            cursor = conn.executemany(
+                f"UPDATE {table} SET {column} = ? WHERE rowid = ? AND {column} IS ?",
+                updates,
+            )
+            reencoded = max(cursor.rowcount, 0) if updates else 0
+            stats["reencoded"] += reencoded
+            stats["changed"] += len(updates) - reencoded
+        last_rowid = rows[-1][0]
+        if pause:
+            time.sleep(pause)
+    return stats
+
+
+def reencode_database(
+    db_path: str = "director.db",
+    codec: str = None,
+    batch_size: int = 500,
+    pause: float = 0.0,
+) -> dict:
+    """Re-encode all content and context columns of the database with ``codec``.
+
+    The space freed inside the file is reused by new rows. Run ``VACUUM`` to shrink the file itself.
+
+    :param str db_path: Path to the SQLite database file.
+    :param str codec: Codec name, defaults to ``SQLITE_COLUMN_CODEC``. ``json`` converts back to plain JSON.
+    :param int batch_size: Rows per transaction.
+    :param float pause: Seconds to sleep between batches, to leave room for the server.
+    :return: Stats of each column, keyed by ``table.column``.
+    """
+    target = get_codec(codec)
+    pool = get_pool(db_path)
+    report = {}
+    for table, column in ENCODED_COLUMNS:
+        stats = reencode_column(pool, table, column, target, batch_size, pause)
+        report[f"{table}.{column}"] = stats
+        saved = stats["bytes_before"] - stats["bytes_after"]
+        logger.info(
+            f"Re-encoded {stats['reencoded']}/{stats['rows']} rows of {table}.{column}: "
+            f"{stats['bytes_before']} -> {stats['bytes_after']} bytes ({saved} saved)"
+        )
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db-path", default="director.db")
+    parser.add_argument("--codec", default=None, help="json, zlib or zstd")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.05)
+    parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="Return the freed pages to the file system afterwards, needs incremental vacuum",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    file_before = os.path.getsize(args.db_path)
+    report = reencode_database(args.db_path, args.codec, args.batch_size, args.pause)
+    if args.vacuum:
+        from director.db.sqlite.db import SQLiteDB
+
+        SQLiteDB(args.db_path).vacuum(pause=args.pause)
+    before = sum(stats["bytes_before"] for stats in report.values())
+    after = sum(stats["bytes_after"] for stats in report.values())
+    reduction = (1 - after / before) * 100 if before else 0.0
+    for name, stats in report.items():
+        print(
+            f"{name}: {stats['reencoded']}/{stats['rows']} rows re-encoded, "
+            f"{stats['bytes_before']} -> {stats['bytes_after']} bytes"
+        )
+    print(f"Total: {before} -> {after} bytes ({reduction:.1f}% smaller)")
+    print(f"File: {file_before} -> {os.path.getsize(args.db_path)} bytes")
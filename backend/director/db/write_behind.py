@@ -0,0 +1,193 @@
+import os
+import time
+import atexit
+import logging
+import threading
+import weakref
+
+from director.db.base import BaseDB
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindWriter:
+    """Buffers conversation message upserts in memory and writes them to the database in batches.
+
+    Repeated upserts of the same ``msg_id`` are coalesced so only the latest state is written. Pending messages are flushed in one transaction every ``flush_interval`` seconds, or immediately when a write is marked durable. When a batch fails its messages are written one by one, so a message that can't be written doesn't hold back the others. A failed message is retried with a delay that doubles after every failed write up to ``max_retry_delay``, and dropped after ``max_attempts`` failed writes, about four minutes with the defaults. A durable flush retries all failed messages at once and raises if one still fails.
+    """
+
+    def __init__(
+        self,
+        db: BaseDB,
+        flush_interval: float = 1.0,
+        max_attempts: int = 10,
+        max_retry_delay: float = 60.0,
+    ):
+        """
+        :param BaseDB db: Database to write the messages to.
+        :param float flush_interval: Seconds between background flushes, and the delay before the first retry.
+        :param int max_attempts: Failed writes of a message before it is dropped.
+        :param float max_retry_delay: Maximum seconds between retries of a message.
+        """
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_retry_delay = max_retry_delay
+        self._pending = {}
+        # Messages whose write failed, by msg_id: (message, failed writes, monotonic time of the next retry)
+        self._retrying = {}
+        self._pending_lock = threading.Lock()
+        # Held for the whole flush so an older snapshot is never written after a newer one
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        self.stats = {
+            "upserts": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "written": 0,
+            "failed": 0,
+            "dropped": 0,
+        }
+
+    def upsert_msg(self, durable: bool = False, **message):
+        """Queue an upsert of a conversation message.
+
+        :param bool durable: Write the message and everything pending before returning, use it for terminal states.
+        :param message: Message fields as accepted by :meth:`BaseDB.add_or_update_msg_to_conv`.
+        :raises Exception: If the message is durable and could not be written. It stays queued for a retry.
+        """
+        if self._closed:
+            self.db.add_or_update_msg_to_conv(**message)
+            return
+
+        with self._pending_lock:
+            self.stats["upserts"] += 1
+            if message["msg_id"] in self._pending:
+                self.stats["coalesced"] += 1
+            self._pending[message["msg_id"]] = message
+
+        if durable:
+            errors = self._flush(retry=True)
+            if message["msg_id"] in errors:
+                raise errors[message["msg_id"]]
+        else:
+            self._ensure_thread()
+
+    def flush(self, retry: bool = True):
+        """Write all pending messages in a single transaction, or one by one if the transaction fails.
+
+        :param bool retry: Also write the failed messages whose retry delay hasn't passed.
+        :raises Exception: The error of the first message that could not be written. Failed messages stay queued for a retry.
+        """
+        errors = self._flush(retry)
+        if errors:
+            raise next(iter(errors.values()))
+
+    def _flush(self, retry: bool) -> dict:
+        """Flush and return the errors of the messages that could not be written, by msg_id."""
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._pending_lock:
+                messages = self._pending
+                self._pending = {}
+                for msg_id, (message, _, retry_at) in self._retrying.items():
+                    # A newer state of the message supersedes the failed one
+                    if msg_id not in messages and (retry or retry_at <= now):
+                        messages[msg_id] = message
+            if not messages:
+                return {}
+            errors = {}
+            try:
+                self.db.add_or_update_msgs_to_conv(list(messages.values()))
+            except Exception as e:
+                logger.warning(
+                    f"Error in writing {len(messages)} messages, writing them one by one: {e}"
+                )
+                for msg_id, message in messages.items():
+                    try:
+                        self.db.add_or_update_msg_to_conv(**message)
+                    except Exception as error:
+                        errors[msg_id] = error
+            with self._pending_lock:
+                for msg_id, message in messages.items():
+                    if msg_id in errors:
+                        self._retry_later(message, errors[msg_id])
+                    else:
+                        self._retrying.pop(msg_id, None)
+            self.stats["flushes"] += 1
+            self.stats["written"] += len(messages) - len(errors)
+            self.stats["failed"] += len(errors)
+        return errors
+
+    def _retry_later(self, message: dict, error: Exception):
+        """Queue a message that failed to be written for a retry, or drop it after ``max_attempts`` failed writes. Called with the pending lock held."""
+        msg_id = message["msg_id"]
+        attempts = self._retrying.get(msg_id, (None, 0, None))[1] + 1
+        if attempts >= self.max_attempts:
+            self._retrying.pop(msg_id, None)
+            self.stats["dropped"] += 1
+            logger.error(
+                f"Dropping message {msg_id} after {attempts} failed writes: {error}"
+            )
+            return
+        delay = min(self.flush_interval * 2 ** (attempts - 1), self.max_retry_delay)
+        self._retrying[msg_id] = (message, attempts, time.monotonic() + delay)
+        logger.warning(
+            f"Error in writing message {msg_id}, retrying in {delay:.0f}s: {error}"
+        )
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._pending_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="write-behind-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self._flush(retry=False)
+            except Exception as e:
+                logger.exception(f"Error in flushing messages: {e}")
+
+    def close(self):
+        """Flush pending messages and stop the background thread. Later upserts are written directly."""
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+
+
+_writers = weakref.WeakKeyDictionary()
+_writers_lock = threading.Lock()
+
+
+def get_writer(db: BaseDB) -> WriteBehindWriter:
+    """Return the process-wide write-behind writer for ``db``, creating it on first use."""
+    with _writers_lock:
+        writer = _writers.get(db)
+        if writer is None:
+            writer = WriteBehindWriter(
+                db,
+                flush_interval=float(os.getenv("DB_WRITE_BEHIND_INTERVAL", 1.0)),
+            )
+            _writers[db] = writer
+        return writer
+
+
+@atexit.register
+def _close_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        try:
+            writer.close()
+        except Exception as e:
+            logger.exception(f"Error in closing write-behind writer: {e}")
@@ -6,11 +6,16 @@ Create an application factory function, which will be used to create a new app i
 docs: https://flask.palletsprojects.com/en/2.3.x/patterns/appfactories/
 """
 
+import os
+
 from flask_cors import CORS
 from flask import Flask
 from flask_socketio import SocketIO
 from logging.config import dictConfig
 
+from director.core.journal import recover_journals
+from director.db import load_db
+from director.db.retention import RetentionPolicy, RetentionTask
 from director.entrypoint.api.routes import agent_bp, session_bp, videodb_bp, config_bp
 from director.entrypoint.api.socket_io import ChatNamespace
 
@@ -60,4 +65,16 @@ def create_app(app_config: object):
     # register socket namespaces
     socketio.on_namespace(ChatNamespace("/chat"))
 
+    # Store the messages that were in progress when earlier processes of this host stopped
+    recover_journals(load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"])))
+
+    # Purge expired sessions in the background
+    if app.config.get("RETENTION_INTERVAL"):
+        app.retention_task = RetentionTask(
+            db=load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"])),
+            policy=RetentionPolicy.from_env(),
+            interval=app.config["RETENTION_INTERVAL"],
+        )
+        app.retention_task.start()
+
     return app
@@ -11,6 +11,23 @@ session_bp = Blueprint("session", __name__, url_prefix="/session")
 videodb_bp = Blueprint("videodb", __name__, url_prefix="/videodb")
 config_bp = Blueprint("config", __name__, url_prefix="/config")
 
+MAX_PAGE_SIZE = 200
+
+
+def get_page_args():
+    """Read the ``limit``, ``before`` and ``after`` pagination query params.
+
+    :return: ``(limit, before, after)``, ``limit`` is ``None`` when pagination is not requested.
+    """
+    before = request.args.get("before")
+    after = request.args.get("after")
+    limit = request.args.get("limit", type=int)
+    if limit is None and (before or after):
+        limit = 50
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return limit, before, after
+
 
 @agent_bp.route("/", methods=["GET"], strict_slashes=False)
 def agent():
@@ -26,12 +43,31 @@ def agent():
 @session_bp.route("/", methods=["GET"], strict_slashes=False)
 def get_sessions():
     """
-    Get all the sessions
+    Get all the sessions, or a page of sessions if ``limit``, ``before`` or ``after`` is given
+    """
+    limit, before, after = get_page_args()
+    session_handler = SessionHandler(
+        db=load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"]))
+    )
+    try:
+        return session_handler.get_sessions(limit=limit, before=before, after=after)
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+
+@session_bp.route("/search", methods=["GET"])
+def search_sessions():
+    """
+    Full-text search over the messages of all sessions
     """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return {"message": "Please provide a search query in q."}, 400
+    limit = max(1, min(request.args.get("limit", 20, type=int), MAX_PAGE_SIZE))
     session_handler = SessionHandler(
         db=load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"]))
     )
-    return session_handler.get_sessions()
+    return session_handler.search_sessions(query, limit=limit)
 
 
 @session_bp.route("/<session_id>", methods=["GET", "DELETE"])
@@ -45,13 +81,23 @@ def get_session(session_id):
     session_handler = SessionHandler(
         db=load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"]))
     )
-    session = session_handler.get_session(session_id)
+    if request.method == "GET":
+        limit, before, after = get_page_args()
+        try:
+            session = session_handler.get_session(
+                session_id, limit=limit, before=before, after=after
+            )
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        if not session:
+            return {"message": "Session not found."}, 404
+        return session
+
+    session = session_handler.get_session(session_id, limit=1)
     if not session:
         return {"message": "Session not found."}, 404
 
-    if request.method == "GET":
-        return session
-    elif request.method == "DELETE":
+    if request.method == "DELETE":
         success, failed_components = session_handler.delete_session(session_id)
         if success:
             return {"message": "Session deleted successfully."}, 200
@@ -61,6 +107,36 @@ def get_session(session_id):
             }, 500
 
 
+@session_bp.route("/<session_id>/usage", methods=["GET"])
+def get_session_usage(session_id):
+    """
+    Get the tokens, cost and latency used by a session, per conversation, agent and model
+    """
+    session_handler = SessionHandler(
+        db=load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"]))
+    )
+    usage = session_handler.get_session_usage(session_id)
+    if usage is None:
+        return {"message": "Session not found."}, 404
+    return usage
+
+
+@session_bp.route("/<session_id>/cancel", methods=["POST"])
+def cancel_session_run(session_id):
+    """
+    Cancel the active run of a conversation given as ``conv_id`` in the JSON body or the query string, or all runs of the session
+    """
+    data = request.get_json(silent=True) or {}
+    conv_id = data.get("conv_id") or request.args.get("conv_id")
+    session_handler = SessionHandler(
+        db=load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"]))
+    )
+    cancelled = session_handler.cancel_run(session_id, conv_id)
+    if not cancelled:
+        return {"message": "No active run found.", "cancelled": []}, 404
+    return {"message": "Run cancelled.", "cancelled": cancelled}
+
+
 @videodb_bp.route("/collection", defaults={"collection_id": None}, methods=["GET"])
 @videodb_bp.route("/collection/<collection_id>", methods=["GET"])
 def get_collection_or_all(collection_id):
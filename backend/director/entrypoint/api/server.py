@@ -53,6 +53,8 @@ class BaseAppConfig:
     """Host for the app."""
     PORT: int = 8000
     """Port for the app."""
+    RETENTION_INTERVAL: int = 0
+    """Seconds between runs of the session retention task, 0 disables it. The policy is read from the `DB_RETENTION_*` environment variables."""
     ENV_PREFIX: str = "SERVER"
 
 
@@ -1,18 +1,55 @@
 import os
 
-from flask import current_app as app
-from flask_socketio import Namespace
+from flask import current_app as app, request
+from flask_socketio import Namespace, emit
 
+from director.core.delta import disable_delta, enable_delta, get_stream
 from director.db import load_db
-from director.handler import ChatHandler
+from director.handler import ChatHandler, SessionHandler
 
 
 class ChatNamespace(Namespace):
     """Chat namespace for socket.io"""
 
+    def on_connect(self, auth=None):
+        """Switch the client to delta updates if it connects with ``protocol=delta`` in the auth data or query string"""
+        protocol = (auth or {}).get("protocol") or request.args.get("protocol")
+        if protocol == "delta":
+            enable_delta(request.sid)
+
+    def on_disconnect(self, *args):
+        disable_delta(request.sid)
+
     def on_chat(self, message):
         """Handle chat messages"""
         chat_handler = ChatHandler(
             db=load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"]))
         )
         chat_handler.chat(message)
+
+    def on_cancel(self, data):
+        """Cancel the active run of ``conv_id`` in ``session_id``, or all runs of the session if ``conv_id`` is not given"""
+        session_id = (data or {}).get("session_id")
+        if not session_id:
+            return {"message": "Please provide session_id."}
+        session_handler = SessionHandler(
+            db=load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"]))
+        )
+        cancelled = session_handler.cancel_run(session_id, data.get("conv_id"))
+        return {"cancelled": cancelled}
+
+    def on_resync(self, data):
+        """Send a snapshot of a message to a delta client that missed a frame"""
+        data = data or {}
+        msg_id = data.get("msg_id")
+        stream = get_stream(msg_id, create=False) if msg_id else None
+        snapshot = stream.snapshot() if stream else None
+        if snapshot is None and msg_id and data.get("session_id"):
+            # Not in memory anymore, e.g. after a restart, the stored message is final
+            db = load_db(os.getenv("SERVER_DB_TYPE", app.config["DB_TYPE"]))
+            conversation = db.get_message(data["session_id"], msg_id)
+            if conversation is not None:
+                snapshot = get_stream(msg_id).frame(conversation, final=True)
+        if snapshot is None:
+            return {"message": f"Message {msg_id} not found."}
+        emit("chat_delta", snapshot, namespace="/chat")
@@ -17,9 +17,10 @@ from director.agents.image_generation import ImageGenerationAgent
 from director.agents.stream_video import StreamVideoAgent
 from director.agents.subtitle import SubtitleAgent
 from director.agents.slack_agent import SlackAgent
+from director.agents.lookup_media import LookupMediaAgent
 
 
-from director.core.session import Session, InputMessage, MsgStatus
+from director.core.session import Session, SessionHandle, InputMessage, MsgStatus
 from director.core.reasoning import ReasoningEngine
 from director.db.base import BaseDB
 from director.db import load_db
@@ -48,21 +49,17 @@ class ChatHandler:
             StreamVideoAgent,
             SubtitleAgent,
             SlackAgent,
+            LookupMediaAgent,
         ]
 
     def add_videodb_state(self, session):
-        from videodb import connect
+        from director.tools.videodb_state import get_videodb_state_cache
 
-        session.state["conn"] = connect(
-            base_url=os.getenv("VIDEO_DB_BASE_URL", "https://api.videodb.io")
-        )
-        session.state["collection"] = session.state["conn"].get_collection(
-            session.collection_id
-        )
-        if session.video_id:
-            session.state["video"] = session.state["collection"].get_video(
-                session.video_id
+        session.state.update(
+            get_videodb_state_cache().get(
+                session.session_id, session.collection_id, session.video_id
             )
+        )
         logger.info("videodb state added to session")
 
     def agents_list(self):
@@ -106,16 +103,34 @@ class SessionHandler:
     def __init__(self, db: BaseDB, **kwargs):
         self.db = db
 
-    def get_sessions(self):
-        session = Session(db=self.db)
-        return session.get_all()
+    def get_sessions(self, limit=None, before=None, after=None):
+        session = SessionHandle(db=self.db)
+        return session.get_all(limit=limit, before=before, after=after)
+
+    def get_session(self, session_id, limit=None, before=None, after=None):
+        session = SessionHandle(db=self.db, session_id=session_id)
+        return session.get(limit=limit, before=before, after=after)
+
+    def get_session_usage(self, session_id):
+        if not self.db.get_session(session_id):
+            return None
+        session = SessionHandle(db=self.db, session_id=session_id)
+        return session.get_usage()
+
+    def cancel_run(self, session_id, conv_id=None):
+        """Cancel the active reasoning run of a conversation, or every run of the session if ``conv_id`` is not given.
+
+        :return: Conversation ids of the cancelled runs, empty if none was active in this process.
+        """
+        from director.core.cancellation import get_run_registry
+
+        return get_run_registry().cancel(session_id, conv_id)
 
-    def get_session(self, session_id):
-        session = Session(db=self.db, session_id=session_id)
-        return session.get()
+    def search_sessions(self, query, limit=20):
+        return {"results": self.db.search_conversations(query, limit=limit)}
 
     def delete_session(self, session_id):
-        session = Session(db=self.db, session_id=session_id)
+        session = SessionHandle(db=self.db, session_id=session_id)
         return session.delete()
 
 
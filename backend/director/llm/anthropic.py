@@ -1,10 +1,19 @@
+import json
 from enum import Enum
 
 from pydantic import Field, field_validator, FieldValidationInfo
 from pydantic_settings import SettingsConfigDict
 
 from director.core.session import RoleTypes
-from director.llm.base import BaseLLM, BaseLLMConfig, LLMResponse, LLMResponseStatus
+from director.core.cancellation import on_cancel
+from director.llm.base import (
+    BaseLLM,
+    BaseLLMConfig,
+    LLMResponse,
+    LLMResponseStatus,
+    LLMStreamEvent,
+    LLMStreamEventType,
+)
 from director.constants import (
     LLMType,
     EnvPrefix,
@@ -20,8 +29,22 @@ class AnthropicChatModel(str, Enum):
     CLAUDE_3_5_SONNET_LATEST = "claude-3-5-sonnet-20241022"
 
 
+ANTHROPIC_PRICING = {
+    AnthropicChatModel.CLAUDE_3_HAIKU.value: (0.25, 1.25),
+    AnthropicChatModel.CLAUDE_3_OPUS.value: (15.0, 75.0),
+    AnthropicChatModel.CLAUDE_3_5_SONNET.value: (3.0, 15.0),
+    AnthropicChatModel.CLAUDE_3_5_SONNET_LATEST.value: (3.0, 15.0),
+}
+
+# Marks the end of a cacheable prefix, docs: https://docs.anthropic.com/en/docs/build-with-claude/prompt-caching
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
 class AnthropicAIConfig(BaseLLMConfig):
-    """AnthropicAI Config"""
+    """AnthropicAI Config
+
+    :param bool prompt_caching: Cache the prompt prefix of requests with tools, i.e. of the reasoning loop.
+    """
 
     model_config = SettingsConfigDict(
         env_prefix=EnvPrefix.ANTHROPIC_,
@@ -32,6 +55,7 @@ class AnthropicAIConfig(BaseLLMConfig):
     api_key: str = ""
     api_base: str = ""
     chat_model: str = Field(default=AnthropicChatModel.CLAUDE_3_5_SONNET)
+    prompt_caching: bool = True
 
     @field_validator("api_key")
     @classmethod
@@ -44,6 +68,11 @@ class AnthropicAIConfig(BaseLLMConfig):
 
 
 class AnthropicAI(BaseLLM):
+    default_context_window = 200000
+    pricing = ANTHROPIC_PRICING
+    cache_read_price_ratio = 0.1
+    cache_write_price_ratio = 1.25
+
     def __init__(self, config: AnthropicAIConfig = None):
         """
         :param config: AnthropicAI Config
@@ -51,6 +80,7 @@ class AnthropicAI(BaseLLM):
         if config is None:
             config = AnthropicAIConfig()
         super().__init__(config=config)
+        self.prompt_caching = config.prompt_caching
         try:
             import anthropic
         except ImportError:
@@ -58,51 +88,106 @@ class AnthropicAI(BaseLLM):
 
         self.client = anthropic.Anthropic(api_key=self.api_key)
 
-    def _format_messages(self, messages: list):
-        system = ""
-        formatted_messages = []
-        if messages[0]["role"] == RoleTypes.system:
-            system = messages[0]["content"]
-            messages = messages[1:]
+    def count_tokens(self, text: str) -> int:
+        """Estimate the tokens of ``text``, Claude models average about 3.5 characters per token."""
+        return -(-len(text) * 2 // 7)
 
-        for message in messages:
-            if message["role"] == RoleTypes.assistant and message.get("tool_calls"):
-                tool = message["tool_calls"][0]["tool"]
-                formatted_messages.append(
+    def _format_message(self, message: dict) -> dict:
+        if message["role"] == RoleTypes.assistant and message.get("tool_calls"):
+            content = []
+            # Anthropic rejects empty text blocks
+            if message["content"]:
+                content.append({"type": "text", "text": message["content"]})
+            for tool_call in message["tool_calls"]:
+                content.append(
                     {
-                        "role": message["role"],
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": message["content"],
-                            },
-                            {
-                                "id": message["tool_calls"][0]["id"],
-                                "type": message["tool_calls"][0]["type"],
-                                "name": tool["name"],
-                                "input": tool["arguments"],
-                            },
-                        ],
+                        "id": tool_call["id"],
+                        "type": "tool_use",
+                        "name": tool_call["tool"]["name"],
+                        "input": tool_call["tool"]["arguments"],
                     }
                 )
+            return {"role": message["role"], "content": content}
 
-            elif message["role"] == RoleTypes.tool:
-                formatted_messages.append(
+        elif message["role"] == RoleTypes.tool:
+            return {
+                "role": RoleTypes.user,
+                "content": [
                     {
-                        "role": RoleTypes.user,
-                        "content": [
-                            {
-                                "type": "tool_result",
-                                "tool_use_id": message["tool_call_id"],
-                                "content": message["content"],
-                            }
-                        ],
+                        "type": "tool_result",
+                        "tool_use_id": message["tool_call_id"],
+                        "content": message["content"],
                     }
-                )
+                ],
+            }
+
+        elif message["role"] == RoleTypes.system:
+            # Only the first system message is the system prompt, later ones, e.g. the summarization prompt, are instructions of the user turn
+            return {"role": RoleTypes.user, "content": message["content"]}
+        return message
+
+    @staticmethod
+    def _is_tool_results(message: dict) -> bool:
+        return (
+            message["role"] == RoleTypes.user
+            and isinstance(message["content"], list)
+            and bool(message["content"])
+            and all(
+                isinstance(block, dict) and block.get("type") == "tool_result"
+                for block in message["content"]
+            )
+        )
+
+    @classmethod
+    def _merge_tool_results(cls, messages: list) -> list:
+        """Merge the results of the tool calls of an assistant turn into one user turn, as Anthropic expects. The formatted messages are cached, so they are copied instead of modified."""
+        merged = []
+        for message in messages:
+            if (
+                merged
+                and cls._is_tool_results(message)
+                and cls._is_tool_results(merged[-1])
+            ):
+                merged[-1] = {
+                    **merged[-1],
+                    "content": merged[-1]["content"] + message["content"],
+                }
             else:
-                formatted_messages.append(message)
+                merged.append(message)
+        return merged
+
+    def _format_messages(self, messages: list, cache: bool = False):
+        system = ""
+        if messages[0]["role"] == RoleTypes.system:
+            system = messages[0]["content"]
+            messages = messages[1:]
+        messages = self._merge_tool_results(self.format_messages_cached(messages))
+
+        if cache:
+            system, messages = self._add_cache_breakpoints(system, messages)
+        return system, messages
+
+    @staticmethod
+    def _add_cache_breakpoints(system, messages: list):
+        """Mark the end of the first and of the last system part and the last message as cache breakpoints. The tools come before the system prompt, so they are part of every cached prefix.
 
-        return system, formatted_messages
+        The first part is the system prompt, shared by all sessions, the last one the description of the collection or the summary of earlier turns. The breakpoint on the last message lets the next step of the loop read the whole conversation so far from the cache. The formatted messages are cached, so they are copied instead of modified.
+        """
+        if system:
+            if isinstance(system, str):
+                system = [{"type": "text", "text": system}]
+            system = [dict(part) for part in system]
+            system[0]["cache_control"] = CACHE_CONTROL
+            system[-1]["cache_control"] = CACHE_CONTROL
+
+        if messages and messages[-1]["content"]:
+            message = messages[-1]
+            content = message["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            content = content[:-1] + [{**content[-1], "cache_control": CACHE_CONTROL}]
+            messages = messages[:-1] + [{**message, "content": content}]
+        return system, messages
 
     def _format_tools(self, tools: list):
         """Format the tools to the format that Anthropic expects.
@@ -135,16 +220,15 @@ class AnthropicAI(BaseLLM):
                     "input_schema": tool["parameters"],
                 }
             )
+        if self.prompt_caching and formatted_tools:
+            formatted_tools[-1]["cache_control"] = CACHE_CONTROL
         return formatted_tools
 
-    def chat_completions(
-        self, messages: list, tools: list = [], stop=None, response_format=None
-    ):
-        """Get completions for chat.
-
-        tools docs: https://docs.anthropic.com/en/docs/build-with-claude/tool-use
-        """
-        system, messages = self._format_messages(messages)
+    def _params(self, messages: list, tools: list) -> dict:
+        # Only the reasoning loop repeats its prefix often enough to pay for the cache writes
+        system, messages = self._format_messages(
+            messages, cache=self.prompt_caching and bool(tools)
+        )
         params = {
             "model": self.chat_model,
             "messages": messages,
@@ -152,7 +236,17 @@ class AnthropicAI(BaseLLM):
             "max_tokens": self.max_tokens,
         }
         if tools:
-            params["tools"] = self._format_tools(tools)
+            params["tools"] = self.format_tools_cached(tools)
+        return params
+
+    def chat_completions(
+        self, messages: list, tools: list = [], stop=None, response_format=None
+    ):
+        """Get completions for chat.
+
+        tools docs: https://docs.anthropic.com/en/docs/build-with-claude/tool-use
+        """
+        params = self._params(messages, tools)
 
         try:
             response = self.client.messages.create(**params)
@@ -161,25 +255,112 @@ class AnthropicAI(BaseLLM):
             return LLMResponse(content=f"Error: {e}")
 
         return LLMResponse(
-            content=response.content[0].text,
+            content="".join(
+                block.text for block in response.content if block.type == "text"
+            ),
             tool_calls=[
                 {
-                    "id": response.content[1].id,
-                    "tool": {
-                        "name": response.content[1].name,
-                        "arguments": response.content[1].input,
-                    },
-                    "type": response.content[1].type,
+                    "id": block.id,
+                    "tool": {"name": block.name, "arguments": block.input},
+                    "type": block.type,
                 }
-            ]
-            if next(
-                (block for block in response.content if block.type == "tool_use"), None
-            )
-            is not None
-            else [],
+                for block in response.content
+                if block.type == "tool_use"
+            ],
             finish_reason=response.stop_reason,
-            send_tokens=response.usage.input_tokens,
             recv_tokens=response.usage.output_tokens,
-            total_tokens=(response.usage.input_tokens + response.usage.output_tokens),
             status=LLMResponseStatus.SUCCESS,
+            **self._prompt_usage(response.usage, response.usage.output_tokens),
+        )
+
+    @staticmethod
+    def _prompt_usage(usage, recv_tokens: int) -> dict:
+        """Prompt token counts of a response. Anthropic counts the tokens read from and written to the cache apart from ``input_tokens``."""
+        cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        send_tokens = usage.input_tokens + cache_read_tokens + cache_write_tokens
+        return {
+            "send_tokens": send_tokens,
+            "total_tokens": send_tokens + recv_tokens,
+            "cache_read_tokens": cache_read_tokens,
+            "cache_write_tokens": cache_write_tokens,
+        }
+
+    def chat_completions_stream(
+        self, messages: list, tools: list = [], stop=None, response_format=None
+    ):
+        """Stream completions for chat, yielding text as it is generated and each tool call once its input is complete.
+
+        docs: https://docs.anthropic.com/en/api/messages-streaming
+        """
+        params = self._params(messages, tools)
+        params["stream"] = True
+
+        content, blocks, tool_calls = [], {}, []
+        stop_reason, prompt_usage, recv_tokens = "", None, 0
+        try:
+            stream = self.client.messages.create(**params)
+            # Closing the response aborts the request when the run is cancelled while waiting for data
+            with stream, on_cancel(stream.close):
+                for event in stream:
+                    if event.type == "message_start":
+                        prompt_usage = event.message.usage
+                    elif event.type == "content_block_start":
+                        if event.content_block.type == "tool_use":
+                            blocks[event.index] = {
+                                "id": event.content_block.id,
+                                "name": event.content_block.name,
+                                "input": "",
+                            }
+                    elif event.type == "content_block_delta":
+                        if event.delta.type == "text_delta":
+                            content.append(event.delta.text)
+                            yield LLMStreamEvent(
+                                type=LLMStreamEventType.text, text=event.delta.text
+                            )
+                        elif event.delta.type == "input_json_delta":
+                            blocks[event.index]["input"] += event.delta.partial_json
+                    elif event.type == "content_block_stop":
+                        block = blocks.pop(event.index, None)
+                        if block is not None:
+                            tool_calls.append(
+                                {
+                                    "id": block["id"],
+                                    "tool": {
+                                        "name": block["name"],
+                                        "arguments": json.loads(
+                                            block["input"] or "{}"
+                                        ),
+                                    },
+                                    "type": "tool_use",
+                                }
+                            )
+                            yield LLMStreamEvent(
+                                type=LLMStreamEventType.tool_call,
+                                tool_call=tool_calls[-1],
+                            )
+                    elif event.type == "message_delta":
+                        stop_reason = event.delta.stop_reason or stop_reason
+                        recv_tokens = event.usage.output_tokens
+        except Exception as e:
+            yield LLMStreamEvent(
+                type=LLMStreamEventType.done,
+                response=LLMResponse(content=f"Error: {e}"),
+            )
+            return
+
+        yield LLMStreamEvent(
+            type=LLMStreamEventType.done,
+            response=LLMResponse(
+                content="".join(content),
+                tool_calls=tool_calls,
+                finish_reason=stop_reason,
+                recv_tokens=recv_tokens,
+                status=LLMResponseStatus.SUCCESS,
+                **(
+                    self._prompt_usage(prompt_usage, recv_tokens)
+                    if prompt_usage
+                    else {"total_tokens": recv_tokens}
+                ),
+            ),
         )
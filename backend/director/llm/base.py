@@ -1,9 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from enum import Enum
+from typing import Iterator, List, Dict, Optional
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
+from director.core.usage import track_llm_usage, track_llm_stream_usage
+from director.core.cancellation import cancellable_llm_call, cancellable_llm_stream
+
 
 class LLMResponseStatus:
     SUCCESS: bool = True
@@ -11,17 +15,42 @@ class LLMResponseStatus:
 
 
 class LLMResponse(BaseModel):
-    """Response model for completions from LLMs."""
+    """Response model for completions from LLMs.
+
+    ``send_tokens`` counts the whole prompt. ``cache_read_tokens`` of them were read from the prompt cache of the provider, ``cache_write_tokens`` were written to it.
+    """
 
     content: str = ""
     tool_calls: List[Dict] = []
     send_tokens: int = 0
     recv_tokens: int = 0
     total_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
     finish_reason: str = ""
     status: int = LLMResponseStatus.ERROR
 
 
+class LLMStreamEventType(str, Enum):
+    """Types of the events of a streamed completion"""
+
+    text = "text"
+    tool_call = "tool_call"
+    done = "done"
+
+
+class LLMStreamEvent(BaseModel):
+    """Event of a streamed completion.
+
+    :param type: ``text`` carries the next piece of the answer in ``text``. ``tool_call`` carries a tool call whose arguments are complete, in the format of :attr:`LLMResponse.tool_calls`. ``done`` is the last event and carries the whole ``response``.
+    """
+
+    type: LLMStreamEventType
+    text: str = ""
+    tool_call: Dict = {}
+    response: Optional[LLMResponse] = None
+
+
 class BaseLLMConfig(BaseSettings):
     """Base configuration for all LLMs.
 
@@ -49,6 +78,15 @@ class BaseLLMConfig(BaseSettings):
 class BaseLLM(ABC):
     """Interface for all LLMs. All LLMs should inherit from this class."""
 
+    #: Context window in tokens per chat model, used when the model is not listed
+    context_windows: Dict[str, int] = {}
+    default_context_window: int = 8192
+    #: Price in USD per million prompt and completion tokens per chat model
+    pricing: Dict[str, tuple] = {}
+    #: Price of prompt tokens read from and written to the prompt cache, relative to the prompt price
+    cache_read_price_ratio: float = 1.0
+    cache_write_price_ratio: float = 1.0
+
     def __init__(self, config: BaseLLMConfig):
         """
         :param config: Configuration for the LLM.
@@ -63,8 +101,87 @@ class BaseLLM(ABC):
         self.max_tokens = config.max_tokens
         self.timeout = config.timeout
         self.enable_langfuse = config.enable_langfuse
+        # Provider forms of the last tools list and of the messages of the last call
+        self._tools_cache = None
+        self._messages_cache = {}
+        # Usage is recorded before a cancelled run stops, as the tokens were spent
+        self.chat_completions = cancellable_llm_call(
+            track_llm_usage(self, self.chat_completions)
+        )
+        self.chat_completions_stream = cancellable_llm_stream(
+            track_llm_stream_usage(self, self.chat_completions_stream)
+        )
+
+    @property
+    def context_window(self) -> int:
+        """Number of tokens the chat model accepts, prompt and completion together."""
+        return self.context_windows.get(self.model_name, self.default_context_window)
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.chat_model, "value", self.chat_model)
+
+    def cost(
+        self,
+        send_tokens: int,
+        recv_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> float:
+        """Price of a call in USD, 0 for models without known pricing."""
+        prompt_price, completion_price = self.pricing.get(self.model_name, (0, 0))
+        uncached_tokens = send_tokens - cache_read_tokens - cache_write_tokens
+        return (
+            uncached_tokens * prompt_price
+            + cache_read_tokens * prompt_price * self.cache_read_price_ratio
+            + cache_write_tokens * prompt_price * self.cache_write_price_ratio
+            + recv_tokens * completion_price
+        ) / 1e6
+
+    def count_tokens(self, text: str) -> int:
+        """Estimate the number of tokens of ``text`` for the chat model. The default assumes 4 characters per token."""
+        return -(-len(text) // 4)
+
+    def _format_message(self, message: Dict) -> Dict:
+        """Convert a message to the format of the provider."""
+        return message
+
+    def _format_tools(self, tools: List[Dict]) -> List[Dict]:
+        """Convert the tools to the format of the provider."""
+        return tools
+
+    def format_messages_cached(self, messages: List[Dict]) -> List[Dict]:
+        """Convert messages with :meth:`_format_message`, reusing the result for message dicts that were passed in the previous call. In a reasoning loop only the newly appended messages are converted."""
+        cache, formatted = {}, []
+        for message in messages:
+            entry = self._messages_cache.get(id(message))
+            if entry is None or entry[0] is not message:
+                entry = (message, self._format_message(message))
+            cache[id(message)] = entry
+            formatted.append(entry[1])
+        # Only the messages of this call are kept, so the cache never outgrows the context
+        self._messages_cache = cache
+        return formatted
+
+    def format_tools_cached(self, tools: List[Dict]) -> List[Dict]:
+        """Convert tools with :meth:`_format_tools` once per tools list. Pass the same list object, e.g. built once per agent set, to reuse the result."""
+        if self._tools_cache is None or self._tools_cache[0] is not tools:
+            self._tools_cache = (tools, self._format_tools(tools))
+        return self._tools_cache[1]
 
     @abstractmethod
     def chat_completions(self, messages: List[Dict], tools: List[Dict]) -> LLMResponse:
         """Abstract method for chat completions"""
         pass
+
+    def chat_completions_stream(
+        self, messages: List[Dict], tools: List[Dict] = []
+    ) -> Iterator[LLMStreamEvent]:
+        """Streaming variant of :meth:`chat_completions`, yielding :class:`LLMStreamEvent` as the completion is generated. LLMs without streaming support yield the whole completion at once."""
+        # The class method, as the usage of the call is recorded by the stream
+        response = type(self).chat_completions(self, messages=messages, tools=tools)
+        if response.content:
+            yield LLMStreamEvent(type=LLMStreamEventType.text, text=response.content)
+        for tool_call in response.tool_calls:
+            yield LLMStreamEvent(type=LLMStreamEventType.tool_call, tool_call=tool_call)
+        yield LLMStreamEvent(type=LLMStreamEventType.done, response=response)
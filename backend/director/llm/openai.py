@@ -5,7 +5,15 @@ from pydantic import Field, field_validator, FieldValidationInfo
 from pydantic_settings import SettingsConfigDict
 
 
-from director.llm.base import BaseLLM, BaseLLMConfig, LLMResponse, LLMResponseStatus
+from director.llm.base import (
+    BaseLLM,
+    BaseLLMConfig,
+    LLMResponse,
+    LLMResponseStatus,
+    LLMStreamEvent,
+    LLMStreamEventType,
+)
+from director.core.cancellation import on_cancel
 from director.constants import (
     LLMType,
     EnvPrefix,
@@ -22,6 +30,24 @@ class OpenAIChatModel(str, Enum):
     GPT4o_MINI = "gpt-4o-mini"
 
 
+OPENAI_CONTEXT_WINDOWS = {
+    OpenAIChatModel.GPT4.value: 8192,
+    OpenAIChatModel.GPT4_32K.value: 32768,
+    OpenAIChatModel.GPT4_TURBO.value: 128000,
+    OpenAIChatModel.GPT4o.value: 128000,
+    OpenAIChatModel.GPT4o_MINI.value: 128000,
+}
+
+
+OPENAI_PRICING = {
+    OpenAIChatModel.GPT4.value: (30.0, 60.0),
+    OpenAIChatModel.GPT4_32K.value: (60.0, 120.0),
+    OpenAIChatModel.GPT4_TURBO.value: (10.0, 30.0),
+    OpenAIChatModel.GPT4o.value: (2.5, 10.0),
+    OpenAIChatModel.GPT4o_MINI.value: (0.15, 0.6),
+}
+
+
 class OpenaiConfig(BaseLLMConfig):
     """OpenAI Config"""
 
@@ -47,6 +73,11 @@ class OpenaiConfig(BaseLLMConfig):
 
 
 class OpenAI(BaseLLM):
+    context_windows = OPENAI_CONTEXT_WINDOWS
+    default_context_window = 128000
+    pricing = OPENAI_PRICING
+    cache_read_price_ratio = 0.5
+
     def __init__(self, config: OpenaiConfig = None):
         """
         :param config: OpenAI Config
@@ -60,6 +91,23 @@ class OpenAI(BaseLLM):
             raise ImportError("Please install OpenAI python library.")
 
         self.client = openai.OpenAI(api_key=self.api_key, base_url=self.api_base)
+        self._encoding = None
+
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of ``text`` with tiktoken if it is installed, else estimate them."""
+        if self._encoding is None:
+            try:
+                import tiktoken
+
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model_name)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("o200k_base")
+            except ImportError:
+                self._encoding = False
+        if self._encoding is False:
+            return super().count_tokens(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
 
     def init_langfuse(self):
         from langfuse.decorators import observe
@@ -67,33 +115,29 @@ class OpenAI(BaseLLM):
         self.chat_completions = observe(name=type(self).__name__)(self.chat_completions)
         self.text_completions = observe(name=type(self).__name__)(self.text_completions)
 
-    def _format_messages(self, messages: list):
-        """Format the messages to the format that OpenAI expects."""
-        formatted_messages = []
-        for message in messages:
-            if message["role"] == "assistant" and message.get("tool_calls"):
-                formatted_messages.append(
+    def _format_message(self, message: dict) -> dict:
+        """Format a message to the format that OpenAI expects."""
+        if message["role"] == "assistant" and message.get("tool_calls"):
+            return {
+                "role": message["role"],
+                "content": message["content"],
+                "tool_calls": [
                     {
-                        "role": message["role"],
-                        "content": message["content"],
-                        "tool_calls": [
-                            {
-                                "id": tool_call["id"],
-                                "function": {
-                                    "name": tool_call["tool"]["name"],
-                                    "arguments": json.dumps(
-                                        tool_call["tool"]["arguments"]
-                                    ),
-                                },
-                                "type": tool_call["type"],
-                            }
-                            for tool_call in message["tool_calls"]
-                        ],
+                        "id": tool_call["id"],
+                        "function": {
+                            "name": tool_call["tool"]["name"],
+                            "arguments": json.dumps(tool_call["tool"]["arguments"]),
+                        },
+                        "type": "function",
                     }
-                )
-            else:
-                formatted_messages.append(message)
-        return formatted_messages
+                    for tool_call in message["tool_calls"]
+                ],
+            }
+        return message
+
+    def _format_messages(self, messages: list):
+        """Format the messages to the format that OpenAI expects."""
+        return self.format_messages_cached(messages)
 
     def _format_tools(self, tools: list):
         """Format the tools to the format that OpenAI expects.
@@ -136,13 +180,7 @@ class OpenAI(BaseLLM):
             )
         return formatted_tools
 
-    def chat_completions(
-        self, messages: list, tools: list = [], stop=None, response_format=None
-    ):
-        """Get completions for chat.
-
-        docs: https://platform.openai.com/docs/guides/function-calling
-        """
+    def _params(self, messages: list, tools: list, stop, response_format) -> dict:
         params = {
             "model": self.chat_model,
             "messages": self._format_messages(messages),
@@ -153,12 +191,23 @@ class OpenAI(BaseLLM):
             "timeout": self.timeout,
         }
         if tools:
-            params["tools"] = self._format_tools(tools)
+            params["tools"] = self.format_tools_cached(tools)
             params["tool_choice"] = "auto"
 
         if response_format:
             params["response_format"] = response_format
 
+        return params
+
+    def chat_completions(
+        self, messages: list, tools: list = [], stop=None, response_format=None
+    ):
+        """Get completions for chat.
+
+        docs: https://platform.openai.com/docs/guides/function-calling
+        """
+        params = self._params(messages, tools, stop, response_format)
+
         try:
             response = self.client.chat.completions.create(**params)
         except Exception as e:
@@ -184,5 +233,100 @@ class OpenAI(BaseLLM):
             send_tokens=response.usage.prompt_tokens,
             recv_tokens=response.usage.completion_tokens,
             total_tokens=response.usage.total_tokens,
+            cache_read_tokens=self._cached_tokens(response.usage),
             status=LLMResponseStatus.SUCCESS,
         )
+
+    @staticmethod
+    def _cached_tokens(usage) -> int:
+        """Prompt tokens read from the prompt cache. OpenAI caches prompts of 1024 tokens or more automatically, a request hits the cache when its prompt starts with the same tokens as a recent one."""
+        details = getattr(usage, "prompt_tokens_details", None)
+        if isinstance(details, dict):
+            return details.get("cached_tokens") or 0
+        return getattr(details, "cached_tokens", None) or 0
+
+    @staticmethod
+    def _tool_call(call: dict) -> dict:
+        return {
+            "id": call["id"],
+            "tool": {
+                "name": call["name"],
+                "arguments": json.loads(call["arguments"] or "{}"),
+            },
+            "type": "function",
+        }
+
+    def chat_completions_stream(
+        self, messages: list, tools: list = [], stop=None, response_format=None
+    ):
+        """Stream completions for chat, yielding text as it is generated and each tool call once its arguments are complete.
+
+        docs: https://platform.openai.com/docs/api-reference/chat-streaming
+        """
+        params = self._params(messages, tools, stop, response_format)
+        params["stream"] = True
+        params["stream_options"] = {"include_usage": True}
+
+        content, calls, tool_calls = [], {}, []
+        finish_reason, usage = "", None
+        try:
+            stream = self.client.chat.completions.create(**params)
+            # Closing the response aborts the request when the run is cancelled while waiting for data
+            with stream, on_cancel(stream.close):
+                for chunk in stream:
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    if choice.delta.content:
+                        content.append(choice.delta.content)
+                        yield LLMStreamEvent(
+                            type=LLMStreamEventType.text, text=choice.delta.content
+                        )
+                    for delta in choice.delta.tool_calls or []:
+                        # Tool calls are streamed one after another, a new index completes the previous ones
+                        for index in sorted(calls):
+                            if index < delta.index:
+                                tool_calls.append(self._tool_call(calls.pop(index)))
+                                yield LLMStreamEvent(
+                                    type=LLMStreamEventType.tool_call,
+                                    tool_call=tool_calls[-1],
+                                )
+                        call = calls.setdefault(
+                            delta.index, {"id": None, "name": "", "arguments": ""}
+                        )
+                        if delta.id:
+                            call["id"] = delta.id
+                        if delta.function and delta.function.name:
+                            call["name"] += delta.function.name
+                        if delta.function and delta.function.arguments:
+                            call["arguments"] += delta.function.arguments
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+                for index in sorted(calls):
+                    tool_calls.append(self._tool_call(calls[index]))
+                    yield LLMStreamEvent(
+                        type=LLMStreamEventType.tool_call, tool_call=tool_calls[-1]
+                    )
+        except Exception as e:
+            print(f"Error: {e}")
+            yield LLMStreamEvent(
+                type=LLMStreamEventType.done,
+                response=LLMResponse(content=f"Error: {e}"),
+            )
+            return
+
+        yield LLMStreamEvent(
+            type=LLMStreamEventType.done,
+            response=LLMResponse(
+                content="".join(content),
+                tool_calls=tool_calls,
+                finish_reason=finish_reason,
+                send_tokens=usage.prompt_tokens if usage else 0,
+                recv_tokens=usage.completion_tokens if usage else 0,
+                total_tokens=usage.total_tokens if usage else 0,
+                cache_read_tokens=self._cached_tokens(usage),
+                status=LLMResponseStatus.SUCCESS,
+            ),
+        )
@@ -0,0 +1,229 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens of ``text``.
+
+    :raises TypeError: If ``text`` is not a string, e.g. message content items that weren't converted to text.
+    """
+    if text is None:
+        return []
+    if not isinstance(text, str):
+        raise TypeError(f"Expected text to tokenize, got {type(text).__name__}")
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def load_collection_media(collection) -> list:
+    """List the videos and images of a VideoDB collection as media index items."""
+    items = [
+        {
+            "id": video.id,
+            "type": "video",
+            "name": video.name,
+            "description": video.description,
+            "length": video.length,
+            "stream_url": video.stream_url,
+        }
+        for video in collection.get_videos()
+    ]
+    items.extend(
+        {
+            "id": image.id,
+            "type": "image",
+            "name": image.name,
+            "url": image.url,
+        }
+        for image in collection.get_images()
+    )
+    return items
+
+
+class MediaIndex:
+    """BM25 index over the name and description of the videos and images of a collection.
+
+    Items are dicts with at least ``id``, ``type`` and ``name``. Name tokens count ``name_weight`` times, as names are short and usually what the user refers to. :meth:`update` re-indexes only the items that were added or changed.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, name_weight: int = 2):
+        """
+        :param float k1: BM25 term frequency saturation.
+        :param float b: BM25 document length normalization.
+        :param int name_weight: How many times a name token counts.
+        """
+        self.k1 = k1
+        self.b = b
+        self.name_weight = name_weight
+        self.items = {}
+        self._terms = {}
+        self._lengths = {}
+        self._postings = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def _terms_of(self, item: dict) -> Counter:
+        terms = Counter(tokenize(item.get("description")))
+        for token in tokenize(item.get("name")):
+            terms[token] += self.name_weight
+        return terms
+
+    def _add(self, item: dict):
+        terms = self._terms_of(item)
+        self.items[item["id"]] = item
+        self._terms[item["id"]] = terms
+        self._lengths[item["id"]] = sum(terms.values())
+        self._total_length += self._lengths[item["id"]]
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[item["id"]] = count
+
+    def _remove(self, media_id: str):
+        self.items.pop(media_id)
+        terms = self._terms.pop(media_id)
+        self._total_length -= self._lengths.pop(media_id)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[media_id]
+            if not postings:
+                del self._postings[term]
+
+    def update(self, items: list):
+        """Make the index match ``items``, re-indexing only the new and changed ones.
+
+        :return: Number of items ``(added, removed)``, a changed item counts as both.
+        """
+        added = removed = 0
+        with self._lock:
+            current = {item["id"]: item for item in items}
+            for media_id in list(self.items):
+                if current.get(media_id) != self.items[media_id]:
+                    self._remove(media_id)
+                    removed += 1
+            for media_id, item in current.items():
+                if media_id not in self.items:
+                    self._add(item)
+                    added += 1
+        return added, removed
+
+    def scores(self, query: str) -> Counter:
+        """BM25 score of every item that shares a token with ``query``, by id."""
+        with self._lock:
+            scores = Counter()
+            if not self.items:
+                return scores
+            average_length = self._total_length / len(self.items) or 1
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(
+                    1 + (len(self.items) - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for media_id, count in postings.items():
+                    length = self._lengths[media_id]
+                    scores[media_id] += idf * (
+                        count
+                        * (self.k1 + 1)
+                        / (
+                            count
+                            + self.k1 * (1 - self.b + self.b * length / average_length)
+                        )
+                    )
+            return scores
+
+    def search(self, query: str, k: int = 10, media_type: str = None) -> list:
+        """Return the ``k`` items that match ``query`` best, highest score first.
+
+        :param str query: Free text, e.g. the message of the user.
+        :param int k: Number of items to return.
+        :param str media_type: Only return items of this type, ``video`` or ``image``.
+        """
+        results = []
+        for media_id, _ in self.scores(query).most_common():
+            item = self.items.get(media_id)
+            if item is not None and (media_type is None or item["type"] == media_type):
+                results.append(item)
+                if len(results) == k:
+                    break
+        return results
+
+    def list(self, k: int = 10, offset: int = 0, media_type: str = None) -> list:
+        """Return ``k`` items from ``offset`` in the order of the collection."""
+        with self._lock:
+            items = [
+                item
+                for item in self.items.values()
+                if media_type is None or item["type"] == media_type
+            ]
+        return items[offset : offset + k]
+
+    def count(self, media_type: str = None) -> int:
+        """Number of items, of one type if ``media_type`` is given."""
+        with self._lock:
+            if media_type is None:
+                return len(self.items)
+            return sum(1 for item in self.items.values() if item["type"] == media_type)
+
+
+class MediaIndexRegistry:
+    """Keeps one :class:`MediaIndex` per collection, shared by all sessions. The media of a collection is listed again after ``ttl`` seconds or after :meth:`invalidate`, and the index is updated incrementally."""
+
+    def __init__(self, loader=load_collection_media, ttl: float = None):
+        """
+        :param loader: Called with the VideoDB collection to list its media.
+        :param float ttl: Seconds an index is used before the media is listed again, defaults to ``MEDIA_INDEX_TTL`` or 300.
+        """
+        self.loader = loader
+        self.ttl = ttl or float(os.getenv("MEDIA_INDEX_TTL", 300))
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, collection) -> MediaIndex:
+        """Return the index of a VideoDB collection, building or refreshing it if needed."""
+        with self._lock:
+            entry = self._entries.setdefault(
+                collection.id,
+                {"index": MediaIndex(), "loaded_at": None, "lock": threading.Lock()},
+            )
+        # One listing per collection at a time, other sessions of the collection wait for it
+        with entry["lock"]:
+            loaded_at = entry["loaded_at"]
+            if loaded_at is None or time.monotonic() - loaded_at >= self.ttl:
+                added, removed = entry["index"].update(self.loader(collection))
+                entry["loaded_at"] = time.monotonic()
+                logger.info(
+                    f"Media index of collection {collection.id} updated, {added} added, {removed} removed"
+                )
+        return entry["index"]
+
+    def invalidate(self, collection_id: str):
+        """List the media of the collection again on the next :meth:`get`. Call it when the collection changes, e.g. after an upload."""
+        with self._lock:
+            entry = self._entries.get(collection_id)
+            if entry is not None:
+                entry["loaded_at"] = None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_media_index_registry() -> MediaIndexRegistry:
+    """Return the process-wide media index registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MediaIndexRegistry()
+        return _registry
@@ -0,0 +1,129 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def load_videodb_state(collection_id: str, video_id: str = None) -> dict:
+    """Connect to VideoDB and fetch the collection and, if given, the video.
+
+    :return: ``{"conn", "collection"}`` and ``"video"`` when ``video_id`` is given.
+    """
+    from videodb import connect
+
+    state = {
+        "conn": connect(
+            base_url=os.getenv("VIDEO_DB_BASE_URL", "https://api.videodb.io")
+        )
+    }
+    state["collection"] = state["conn"].get_collection(collection_id)
+    if video_id:
+        state["video"] = state["collection"].get_video(video_id)
+    return state
+
+
+class VideoDBStateCache:
+    """Caches the VideoDB connection, collection and video of a session across chat turns, so follow-up messages skip the VideoDB round trips.
+
+    Entries are keyed by ``(session_id, collection_id, video_id)`` and expire after ``ttl`` seconds. An entry used after ``refresh_after`` seconds is returned as is and reloaded in the background, so a busy session never waits for a reload. Expired entries are removed by :meth:`get` at most once every ``ttl`` seconds, so entries of finished sessions don't pile up.
+    """
+
+    def __init__(self, loader=load_videodb_state, ttl: float = None, refresh_after: float = None):
+        """
+        :param loader: Called with ``(collection_id, video_id)`` to load the state.
+        :param float ttl: Seconds an entry is used for, defaults to ``VIDEODB_STATE_TTL`` or 300.
+        :param float refresh_after: Seconds after which an entry is reloaded in the background, defaults to 80% of ``ttl``.
+        """
+        self.loader = loader
+        self.ttl = ttl or float(os.getenv("VIDEODB_STATE_TTL", 300))
+        self.refresh_after = refresh_after or self.ttl * 0.8
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "invalidations": 0,
+            "expired": 0,
+        }
+
+    def get(self, session_id: str, collection_id: str, video_id: str = None) -> dict:
+        """Return the VideoDB state of a session, loading it on a miss.
+
+        :return: A new dict with ``conn``, ``collection`` and optionally ``video``.
+        """
+        key = (session_id, collection_id, video_id)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._swept_at >= self.ttl:
+                self._sweep(now)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["loaded_at"] < self.ttl:
+                self.stats["hits"] += 1
+                if now - entry["loaded_at"] >= self.refresh_after and not entry["refreshing"]:
+                    entry["refreshing"] = True
+                    threading.Thread(
+                        target=self._refresh, args=(key, entry), daemon=True
+                    ).start()
+                return dict(entry["state"])
+            self.stats["misses"] += 1
+
+        state = self.loader(collection_id, video_id)
+        with self._lock:
+            self._entries[key] = {
+                "state": state,
+                "loaded_at": time.monotonic(),
+                "refreshing": False,
+            }
+        return dict(state)
+
+    def _sweep(self, now: float):
+        """Remove the expired entries. Called with the lock held."""
+        for key, entry in list(self._entries.items()):
+            if now - entry["loaded_at"] >= self.ttl:
+                del self._entries[key]
+                self.stats["expired"] += 1
+        self._swept_at = now
+
+    def _refresh(self, key: tuple, entry: dict):
+        try:
+            state = self.loader(key[1], key[2])
+        except Exception as e:
+            logger.error(f"Error in refreshing VideoDB state of {key}: {e}")
+            entry["refreshing"] = False
+            return
+        with self._lock:
+            # Skip if the entry was invalidated meanwhile, the next get loads fresh state anyway
+            if self._entries.get(key) is entry:
+                self._entries[key] = {
+                    "state": state,
+                    "loaded_at": time.monotonic(),
+                    "refreshing": False,
+                }
+                self.stats["refreshes"] += 1
+
+    def invalidate(self, collection_id: str = None, session_id: str = None):
+        """Drop the cached state of a collection, of a session, or everything if neither is given. Call it when the collection changes, e.g. after an upload."""
+        with self._lock:
+            for key in list(self._entries):
+                if (collection_id is None or key[1] == collection_id) and (
+                    session_id is None or key[0] == session_id
+                ):
+                    del self._entries[key]
+                    self.stats["invalidations"] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_videodb_state_cache() -> VideoDBStateCache:
+    """Return the process-wide VideoDB state cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = VideoDBStateCache()
+        return _cache
@@ -5,6 +5,9 @@ from videodb import SearchType, SubtitleStyle, IndexType, SceneExtractionType
 from videodb.timeline import Timeline
 from videodb.asset import VideoAsset, ImageAsset
 
+from director.tools.videodb_state import get_videodb_state_cache
+from director.tools.media_index import get_media_index_registry
+
 
 class VideoDBTool:
     def __init__(self, collection_id="default"):
@@ -73,6 +76,9 @@ class VideoDBTool:
         else:
             upload_args["file_path"] = source
         media = self.conn.upload(**upload_args)
+        # The collection changed, cached session state must not hide the new media
+        get_videodb_state_cache().invalidate(collection_id=media.collection_id)
+        get_media_index_registry().invalidate(media.collection_id)
         name = media.name
         if media_type == "video":
             return {
@@ -20,3 +20,10 @@ class ToolException(DirectorException):
 
     def __init__(self, message="An error occurred in the tool", **kwargs):
         super(ValueError, self).__init__(message)
+
+
+class CancelledException(DirectorException):
+    """Exception raised when a reasoning run is cancelled, at the next cancellation checkpoint."""
+
+    def __init__(self, message="The request was cancelled", **kwargs):
+        super(DirectorException, self).__init__(message)
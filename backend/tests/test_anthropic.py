@@ -0,0 +1,57 @@
+from director.core.session import RoleTypes
+from director.llm.anthropic import AnthropicAI, AnthropicAIConfig
+
+
+def tool_call(id, name, arguments):
+    return {
+        "id": id,
+        "tool": {"name": name, "arguments": arguments},
+        "type": "function",
+    }
+
+
+def test_format_messages_with_several_tool_calls():
+    llm = AnthropicAI(AnthropicAIConfig(api_key="test", prompt_caching=False))
+    messages = [
+        {"role": RoleTypes.system, "content": "system prompt"},
+        {"role": RoleTypes.user, "content": "Summarize and index the video"},
+        {
+            "role": RoleTypes.assistant,
+            "content": "",
+            "tool_calls": [
+                tool_call("call_a", "video_summary", {"video_id": "v1"}),
+                tool_call("call_b", "index", {"video_id": "v1"}),
+            ],
+        },
+        {"role": RoleTypes.tool, "tool_call_id": "call_a", "content": "summary"},
+        {"role": RoleTypes.tool, "tool_call_id": "call_b", "content": "indexed"},
+    ]
+
+    system, formatted = llm._format_messages(messages)
+
+    assert system == "system prompt"
+    assert [message["role"] for message in formatted] == [
+        RoleTypes.user,
+        RoleTypes.assistant,
+        RoleTypes.user,
+    ]
+    assert formatted[1]["content"] == [
+        {
+            "id": "call_a",
+            "type": "tool_use",
+            "name": "video_summary",
+            "input": {"video_id": "v1"},
+        },
+        {
+            "id": "call_b",
+            "type": "tool_use",
+            "name": "index",
+            "input": {"video_id": "v1"},
+        },
+    ]
+    assert formatted[2]["content"] == [
+        {"type": "tool_result", "tool_use_id": "call_a", "content": "summary"},
+        {"type": "tool_result", "tool_use_id": "call_b", "content": "indexed"},
+    ]
+    # The cached formatted messages are not modified by the merge
+    assert len(llm.format_messages_cached(messages[1:])[3]["content"]) == 1
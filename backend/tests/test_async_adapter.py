@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+from director.db.async_adapter import AsyncDBAdapter
+from director.db.sqlite.async_db import AsyncSQLiteDB
+
+
+def message(msg_id, status):
+    return {
+        "session_id": "s1",
+        "conv_id": "c1",
+        "msg_id": msg_id,
+        "msg_type": "output",
+        "agents": [],
+        "actions": [],
+        "content": [],
+        "status": status,
+        "metadata": {},
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = AsyncDBAdapter(AsyncSQLiteDB(str(tmp_path / "director.db")))
+    db.create_session("s1", None, None)
+    yield db
+    db.close()
+
+
+async def fail(*args, **kwargs):
+    raise sqlite3.OperationalError("database is locked")
+
+
+def test_terminal_writes_wait_and_raise(db, monkeypatch):
+    db.add_or_update_msg_to_conv(**message("m1", "success"))
+    assert db.get_message("s1", "m1")["status"] == "success"
+
+    monkeypatch.setattr(db.async_db, "add_or_update_msgs_to_conv", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        db.add_or_update_msgs_to_conv(
+            [message("m2", "progress"), message("m3", "error")]
+        )
+
+
+def test_progress_writes_do_not_wait(db, monkeypatch):
+    monkeypatch.setattr(db.async_db, "add_or_update_msgs_to_conv", fail)
+
+    db.add_or_update_msgs_to_conv([message("m1", "progress")])
+    db.flush()
+
+    assert db.get_message("s1", "m1") is None
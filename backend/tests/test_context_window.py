@@ -0,0 +1,64 @@
+from director.core.context_window import SUMMARY_PREFIX, ContextWindow
+from director.core.session import ContextMessage, RoleTypes, Session
+from director.db.sqlite.db import SQLiteDB
+from director.llm.base import BaseLLM, BaseLLMConfig, LLMResponse, LLMResponseStatus
+
+
+class SummarizingLLM(BaseLLM):
+    def __init__(self):
+        super().__init__(BaseLLMConfig(chat_model="test", max_tokens=100))
+        self.calls = 0
+
+    def chat_completions(self, messages, tools=[], **kwargs):
+        self.calls += 1
+        return LLMResponse(content="summary", status=LLMResponseStatus.SUCCESS)
+
+
+def turn(i, tool_output="x" * 400):
+    return [
+        ContextMessage(content=f"user {i}", role=RoleTypes.user),
+        ContextMessage(content=tool_output, role=RoleTypes.assistant),
+    ]
+
+
+def make_session(tmp_path, context):
+    db = SQLiteDB(str(tmp_path / "director.db"))
+    session = Session(db=db, session_id="s1", conv_id="c1", collection_id="c1")
+    session.create()
+    session.reasoning_context = context
+    session.save_context_messages()
+    return session
+
+
+def test_summarizes_evicted_turns(tmp_path):
+    context = [ContextMessage(content="system prompt")]
+    for i in range(20):
+        context += turn(i)
+    session = make_session(tmp_path, context)
+    llm = SummarizingLLM()
+    context_window = ContextWindow(session, llm, budget=1800)
+
+    messages = context_window.fit()
+    context_window.fit()
+
+    assert llm.calls == 1
+    assert messages[0]["content"][-1]["text"].startswith(SUMMARY_PREFIX)
+    assert messages[-2]["content"] == "user 19"
+
+
+def test_current_run_over_budget_is_not_summarized(tmp_path):
+    context = [ContextMessage(content="system prompt")] + turn(0, "x" * 10000)
+    session = make_session(tmp_path, context)
+    llm = SummarizingLLM()
+    context_window = ContextWindow(session, llm, budget=1000)
+
+    for _ in range(3):
+        messages = context_window.fit()
+
+    assert llm.calls == 0
+    assert session.reasoning_context == context
+    assert [message["content"] for message in messages][:2] == [
+        "system prompt",
+        "user 0",
+    ]
+    assert len(Session(db=session.db, session_id="s1").reasoning_context) == 3
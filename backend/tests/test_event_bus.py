@@ -0,0 +1,38 @@
+import threading
+import time
+
+from director.core.event_bus import EventBus
+
+
+class SocketIO:
+    def __init__(self):
+        self.emitted = []
+
+    def start_background_task(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        return thread
+
+    def emit(self, event, data, namespace=None, to=None):
+        self.emitted.append((event, data["msg_id"]))
+
+
+def test_unfinished_messages_are_forgotten():
+    socketio = SocketIO()
+    bus = EventBus(socketio, max_rate=100)
+    bus.publish("sid", "done", {"msg_id": "done"}, final=True)
+    # Never reaches a terminal state, e.g. its run failed
+    bus.publish("sid", "failed", {"msg_id": "failed"})
+    bus.flush()
+    assert list(bus._last_emit) == ["failed"]
+
+    time.sleep(0.02)
+    bus.publish("sid", "next", {"msg_id": "next"})
+    bus.flush()
+
+    assert list(bus._last_emit) == ["next"]
+    assert socketio.emitted == [
+        ("chat", "done"),
+        ("chat", "failed"),
+        ("chat", "next"),
+    ]
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import sys
+
+from director.core.journal import MessageJournal, _journal_prefix, recover_journals
+from director.db.sqlite.db import SQLiteDB
+
+
+def message(msg_id):
+    return {
+        "session_id": "s1",
+        "conv_id": "c1",
+        "msg_id": msg_id,
+        "msg_type": "output",
+        "agents": [],
+        "actions": ["Reasoning the message.."],
+        "content": [],
+        "status": "progress",
+        "metadata": {},
+    }
+
+
+def test_recover_only_journals_of_stopped_processes(tmp_path, monkeypatch):
+    base_path = str(tmp_path / "director.journal")
+    monkeypatch.setenv("MESSAGE_JOURNAL_PATH", base_path)
+    db = SQLiteDB(str(tmp_path / "director.db"))
+    db.create_session("s1", None, None)
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    stopped = MessageJournal(f"{_journal_prefix(base_path)}{process.pid}")
+    stopped.record(message("stopped"))
+    stopped._close()
+    # The parent process, e.g. a sibling worker, is still running
+    running_path = f"{_journal_prefix(base_path)}{os.getppid()}"
+    running = MessageJournal(running_path)
+    running.record(message("running"))
+    running._close()
+
+    assert recover_journals(db) == 1
+
+    assert [(m["msg_id"], m["status"]) for m in db.get_conversations("s1")] == [
+        ("stopped", "error")
+    ]
+    journals = [name for name in os.listdir(tmp_path) if ".journal" in name]
+    assert journals == [os.path.basename(running_path)]
@@ -0,0 +1,129 @@
+from director.agents.base import AgentResponse, BaseAgent
+from director.core import reasoning
+from director.core.planner import PLAN_TOOL_NAME
+from director.core.reasoning import ReasoningEngine
+from director.core.session import InputMessage, RoleTypes, Session
+from director.db.sqlite.db import SQLiteDB
+from director.llm.anthropic import AnthropicAI, AnthropicAIConfig
+from director.llm.base import BaseLLM, BaseLLMConfig, LLMResponse, LLMResponseStatus
+from director.llm.openai import OpenAI, OpenaiConfig
+
+
+class PlanningLLM(BaseLLM):
+    """Answers the first request with a plan of two steps and records the messages of every request."""
+
+    def __init__(self):
+        super().__init__(BaseLLMConfig(chat_model="test"))
+        self.requests = []
+
+    def chat_completions(self, messages, tools=[], **kwargs):
+        self.requests.append(messages)
+        if len(self.requests) > 1:
+            return LLMResponse(content="Done", status=LLMResponseStatus.SUCCESS)
+        plan = {
+            "steps": [
+                {"id": "s1", "agent": "upload", "arguments": {"source": "https://x"}},
+                {
+                    "id": "s2",
+                    "agent": "index",
+                    "arguments": {"video_id": "$s1.data.video_id"},
+                },
+            ]
+        }
+        return LLMResponse(
+            tool_calls=[
+                {
+                    "id": "plan_1",
+                    "tool": {"name": PLAN_TOOL_NAME, "arguments": plan},
+                    "type": "function",
+                }
+            ],
+            status=LLMResponseStatus.SUCCESS,
+        )
+
+
+class StubAgent(BaseAgent):
+    def __init__(self, session, name, data):
+        self.agent_name = name
+        self.description = name
+        self.parameters = {"type": "object", "properties": {}}
+        self.data = data
+        super().__init__(session=session)
+
+    def run(self, **kwargs):
+        return AgentResponse(message="ok", data=self.data)
+
+
+class Collection:
+    id = "c1"
+    name = "Collection"
+    description = ""
+
+    def get_videos(self):
+        return []
+
+    def get_images(self):
+        return []
+
+
+def test_plan_context_formats_for_all_providers(tmp_path, monkeypatch):
+    monkeypatch.setenv("REASONING_STRATEGY", "plan")
+    monkeypatch.setenv("MESSAGE_JOURNAL_PATH", "")
+    monkeypatch.setattr(reasoning, "OpenAI", PlanningLLM)
+    db = SQLiteDB(str(tmp_path / "director.db"))
+    session = Session(db=db, session_id="s1", conv_id="c1", collection_id="c1")
+    session.create()
+    session.state["collection"] = Collection()
+    engine = ReasoningEngine(
+        input_message=InputMessage(
+            db=db,
+            session_id="s1",
+            conv_id="c1",
+            content=[{"type": "text", "text": "Upload and index this video"}],
+        ),
+        session=session,
+    )
+    engine.register_agents(
+        [
+            StubAgent(session, "upload", {"video_id": "v1"}),
+            StubAgent(session, "index", {}),
+        ]
+    )
+
+    engine.run()
+
+    summary_messages = engine.llm.requests[-1]
+    tool_calls = next(
+        message["tool_calls"]
+        for message in summary_messages
+        if message.get("tool_calls")
+    )
+    assert [tool_call["tool"]["name"] for tool_call in tool_calls] == [
+        "upload",
+        "index",
+    ]
+
+    anthropic = AnthropicAI(AnthropicAIConfig(api_key="test"))
+    _, messages = anthropic._format_messages(summary_messages)
+    assistant = next(
+        message for message in messages if message["role"] == RoleTypes.assistant
+    )
+    assert [block["type"] for block in assistant["content"]] == [
+        "tool_use",
+        "tool_use",
+    ]
+    results = messages[messages.index(assistant) + 1]
+    assert [block["tool_use_id"] for block in results["content"]] == [
+        tool_call["id"] for tool_call in tool_calls
+    ]
+    assert all(
+        message["role"] in (RoleTypes.user, RoleTypes.assistant) for message in messages
+    )
+
+    openai = OpenAI(OpenaiConfig(api_key="test"))
+    messages = openai._format_messages(summary_messages)
+    assistant = next(message for message in messages if message.get("tool_calls"))
+    assert [tool_call["type"] for tool_call in assistant["tool_calls"]] == [
+        "function",
+        "function",
+    ]
@@ -0,0 +1,20 @@
+from director.tools.videodb_state import VideoDBStateCache
+
+
+def test_expired_entries_of_other_sessions_are_removed(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(
+        "director.tools.videodb_state.time.monotonic", lambda: now[0]
+    )
+    cache = VideoDBStateCache(
+        loader=lambda collection_id, video_id: {"collection": collection_id},
+        ttl=10,
+    )
+    for i in range(100):
+        cache.get(f"s{i}", "c1")
+
+    now[0] = 10.0
+    assert cache.get("s100", "c1") == {"collection": "c1"}
+
+    assert list(cache._entries) == [("s100", "c1", None)]
+    assert cache.stats["expired"] == 100
@@ -0,0 +1,97 @@
+import sqlite3
+
+import pytest
+
+from director.db.write_behind import WriteBehindWriter
+
+
+class FlakyDB:
+    """Stores messages in a dict, writes fail while ``locked`` is set and always for the ``broken`` msg_ids."""
+
+    def __init__(self):
+        self.rows = {}
+        self.locked = False
+        self.broken = set()
+
+    def add_or_update_msg_to_conv(self, **message):
+        if self.locked:
+            raise sqlite3.OperationalError("database is locked")
+        if message["msg_id"] in self.broken:
+            raise sqlite3.IntegrityError("constraint failed")
+        self.rows[message["msg_id"]] = message
+
+    def add_or_update_msgs_to_conv(self, messages):
+        for message in messages:
+            self.add_or_update_msg_to_conv(**message)
+
+
+def test_durable_write_raises_and_is_retried():
+    db = FlakyDB()
+    writer = WriteBehindWriter(db)
+    db.locked = True
+
+    with pytest.raises(sqlite3.OperationalError):
+        writer.upsert_msg(durable=True, msg_id="m1", status="success")
+
+    assert writer.stats["failed"] == 1
+    db.locked = False
+    writer.flush()
+    assert db.rows["m1"]["status"] == "success"
+
+
+def test_failed_writes_back_off_and_are_dropped_eventually(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("director.db.write_behind.time.monotonic", lambda: now[0])
+    db = FlakyDB()
+    writer = WriteBehindWriter(db, flush_interval=1.0, max_attempts=4)
+    writer.upsert_msg(msg_id="m1", status="progress")
+    db.locked = True
+
+    with pytest.raises(sqlite3.OperationalError):
+        writer.flush(retry=False)
+    # Retried after 1s, then after 2s
+    writer.flush(retry=False)
+    assert writer.stats["failed"] == 1
+    now[0] = 1.0
+    with pytest.raises(sqlite3.OperationalError):
+        writer.flush(retry=False)
+    now[0] = 2.0
+    writer.flush(retry=False)
+    assert writer.stats["failed"] == 2
+
+    now[0] = 3.0
+    with pytest.raises(sqlite3.OperationalError):
+        writer.flush(retry=False)
+    now[0] = 7.0
+    with pytest.raises(sqlite3.OperationalError):
+        writer.flush(retry=False)
+    assert writer.stats["dropped"] == 1
+    db.locked = False
+    writer.flush()
+    assert "m1" not in db.rows
+
+
+def test_newer_state_replaces_failed_one():
+    db = FlakyDB()
+    writer = WriteBehindWriter(db)
+    db.locked = True
+    with pytest.raises(sqlite3.OperationalError):
+        writer.upsert_msg(durable=True, msg_id="m1", status="progress")
+
+    db.locked = False
+    writer.upsert_msg(durable=True, msg_id="m1", status="success")
+
+    assert db.rows["m1"]["status"] == "success"
+    assert writer._retrying == {}
+
+
+def test_durable_write_ignores_failures_of_other_messages():
+    db = FlakyDB()
+    writer = WriteBehindWriter(db)
+    db.broken.add("m1")
+    writer.upsert_msg(msg_id="m1", status="progress")
+
+    writer.upsert_msg(durable=True, msg_id="m2", status="success")
+
+    assert db.rows["m2"]["status"] == "success"
+    assert "m1" in writer._retrying